@@ -0,0 +1,136 @@
+"""Write-behind, batched sink for activity log entries.
+
+Routes hand activity events to the sink, which buffers them in a bounded
+in-memory queue and writes them to the ``activities`` table as multi-row
+inserts: whenever ``batch_size`` events are waiting, or ``flush_interval``
+seconds after the first event of a batch arrived, whichever comes first.
+
+When the buffer is full producers wait up to ``enqueue_timeout`` seconds for
+room (backpressure); events that still don't fit are dropped and counted.
+Stopping the sink drains and flushes everything that was accepted.
+"""
+
+import asyncio
+from typing import Any, Dict, List, Optional
+
+from db import Database
+
+_STOP = object()
+
+
+class ActivitySink:
+    """Buffers activity rows and flushes them to the database in batches."""
+
+    def __init__(self, db: Database, batch_size: int = 100, flush_interval: float = 0.5,
+                 max_queue: int = 10000, enqueue_timeout: float = 0.1):
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.enqueue_timeout = enqueue_timeout
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.accepted = 0
+        self.dropped = 0
+        self.flushed = 0
+        self.failed = 0
+        self.batches = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.create_task(self._run())
+
+    async def put(self, event: Dict[str, Any]) -> bool:
+        """Queue an event; returns ``False`` if it had to be dropped."""
+        if not self.running:
+            # Not started (e.g. scripts): write through synchronously
+            await self._flush([event])
+            return True
+
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            try:
+                await asyncio.wait_for(self._queue.put(event), self.enqueue_timeout)
+            except asyncio.TimeoutError:
+                self.dropped += 1
+                return False
+        self.accepted += 1
+        return True
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = loop.time() + self.flush_interval
+            stopping = False
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+            if stopping:
+                break
+
+        # Drain anything that was accepted before (or raced with) the stop
+        remaining = []
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not _STOP:
+                remaining.append(item)
+        for start in range(0, len(remaining), self.batch_size):
+            await self._flush(remaining[start:start + self.batch_size])
+
+    async def _flush(self, batch: List[Dict[str, Any]]) -> None:
+        if not batch or not self.db.enabled:
+            return
+        try:
+            await self.db.execute("activities", lambda t: t.insert(batch))
+            self.flushed += len(batch)
+            self.batches += 1
+        except Exception as e:
+            self.failed += len(batch)
+            print(f"Error logging {len(batch)} activities: {e}")
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Flush buffered events and stop the background flusher."""
+        if not self.running:
+            return
+        try:
+            await asyncio.wait_for(self._queue.put(_STOP), timeout)
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+            print(f"Activity sink did not drain within {timeout}s; {self._queue.qsize()} events lost")
+        self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._queue.qsize() if self._queue else 0,
+            "max_queue": self.max_queue,
+            "accepted": self.accepted,
+            "dropped": self.dropped,
+            "flushed": self.flushed,
+            "failed": self.failed,
+            "batches": self.batches,
+        }
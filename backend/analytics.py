@@ -0,0 +1,216 @@
+"""Push-down aggregation and materialized rollups for the analytics endpoint.
+
+Each metric is computed by a Postgres function (see
+``supabase/migrations/006_analytics_aggregates.sql``) that returns a handful
+of grouped rows instead of the whole table, and the independent metrics are
+requested concurrently so the response time is bounded by the slowest one.
+
+``RollupStore`` goes one step further and keeps per-day buckets (migration
+007) that write endpoints increment as rows are created. A date range is
+answered by summing the whole days it covers from the buckets, plus live
+aggregates for the partial days at either edge. Only metrics whose rows
+never move between buckets are rolled up (revenue, appointments by type):
+client and project status breakdowns change whenever a status is updated,
+so they always come from the live aggregates. Rebuild the buckets from the
+source tables with::
+
+    python analytics.py rebuild
+"""
+
+import asyncio
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from db import Database
+
+
+def _bounds(start: Optional[datetime], end: Optional[datetime]) -> Dict[str, Optional[str]]:
+    return {
+        "p_start": start.isoformat() if start else None,
+        "p_end": end.isoformat() if end else None,
+    }
+
+
+class AnalyticsEngine:
+    """Computes dashboard metrics with server-side aggregates."""
+
+    # Metrics that count every row regardless of the requested period
+    SNAPSHOT_METRICS = ("clients", "projects")
+
+    def __init__(self, db: Database):
+        self.db = db
+
+    async def revenue(self, start: Optional[datetime], end: Optional[datetime]) -> Dict[str, Any]:
+        result = await self.db.rpc("analytics_revenue_summary", _bounds(start, end))
+        row = result.data[0] if result.data else {}
+        return {"total": float(row.get("total") or 0), "count": int(row.get("count") or 0)}
+
+    async def _counts(self, fn: str, start: Optional[datetime], end: Optional[datetime]) -> Dict[str, int]:
+        result = await self.db.rpc(fn, _bounds(start, end))
+        return {row["key"]: int(row["count"]) for row in result.data or []}
+
+    async def clients(self, start: Optional[datetime], end: Optional[datetime]) -> Dict[str, int]:
+        return await self._counts("analytics_client_status_counts", start, end)
+
+    async def projects(self, start: Optional[datetime], end: Optional[datetime]) -> Dict[str, int]:
+        return await self._counts("analytics_project_status_counts", start, end)
+
+    async def appointments(self, start: Optional[datetime], end: Optional[datetime]) -> Dict[str, int]:
+        return await self._counts("analytics_appointment_type_counts", start, end)
+
+    async def compute(self, metrics: Iterable[str], start: datetime, end: datetime) -> Dict[str, Any]:
+        """Compute the requested metrics concurrently; unknown names are ignored."""
+        handlers = {
+            "revenue": self.revenue,
+            "clients": self.clients,
+            "projects": self.projects,
+            "appointments": self.appointments,
+        }
+        names = [name for name in dict.fromkeys(metrics) if name in handlers]
+        results = await asyncio.gather(*[
+            handlers[name](None, None) if name in self.SNAPSHOT_METRICS else handlers[name](start, end)
+            for name in names
+        ])
+        return dict(zip(names, results))
+
+
+def _as_utc(value: datetime) -> datetime:
+    """Treat naive datetimes as UTC and normalize aware ones to UTC."""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _day_start(day: date) -> datetime:
+    return datetime.combine(day, time.min, tzinfo=timezone.utc)
+
+
+def split_range(start: datetime, end: datetime) -> Tuple[Optional[date], Optional[date], List[Tuple[datetime, datetime]]]:
+    """Split ``[start, end]`` into whole UTC days and partial edge ranges.
+
+    Returns ``(first_day, last_day, edges)`` where the whole days are
+    ``first_day..last_day`` (``None`` if there are none) and ``edges`` are
+    the leftover sub-ranges that must be aggregated live.
+    """
+    start, end = _as_utc(start), _as_utc(end)
+    if end < start:
+        return None, None, []
+
+    first_day = start.date() if start == _day_start(start.date()) else start.date() + timedelta(days=1)
+    last_day = end.date() if end.time() == time.max else end.date() - timedelta(days=1)
+    if first_day > last_day:
+        return None, None, [(start, end)]
+
+    edges = []
+    if start < _day_start(first_day):
+        edges.append((start, _day_start(first_day) - timedelta(microseconds=1)))
+    if end > _day_start(last_day + timedelta(days=1)) - timedelta(microseconds=1):
+        edges.append((_day_start(last_day + timedelta(days=1)), end))
+    return first_day, last_day, edges
+
+
+class RollupStore:
+    """Per-day metric buckets, maintained incrementally by write endpoints."""
+
+    def __init__(self, db: Database, engine: AnalyticsEngine):
+        self.db = db
+        self.engine = engine
+
+    async def record(self, metric: str, when: Any, dimension: str = "", count: int = 1,
+                     total: float = 0.0) -> None:
+        """Add ``count``/``total`` to the bucket for ``when``'s UTC day."""
+        day = _as_utc(when).date() if isinstance(when, datetime) else when
+        try:
+            await self.db.rpc("analytics_rollup_increment", {
+                "p_metric": metric,
+                "p_day": day.isoformat(),
+                "p_dimension": dimension or "",
+                "p_count": count,
+                "p_total": total,
+            })
+        except Exception as e:
+            print(f"Error updating analytics rollup: {e}")
+
+    async def record_many(self, metric: str, entries: Iterable[Tuple[Any, str]]) -> None:
+        """Record one count per ``(when, dimension)``, grouped into one increment per bucket."""
+        buckets: Dict[Tuple[date, str], int] = {}
+        for when, dimension in entries:
+            day = _as_utc(when).date() if isinstance(when, datetime) else when
+            buckets[(day, dimension or "")] = buckets.get((day, dimension or ""), 0) + 1
+        await asyncio.gather(*[
+            self.record(metric, day, dimension, count=count)
+            for (day, dimension), count in buckets.items()
+        ])
+
+    async def rebuild(self) -> None:
+        """Recompute every bucket from the source tables."""
+        await self.db.rpc("analytics_rollup_rebuild")
+
+    async def _buckets(self, metric: str, first_day: Optional[date], last_day: Optional[date]) -> List[Dict[str, Any]]:
+        result = await self.db.rpc("analytics_rollup_range", {
+            "p_metric": metric,
+            "p_start": first_day.isoformat() if first_day else None,
+            "p_end": last_day.isoformat() if last_day else None,
+        })
+        return result.data or []
+
+    async def revenue(self, start: datetime, end: datetime) -> Dict[str, Any]:
+        first_day, last_day, edges = split_range(start, end)
+        parts = await asyncio.gather(
+            self._buckets("revenue", first_day, last_day) if first_day else _empty(),
+            *[self.engine.revenue(edge_start, edge_end) for edge_start, edge_end in edges]
+        )
+        buckets, live = parts[0], parts[1:]
+        summary = {
+            "total": sum(float(row["total"] or 0) for row in buckets),
+            "count": sum(int(row["count"] or 0) for row in buckets),
+        }
+        for part in live:
+            summary["total"] += part["total"]
+            summary["count"] += part["count"]
+        return summary
+
+    async def appointments(self, start: datetime, end: datetime) -> Dict[str, int]:
+        first_day, last_day, edges = split_range(start, end)
+        parts = await asyncio.gather(
+            self._buckets("appointments", first_day, last_day) if first_day else _empty(),
+            *[self.engine.appointments(edge_start, edge_end) for edge_start, edge_end in edges]
+        )
+        counts: Dict[str, int] = {}
+        for row in parts[0]:
+            counts[row["dimension"]] = counts.get(row["dimension"], 0) + int(row["count"])
+        for part in parts[1:]:
+            for key, value in part.items():
+                counts[key] = counts.get(key, 0) + value
+        return counts
+
+    async def compute(self, metrics: Iterable[str], start: datetime, end: datetime) -> Dict[str, Any]:
+        """Same contract as ``AnalyticsEngine.compute``, answered from buckets where possible."""
+        handlers = {
+            "revenue": lambda: self.revenue(start, end),
+            "clients": lambda: self.engine.clients(None, None),
+            "projects": lambda: self.engine.projects(None, None),
+            "appointments": lambda: self.appointments(start, end),
+        }
+        names = [name for name in dict.fromkeys(metrics) if name in handlers]
+        results = await asyncio.gather(*[handlers[name]() for name in names])
+        return dict(zip(names, results))
+
+
+async def _empty() -> List[Dict[str, Any]]:
+    return []
+
+
+if __name__ == "__main__":
+    import sys
+
+    if sys.argv[1:] != ["rebuild"]:
+        sys.exit("usage: python analytics.py rebuild")
+
+    from main import db, rollup_store
+
+    if not db.enabled:
+        sys.exit("Database not configured (set SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY)")
+    asyncio.run(rollup_store.rebuild())
+    db.shutdown()
+    print("Analytics rollups rebuilt")
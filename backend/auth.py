@@ -0,0 +1,219 @@
+"""Supabase access-token verification.
+
+Tokens are verified in-process whenever possible: HS256 tokens against the
+project's JWT secret, asymmetric tokens (RS256/ES256) against the project's
+JWKS, which is fetched once and cached. The accepted algorithms are pinned
+per key (HS256 for the secret, RS256/ES256 by the JWK's ``kty``/``alg``)
+rather than taken from the token header. Tokens that already passed
+verification are kept in a bounded TTL cache so repeated requests with the
+same bearer token skip the signature check entirely.
+
+The remote ``supabase.auth.get_user`` round-trip (an async callable, run off
+the event loop by the caller) is only used as a fallback when no local key
+material is available, or when ``SUPABASE_AUTH_MODE`` is set to ``remote``.
+"""
+
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from fastapi import HTTPException
+from jose import jwt
+from jose.exceptions import ExpiredSignatureError, JWTError
+
+from http_clients import upstream_clients
+
+# Algorithms accepted for each kind of key. The token header only selects
+# among these; it never widens them (no "none", no HS256 with a public key).
+SECRET_ALGORITHMS = ["HS256"]
+JWK_ALGORITHMS = {"RSA": ["RS256"], "EC": ["ES256"]}
+
+
+class AuthenticatedUser:
+    """Minimal user object exposing the fields routes rely on."""
+
+    __slots__ = ("id", "email", "role", "claims")
+
+    def __init__(self, id: str, email: Optional[str] = None, role: Optional[str] = None,
+                 claims: Optional[Dict[str, Any]] = None):
+        self.id = id
+        self.email = email
+        self.role = role
+        self.claims = claims or {}
+
+    @classmethod
+    def from_claims(cls, claims: Dict[str, Any]) -> "AuthenticatedUser":
+        return cls(id=claims["sub"], email=claims.get("email"), role=claims.get("role"), claims=claims)
+
+
+class TokenCache:
+    """Bounded LRU cache of verified tokens with per-entry expiry."""
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> Optional[AuthenticatedUser]:
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is None or entry[1] <= time.time():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, token: str, user: AuthenticatedUser, expires_at: Optional[float] = None) -> None:
+        ttl_expiry = time.time() + self.ttl
+        expiry = min(ttl_expiry, expires_at) if expires_at else ttl_expiry
+        key = self._key(token)
+        self._entries[key] = (user, expiry)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class JWKSCache:
+    """Caches the project's JSON Web Key Set, keyed by ``kid``."""
+
+    def __init__(self, jwks_url: str, ttl: float = 3600.0, min_refresh_interval: float = 30.0):
+        self.jwks_url = jwks_url
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self._keys: Dict[str, Dict[str, Any]] = {}
+        self._fetched_at = 0.0
+
+    async def _refresh(self) -> None:
+        response = await upstream_clients.get("supabase_auth").get(self.jwks_url)
+        response.raise_for_status()
+        self._keys = {key["kid"]: key for key in response.json().get("keys", []) if "kid" in key}
+        self._fetched_at = time.time()
+
+    async def get_key(self, kid: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Return the JWK for ``kid``, refetching on expiry or unknown key ids."""
+        age = time.time() - self._fetched_at
+        if age > self.ttl or (kid not in self._keys and age > self.min_refresh_interval):
+            await self._refresh()
+        return self._keys.get(kid)
+
+
+class TokenVerifier:
+    """Verifies bearer tokens locally, falling back to a remote lookup."""
+
+    def __init__(self, jwt_secret: Optional[str] = None, jwks_url: Optional[str] = None,
+                 remote: Optional[Callable[[str], Awaitable[Any]]] = None, mode: str = "local",
+                 audience: str = "authenticated", cache: Optional[TokenCache] = None,
+                 jwks_ttl: float = 3600.0):
+        self.jwt_secret = jwt_secret
+        self.jwks = JWKSCache(jwks_url, ttl=jwks_ttl) if jwks_url else None
+        self.remote = remote
+        self.mode = mode
+        self.audience = audience
+        self.cache = cache or TokenCache()
+        self.local_verifications = 0
+        self.remote_verifications = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.remote or self.jwt_secret or self.jwks)
+
+    async def verify(self, token: str) -> AuthenticatedUser:
+        """Return the user for ``token`` or raise a 401."""
+        user = self.cache.get(token)
+        if user is not None:
+            return user
+
+        if self.mode == "local":
+            claims = await self._verify_locally(token)
+            if claims is not None:
+                self.local_verifications += 1
+                user = AuthenticatedUser.from_claims(claims)
+                self.cache.put(token, user, expires_at=claims.get("exp"))
+                return user
+
+        user = await self._verify_remotely(token)
+        self.cache.put(token, user)
+        return user
+
+    async def _verify_locally(self, token: str) -> Optional[Dict[str, Any]]:
+        """Decode and validate ``token``; ``None`` means no local key was available."""
+        try:
+            header = jwt.get_unverified_header(token)
+        except JWTError:
+            raise HTTPException(status_code=401, detail="Invalid token")
+
+        algorithm = header.get("alg")
+        if algorithm in SECRET_ALGORITHMS:
+            key, allowed = self.jwt_secret, SECRET_ALGORITHMS
+        elif any(algorithm in algorithms for algorithms in JWK_ALGORITHMS.values()):
+            key, allowed = None, []
+            if self.jwks is not None:
+                try:
+                    key = await self.jwks.get_key(header.get("kid"))
+                except Exception as e:
+                    print(f"Error fetching JWKS: {e}")
+            if key is not None:
+                # The key's own type (and alg, if published) decides, not the token
+                allowed = [alg for alg in JWK_ALGORITHMS.get(key.get("kty"), [])
+                           if key.get("alg") in (None, alg)]
+                if algorithm not in allowed:
+                    raise HTTPException(status_code=401, detail="Invalid token")
+        else:
+            raise HTTPException(status_code=401, detail="Invalid token")
+
+        if key is None:
+            return None
+
+        try:
+            claims = jwt.decode(token, key, algorithms=allowed, audience=self.audience)
+        except ExpiredSignatureError:
+            raise HTTPException(status_code=401, detail="Token expired")
+        except JWTError:
+            raise HTTPException(status_code=401, detail="Invalid token")
+
+        if not claims.get("sub"):
+            raise HTTPException(status_code=401, detail="Invalid token")
+        return claims
+
+    async def _verify_remotely(self, token: str) -> AuthenticatedUser:
+        if self.remote is None:
+            raise HTTPException(status_code=503, detail="Database not configured")
+
+        try:
+            response = await self.remote(token)
+        except Exception:
+            raise HTTPException(status_code=401, detail="Invalid token")
+
+        if not response or not response.user:
+            raise HTTPException(status_code=401, detail="Invalid token")
+
+        self.remote_verifications += 1
+        remote_user = response.user
+        return AuthenticatedUser(
+            id=remote_user.id,
+            email=getattr(remote_user, "email", None),
+            role=getattr(remote_user, "role", None),
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "cache_size": len(self.cache),
+            "cache_hits": self.cache.hits,
+            "cache_misses": self.cache.misses,
+            "local_verifications": self.local_verifications,
+            "remote_verifications": self.remote_verifications,
+        }
@@ -0,0 +1,364 @@
+"""Local stand-ins for every upstream the backend talks to.
+
+One Starlette app serves all fakes under a path prefix per service::
+
+    /supabase   PostgREST (/rest/v1) and GoTrue (/auth/v1)
+    /vapi       VAPI calls and assistants
+    /twilio     Twilio Messages and IncomingPhoneNumbers
+    /stripe     Stripe REST objects
+    /google     Google OAuth token endpoint and Calendar (single and batch inserts)
+
+Each service sleeps for its configured latency (plus up to ``jitter`` of
+that) before answering, so benchmarks can model slow or fast upstreams.
+The PostgREST fake keeps tables in memory and understands the subset of
+the query language the backend uses: ``select``, ``order``, ``limit``,
+``offset``, ``col=op.value`` filters and nested ``or=(...)``/``and(...)``.
+
+Run standalone with::
+
+    python -m benchmarks.fakes --port 9100 --latency supabase=0.02,vapi=0.15
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+SERVICES = ("supabase", "vapi", "twilio", "stripe", "google")
+
+DEFAULT_LATENCY = {"supabase": 0.015, "vapi": 0.12, "twilio": 0.08, "stripe": 0.1, "google": 0.05}
+
+
+def parse_latency(spec: str) -> Dict[str, float]:
+    """Parse ``"supabase=0.02,vapi=0.15"`` (seconds) over the defaults."""
+    latency = dict(DEFAULT_LATENCY)
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, value = item.partition("=")
+        if name not in SERVICES:
+            raise ValueError(f"Unknown service '{name}' (expected one of {', '.join(SERVICES)})")
+        latency[name] = float(value)
+    return latency
+
+
+# -- PostgREST query language ------------------------------------------
+
+def _split_top_level(text: str) -> List[str]:
+    parts, depth, quoted, current = [], 0, False, ""
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            depth -= 1
+        elif not quoted and char == "," and depth == 0:
+            parts.append(current)
+            current = ""
+            continue
+        current += char
+    if current:
+        parts.append(current)
+    return parts
+
+
+def _compare(value: Any, op: str, operand: str) -> bool:
+    if op == "in":
+        return str(value) in [item.strip('"') for item in _split_top_level(operand.strip("()"))]
+    if op == "is":
+        return value is None if operand == "null" else str(value).lower() == operand
+    if value is None:
+        return False
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        try:
+            operand = float(operand)
+        except ValueError:
+            pass
+    else:
+        value = str(value)
+    if op == "eq":
+        return value == operand
+    if op == "neq":
+        return value != operand
+    if op == "gt":
+        return value > operand
+    if op == "gte":
+        return value >= operand
+    if op == "lt":
+        return value < operand
+    if op == "lte":
+        return value <= operand
+    return True
+
+
+def _condition(expression: str):
+    """Compile ``col.op.value`` / ``and(...)`` / ``or(...)`` into a row predicate."""
+    match = re.match(r"^(and|or)\((.*)\)$", expression)
+    if match:
+        children = [_condition(part) for part in _split_top_level(match.group(2))]
+        combine = all if match.group(1) == "and" else any
+        return lambda row: combine(child(row) for child in children)
+    column, op, operand = expression.split(".", 2)
+    operand = operand.strip('"')
+    return lambda row: _compare(row.get(column), op, operand)
+
+
+def _filters(params: List[tuple]):
+    predicates = []
+    for key, value in params:
+        if key in ("select", "order", "limit", "offset", "on_conflict", "columns"):
+            continue
+        if key in ("or", "and"):
+            predicates.append(_condition(f"{key}{value}"))
+        else:
+            op, _, operand = value.partition(".")
+            predicates.append(lambda row, c=key, o=op, v=operand: _compare(row.get(c), o, v.strip('"')))
+    return predicates
+
+
+class FakeSupabase:
+    """In-memory PostgREST tables seeded with plausible dashboard data."""
+
+    def __init__(self, seed_rows: int = 500, seed: int = 7):
+        rng = random.Random(seed)
+        now = datetime.utcnow()
+        self.tables: Dict[str, List[Dict[str, Any]]] = {name: [] for name in (
+            "clients", "projects", "appointments", "invoices", "payments", "activities", "voice_agents",
+        )}
+        # The benchmark user has connected a calendar; the stored access token is expired
+        self.tables["google_calendar_tokens"] = [{
+            "user_id": "bench-user", "access_token": "expired", "refresh_token": "1//bench-refresh",
+            "expires_at": (now - timedelta(hours=1)).isoformat() + "+00:00",
+        }]
+        for i in range(seed_rows):
+            created = (now - timedelta(minutes=i * 7)).isoformat()
+            client_id = str(uuid.UUID(int=rng.getrandbits(128)))
+            self.tables["clients"].append({
+                "id": client_id, "name": f"Client {i}", "email": f"client{i}@example.com",
+                "phone": f"+1555{i:07d}", "address": f"{i} Main St", "notes": None,
+                "status": rng.choice(["lead", "prospect", "active", "churned"]),
+                "bilingual_preference": rng.random() < 0.3, "created_at": created, "updated_at": created,
+            })
+            self.tables["activities"].append({
+                "id": str(uuid.UUID(int=rng.getrandbits(128))), "user_id": "bench-user", "action": "create",
+                "entity_type": "client", "entity_id": client_id, "entity_name": f"Client {i}",
+                "details": {}, "created_at": created,
+            })
+            self.tables["payments"].append({
+                "id": str(uuid.UUID(int=rng.getrandbits(128))), "invoice_id": str(uuid.uuid4()),
+                "amount": round(rng.uniform(50, 5000), 2), "payment_method": "stripe",
+                "payment_date": created, "created_at": created,
+            })
+
+    def select(self, table: str, params: List[tuple]) -> List[Dict[str, Any]]:
+        rows = self.tables.setdefault(table, [])
+        predicates = _filters(params)
+        rows = [row for row in rows if all(predicate(row) for predicate in predicates)]
+        query = dict(params)
+        for spec in reversed((query.get("order") or "").split(",")):
+            if spec:
+                column, _, direction = spec.partition(".")
+                rows.sort(key=lambda row: (row.get(column) is None, str(row.get(column))),
+                          reverse=direction.startswith("desc"))
+        offset = int(query.get("offset", 0))
+        limit = int(query["limit"]) if "limit" in query else None
+        rows = rows[offset:offset + limit if limit is not None else None]
+        columns = [column for column in (query.get("select") or "*").split(",") if column]
+        if "*" in columns or any("(" in column for column in columns):
+            return rows
+        return [{column: row[column] for column in columns if column in row} for row in rows]
+
+    def insert(self, table: str, body: Any, on_conflict: Optional[str] = None) -> List[Dict[str, Any]]:
+        items = body if isinstance(body, list) else [body]
+        now = datetime.utcnow().isoformat()
+        created = []
+        for item in items:
+            existing = next((row for row in self.tables.get(table, []) if on_conflict
+                             and row.get(on_conflict) == item.get(on_conflict)), None)
+            if existing is not None:
+                existing.update(item)
+                created.append(existing)
+                continue
+            row = {"id": str(uuid.uuid4()), "created_at": now, **item}
+            self.tables.setdefault(table, []).append(row)
+            created.append(row)
+        return created
+
+    def rpc(self, name: str, params: Dict[str, Any]) -> Any:
+        if name == "analytics_revenue_summary":
+            payments = self.tables["payments"]
+            return [{"total": round(sum(p["amount"] for p in payments), 2), "count": len(payments)}]
+        if name == "analytics_client_status_counts":
+            counts: Dict[str, int] = {}
+            for row in self.tables["clients"]:
+                counts[row["status"]] = counts.get(row["status"], 0) + 1
+            return [{"key": key, "count": count} for key, count in counts.items()]
+        if name.endswith("_counts"):
+            return [{"key": "scheduled", "count": 12}, {"key": "completed", "count": 30}]
+        if name == "analytics_rollup_range":
+            start = datetime.utcnow().date() - timedelta(days=30)
+            return [{"metric": params.get("p_metric"), "day": (start + timedelta(days=d)).isoformat(),
+                     "dimension": "", "count": 3, "total": 420.0} for d in range(30)]
+        return None
+
+
+# -- app ---------------------------------------------------------------
+
+def create_app(latency: Optional[Dict[str, float]] = None, jitter: float = 0.2,
+               seed_rows: int = 500) -> Starlette:
+    latency = latency or dict(DEFAULT_LATENCY)
+    db = FakeSupabase(seed_rows)
+    calls: List[Dict[str, Any]] = []
+
+    async def delay(service: str) -> None:
+        base = latency.get(service, 0.0)
+        if base > 0:
+            await asyncio.sleep(base * (1 + random.uniform(-jitter, jitter)))
+
+    async def body(request: Request) -> Any:
+        raw = await request.body()
+        return json.loads(raw) if raw else None
+
+    async def rest(request: Request) -> Response:
+        await delay("supabase")
+        table = request.path_params["table"]
+        if request.method == "GET":
+            return JSONResponse(db.select(table, list(request.query_params.multi_items())))
+        if request.method == "POST":
+            rows = db.insert(table, await body(request), request.query_params.get("on_conflict"))
+            return JSONResponse(rows, status_code=201)
+        if request.method == "PATCH":
+            changes = await body(request) or {}
+            rows = db.select(table, list(request.query_params.multi_items()))
+            for row in rows:
+                row.update(changes)
+            return JSONResponse(rows)
+        rows = db.select(table, list(request.query_params.multi_items()))
+        for row in rows:
+            db.tables[table].remove(row)
+        return JSONResponse(rows)
+
+    async def rpc(request: Request) -> Response:
+        await delay("supabase")
+        return JSONResponse(db.rpc(request.path_params["fn"], await body(request) or {}))
+
+    async def auth_user(request: Request) -> Response:
+        await delay("supabase")
+        return JSONResponse({"id": "bench-user", "email": "bench@example.com", "aud": "authenticated",
+                             "role": "authenticated"})
+
+    async def vapi_call(request: Request) -> Response:
+        await delay("vapi")
+        if request.method == "POST":
+            payload = await body(request) or {}
+            call = {"id": str(uuid.uuid4()), "assistantId": payload.get("assistantId"), "status": "queued",
+                    "customer": payload.get("customer"), "createdAt": datetime.utcnow().isoformat() + "Z"}
+            calls.append(call)
+            return JSONResponse(call, status_code=201)
+        agent = request.query_params.get("assistantId")
+        limit = int(request.query_params.get("limit", 100))
+        gt = request.query_params.get("createdAtGt")
+        rows = [c for c in reversed(calls) if c["assistantId"] == agent and (not gt or c["createdAt"] > gt)]
+        return JSONResponse(rows[:limit])
+
+    async def vapi_assistant(request: Request) -> Response:
+        await delay("vapi")
+        return JSONResponse({"id": str(uuid.uuid4()), **(await body(request) or {})}, status_code=201)
+
+    async def twilio_messages(request: Request) -> Response:
+        await delay("twilio")
+        form = await request.form()
+        return JSONResponse({"sid": "SM" + uuid.uuid4().hex, "to": form.get("To"), "status": "queued"},
+                            status_code=201)
+
+    async def twilio_numbers(request: Request) -> Response:
+        await delay("twilio")
+        return JSONResponse({"incoming_phone_numbers": [
+            {"sid": "PN" + uuid.uuid4().hex, "phone_number": f"+1555000{i:04d}"} for i in range(5)
+        ]})
+
+    async def stripe_object(request: Request) -> Response:
+        await delay("stripe")
+        kind = request.path_params["kind"]
+        object_id = f"{kind[:3]}_{uuid.uuid4().hex[:24]}"
+        return JSONResponse({"id": object_id, "object": kind.rstrip("s"), "client_secret": f"{object_id}_secret"})
+
+    async def google_token(request: Request) -> Response:
+        await delay("google")
+        return JSONResponse({"access_token": "ya29." + uuid.uuid4().hex, "refresh_token": "1//" + uuid.uuid4().hex,
+                             "expires_in": 3599, "token_type": "Bearer"})
+
+    event_ids: set = set()
+
+    def calendar_event(event: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        # Client-chosen ids are unique per calendar, so replayed inserts conflict
+        if event.get("id") in event_ids:
+            return 409, {"error": {"code": 409, "message": "The requested identifier already exists."}}
+        event = {"id": uuid.uuid4().hex, "status": "confirmed", **event}
+        event_ids.add(event["id"])
+        return 200, event
+
+    async def google_event(request: Request) -> Response:
+        await delay("google")
+        status, event = calendar_event(await body(request) or {})
+        return JSONResponse(event, status_code=status)
+
+    async def google_batch(request: Request) -> Response:
+        # One round trip for the whole batch, like Google's batch endpoint
+        await delay("google")
+        boundary = request.headers["content-type"].split("boundary=")[1]
+        raw = (await request.body()).decode().replace("\r\n", "\n")
+        response_boundary = f"batch_{uuid.uuid4().hex}"
+        parts = []
+        for part in raw.split(f"--{boundary}"):
+            if not part.strip() or part.strip() == "--":
+                continue
+            content_id = re.search(r"Content-ID: <([^>]*)>", part).group(1)
+            payload = part.strip().rsplit("\n\n", 1)[-1]
+            status, event = calendar_event(json.loads(payload))
+            parts += [f"--{response_boundary}", "Content-Type: application/http",
+                      f"Content-ID: <response-{content_id}>", "",
+                      f"HTTP/1.1 {status} {'OK' if status == 200 else 'Conflict'}",
+                      "Content-Type: application/json; charset=UTF-8", "", json.dumps(event), ""]
+        parts.append(f"--{response_boundary}--")
+        return Response("\r\n".join(parts), media_type=f"multipart/mixed; boundary={response_boundary}")
+
+    return Starlette(routes=[
+        Route("/supabase/rest/v1/rpc/{fn}", rpc, methods=["POST"]),
+        Route("/supabase/rest/v1/{table}", rest, methods=["GET", "POST", "PATCH", "DELETE"]),
+        Route("/supabase/auth/v1/user", auth_user),
+        Route("/vapi/call", vapi_call, methods=["GET", "POST"]),
+        Route("/vapi/assistant", vapi_assistant, methods=["POST"]),
+        Route("/twilio/2010-04-01/Accounts/{sid}/Messages.json", twilio_messages, methods=["POST"]),
+        Route("/twilio/2010-04-01/Accounts/{sid}/IncomingPhoneNumbers.json", twilio_numbers),
+        Route("/stripe/v1/{kind}", stripe_object, methods=["POST"]),
+        Route("/google/token", google_token, methods=["POST"]),
+        Route("/google/calendar/v3/calendars/primary/events", google_event, methods=["POST"]),
+        Route("/google/batch/calendar/v3", google_batch, methods=["POST"]),
+    ])
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve fake upstreams for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", default="", help="per-service seconds, e.g. supabase=0.02,vapi=0.15")
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--seed-rows", type=int, default=500)
+    args = parser.parse_args()
+    app = create_app(parse_latency(args.latency), args.jitter, args.seed_rows)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+"""Drive a scenario against the backend with fake upstreams and report latency.
+
+Starts ``benchmarks.fakes`` and the API (``uvicorn main:app``) as
+subprocesses, points every integration at the fakes, then runs
+``--concurrency`` virtual users for ``--duration`` seconds after a
+``--warmup``. Per-operation count, error count, throughput and
+p50/p95/p99 latency are printed and written as JSON.
+
+Results are compared against ``benchmarks/baselines/<scenario>.json``: an
+operation regresses when its p95 grows or its throughput drops by more than
+``--threshold``. Pass ``--update-baseline`` to record a new baseline and
+``--fail-on-regression`` to exit non-zero (for CI).
+
+Run from ``backend/``::
+
+    python -m benchmarks.run --scenario dashboard --concurrency 20 --duration 30
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+from jose import jwt
+
+from benchmarks.scenarios import SCENARIOS, Operation
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_DIR = os.path.join(BACKEND_DIR, "benchmarks", "baselines")
+JWT_SECRET = "benchmark-jwt-secret"
+MIN_SAMPLES = 20
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _token(sub: str, role: str) -> str:
+    now = int(time.time())
+    claims = {"sub": sub, "role": role, "aud": "authenticated", "email": f"{sub}@example.com",
+              "iat": now, "exp": now + 6 * 3600}
+    return jwt.encode(claims, JWT_SECRET, algorithm="HS256")
+
+
+def app_env(fakes_url: str, workdir: str) -> Dict[str, str]:
+    """Environment pointing every integration at the fake upstreams."""
+    env = dict(os.environ)
+    env.update({
+        "SUPABASE_URL": f"{fakes_url}/supabase",
+        "SUPABASE_SERVICE_ROLE_KEY": _token("service", "service_role"),
+        "SUPABASE_JWT_SECRET": JWT_SECRET,
+        "VAPI_API_KEY": "bench-vapi-key",
+        "VAPI_BASE_URL": f"{fakes_url}/vapi",
+        "TWILIO_ACCOUNT_SID": "ACbench",
+        "TWILIO_AUTH_TOKEN": "bench-twilio-token",
+        "TWILIO_PHONE_NUMBER": "+15550000000",
+        "TWILIO_API_BASE": f"{fakes_url}/twilio",
+        "STRIPE_SECRET_KEY": "sk_test_bench",
+        "STRIPE_API_BASE": f"{fakes_url}/stripe",
+        "GOOGLE_CLIENT_ID": "bench-google-client",
+        "GOOGLE_CLIENT_SECRET": "bench-google-secret",
+        "GOOGLE_TOKEN_URL": f"{fakes_url}/google/token",
+        "GOOGLE_CALENDAR_API_BASE": f"{fakes_url}/google",
+        "WEBHOOK_QUEUE_PATH": os.path.join(workdir, "webhook_queue.sqlite3"),
+        "CALL_LOG_DB_PATH": os.path.join(workdir, "call_logs.sqlite3"),
+    })
+    return env
+
+
+async def _wait_ready(url: str, process: subprocess.Popen, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"{url} exited with code {process.returncode} before becoming ready")
+            try:
+                await client.get(url, timeout=1.0)
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not become ready within {timeout:.0f}s")
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.statuses: Dict[str, Dict[str, int]] = {}
+
+    def record(self, name: str, elapsed: float, status: str, failed: bool) -> None:
+        self.latencies.setdefault(name, []).append(elapsed)
+        self.errors[name] = self.errors.get(name, 0) + (1 if failed else 0)
+        by_status = self.statuses.setdefault(name, {})
+        by_status[status] = by_status.get(status, 0) + 1
+
+    def summary(self, duration: float) -> Dict[str, Any]:
+        operations = {}
+        everything: List[float] = []
+        for name, values in sorted(self.latencies.items()):
+            ordered = sorted(values)
+            everything.extend(values)
+            operations[name] = {
+                "count": len(values),
+                "errors": self.errors.get(name, 0),
+                "statuses": self.statuses.get(name, {}),
+                "rps": round(len(values) / duration, 2),
+                "mean_ms": round(sum(values) / len(values) * 1000, 2),
+                "p50_ms": round(_percentile(ordered, 0.50) * 1000, 2),
+                "p95_ms": round(_percentile(ordered, 0.95) * 1000, 2),
+                "p99_ms": round(_percentile(ordered, 0.99) * 1000, 2),
+            }
+        everything.sort()
+        total = {
+            "count": len(everything),
+            "errors": sum(self.errors.values()),
+            "rps": round(len(everything) / duration, 2),
+            "p50_ms": round(_percentile(everything, 0.50) * 1000, 2),
+            "p95_ms": round(_percentile(everything, 0.95) * 1000, 2),
+            "p99_ms": round(_percentile(everything, 0.99) * 1000, 2),
+        }
+        return {"operations": operations, "total": total}
+
+
+async def drive(base_url: str, operations: List[Operation], concurrency: int, duration: float,
+                warmup: float, token: str, seed: int = 1) -> Dict[str, Any]:
+    """Run ``concurrency`` virtual users for ``warmup + duration`` seconds."""
+    weights = [op.weight for op in operations]
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    started = time.monotonic()
+    measure_from = started + warmup
+    deadline = measure_from + duration
+
+    async def user(index: int, client: httpx.AsyncClient) -> None:
+        rng = random.Random(seed * 1000 + index)
+        while True:
+            now = time.monotonic()
+            if now >= deadline:
+                return
+            op = rng.choices(operations, weights)[0]
+            kwargs = op.build(rng)
+            headers = dict(kwargs.pop("headers", {}))
+            if op.auth:
+                headers["Authorization"] = f"Bearer {token}"
+            begin = time.perf_counter()
+            try:
+                response = await client.request(op.method, op.path, headers=headers, **kwargs)
+                status, failed = str(response.status_code), response.status_code >= 400
+            except httpx.HTTPError as e:
+                status, failed = type(e).__name__, True
+            elapsed = time.perf_counter() - begin
+            if now >= measure_from:
+                recorder.record(op.name, elapsed, status, failed)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+        await asyncio.gather(*(user(i, client) for i in range(concurrency)))
+    return recorder.summary(time.monotonic() - measure_from)
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Describe every operation whose p95 or throughput regressed beyond ``threshold``."""
+    regressions = []
+    for name, current in results["operations"].items():
+        previous = baseline.get("operations", {}).get(name)
+        if not previous or min(current["count"], previous["count"]) < MIN_SAMPLES:
+            continue
+        if previous["p95_ms"] > 0 and current["p95_ms"] > previous["p95_ms"] * (1 + threshold):
+            regressions.append(f"{name}: p95 {previous['p95_ms']:.1f} ms -> {current['p95_ms']:.1f} ms")
+        if previous["rps"] > 0 and current["rps"] < previous["rps"] * (1 - threshold):
+            regressions.append(f"{name}: throughput {previous['rps']:.1f} -> {current['rps']:.1f} req/s")
+        previous_rate = previous["errors"] / previous["count"]
+        current_rate = current["errors"] / current["count"]
+        if current_rate > previous_rate + 0.01:
+            regressions.append(f"{name}: error rate {previous_rate:.1%} -> {current_rate:.1%}")
+    return regressions
+
+
+def print_report(scenario: str, results: Dict[str, Any]) -> None:
+    print(f"\nScenario '{scenario}'")
+    header = f"{'operation':<26}{'count':>8}{'errors':>8}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    print(header)
+    print("-" * len(header))
+    rows = list(results["operations"].items()) + [("TOTAL", results["total"])]
+    for name, row in rows:
+        print(f"{name:<26}{row['count']:>8}{row['errors']:>8}{row['rps']:>9.1f}"
+              f"{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}{row['p99_ms']:>10.1f}")
+
+
+async def run_scenario(args: argparse.Namespace, scenario: str, base_url: str, token: str) -> Dict[str, Any]:
+    results = await drive(base_url, SCENARIOS[scenario], args.concurrency, args.duration, args.warmup, token)
+    results["scenario"] = scenario
+    results["config"] = {"concurrency": args.concurrency, "duration": args.duration,
+                         "warmup": args.warmup, "latency": args.latency}
+    return results
+
+
+async def main_async(args: argparse.Namespace) -> int:
+    scenarios = list(SCENARIOS) if args.scenario == "all" else args.scenario.split(",")
+    for scenario in scenarios:
+        if scenario not in SCENARIOS:
+            raise SystemExit(f"Unknown scenario '{scenario}' (choose from {', '.join(SCENARIOS)} or all)")
+
+    processes: List[subprocess.Popen] = []
+    workdir = tempfile.mkdtemp(prefix="ikon-bench-")
+    try:
+        base_url = args.app_url
+        if not base_url:
+            fakes_port, app_port = _free_port(), _free_port()
+            fakes_url = f"http://127.0.0.1:{fakes_port}"
+            base_url = f"http://127.0.0.1:{app_port}"
+            processes.append(subprocess.Popen(
+                [sys.executable, "-m", "benchmarks.fakes", "--port", str(fakes_port), "--latency", args.latency],
+                cwd=BACKEND_DIR,
+            ))
+            await _wait_ready(f"{fakes_url}/supabase/auth/v1/user", processes[-1])
+            processes.append(subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(app_port),
+                 "--log-level", "warning", "--no-access-log"],
+                cwd=BACKEND_DIR, env=app_env(fakes_url, workdir),
+            ))
+            await _wait_ready(f"{base_url}/health", processes[-1])
+
+        token = _token("bench-user", "authenticated")
+        failed = False
+        for scenario in scenarios:
+            results = await run_scenario(args, scenario, base_url, token)
+            print_report(scenario, results)
+
+            if args.output:
+                path = args.output if len(scenarios) == 1 else f"{os.path.splitext(args.output)[0]}-{scenario}.json"
+                with open(path, "w") as f:
+                    json.dump(results, f, indent=2)
+
+            baseline_path = os.path.join(args.baseline_dir, f"{scenario}.json")
+            if args.update_baseline:
+                os.makedirs(args.baseline_dir, exist_ok=True)
+                with open(baseline_path, "w") as f:
+                    json.dump(results, f, indent=2)
+                    f.write("\n")
+                print(f"Baseline written to {baseline_path}")
+            elif os.path.exists(baseline_path):
+                with open(baseline_path) as f:
+                    regressions = compare(results, json.load(f), args.threshold)
+                if regressions:
+                    failed = True
+                    print(f"Regressions against {baseline_path} (threshold {args.threshold:.0%}):")
+                    for line in regressions:
+                        print(f"  {line}")
+                else:
+                    print(f"No regressions against {baseline_path}")
+        return 1 if failed and args.fail_on_regression else 0
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load-test the backend against fake upstreams")
+    parser.add_argument("--scenario", default="mixed", help=f"{', '.join(SCENARIOS)}, a comma list, or all")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=20.0, help="measured seconds per scenario")
+    parser.add_argument("--warmup", type=float, default=3.0, help="unmeasured seconds before measuring")
+    parser.add_argument("--latency", default="", help="fake upstream latency, e.g. supabase=0.02,vapi=0.15")
+    parser.add_argument("--app-url", help="benchmark an already running API instead of starting one")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    parser.add_argument("--baseline-dir", default=BASELINE_DIR)
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative regression")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    return asyncio.run(main_async(parser.parse_args(argv)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
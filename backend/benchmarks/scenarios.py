@@ -0,0 +1,126 @@
+"""Weighted request mixes driven by ``benchmarks.run``.
+
+A scenario is a list of ``Operation``s; each virtual user repeatedly picks
+one at random by weight and sends it. ``build`` returns the keyword
+arguments for ``httpx.AsyncClient.request`` (``json``, ``params``,
+``content``, ...) so payloads can vary per request.
+"""
+
+import json
+import random
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List
+
+Builder = Callable[[random.Random], Dict[str, Any]]
+
+
+@dataclass
+class Operation:
+    name: str
+    method: str
+    path: str
+    weight: float = 1.0
+    build: Builder = field(default=lambda rng: {})
+    auth: bool = True
+
+
+def _phone(rng: random.Random) -> str:
+    return f"+1555{rng.randrange(10 ** 7):07d}"
+
+
+def _client(rng: random.Random) -> Dict[str, Any]:
+    n = rng.randrange(10 ** 6)
+    return {"json": {
+        "name": f"Bench Client {n}", "email": f"bench{n}@example.com", "phone": _phone(rng),
+        "address": f"{n} Bench Ave", "status": rng.choice(["lead", "prospect", "active"]),
+    }}
+
+
+def _appointment(rng: random.Random) -> Dict[str, Any]:
+    when = datetime.utcnow() + timedelta(days=rng.randrange(1, 30), hours=rng.randrange(9, 17))
+    return {"json": {
+        "client_id": str(uuid.uuid4()), "date_time": when.isoformat(),
+        "type": rng.choice(["demo", "call", "follow_up", "meeting", "consultation"]),
+        "title": "Bench appointment", "duration": rng.choice([30, 60, 90]),
+    }}
+
+
+def _invoice(rng: random.Random) -> Dict[str, Any]:
+    return {"json": {
+        "client_id": str(uuid.uuid4()), "title": "Bench invoice", "amount": round(rng.uniform(100, 5000), 2),
+        "tax_rate": 0.08, "due_date": (datetime.utcnow() + timedelta(days=30)).isoformat(),
+    }}
+
+
+def _bulk_clients(rng: random.Random) -> Dict[str, Any]:
+    return {"json": [_client(rng)["json"] for _ in range(50)]}
+
+
+def _analytics(rng: random.Random) -> Dict[str, Any]:
+    end = datetime.utcnow()
+    return {"json": {
+        "start_date": (end - timedelta(days=rng.choice([7, 30, 90]))).isoformat(),
+        "end_date": end.isoformat(),
+        "metrics": ["revenue", "clients", "projects", "appointments"],
+    }}
+
+
+def _vapi_event(rng: random.Random) -> Dict[str, Any]:
+    event = rng.choice(["call.started", "call.ended", "transcript"])
+    data = {"id": str(uuid.uuid4()), "assistantId": "bench-agent", "endedReason": "customer-ended-call"}
+    body = {"event_type": event, "data": data, "timestamp": datetime.utcnow().isoformat()}
+    return {"content": json.dumps(body), "headers": {"Content-Type": "application/json"}}
+
+
+def _stripe_event(rng: random.Random) -> Dict[str, Any]:
+    body = {"id": f"evt_{uuid.uuid4().hex[:24]}", "type": "payment_intent.succeeded",
+            "data": {"object": {"id": f"pi_{uuid.uuid4().hex[:24]}", "amount": rng.randrange(1000, 50000)}}}
+    return {"content": json.dumps(body), "headers": {"Content-Type": "application/json"}}
+
+
+DASHBOARD = [
+    Operation("list_clients", "GET", "/api/clients", 5, lambda rng: {"params": {"limit": 50}}),
+    Operation("list_clients_summary", "GET", "/api/clients", 2,
+              lambda rng: {"params": {"limit": 50, "fields": "summary"}}),
+    Operation("list_clients_by_status", "GET", "/api/clients", 2,
+              lambda rng: {"params": {"limit": 25, "status": rng.choice(["lead", "active"])}}),
+    Operation("activities", "GET", "/api/activities", 3, lambda rng: {"params": {"limit": 20}}),
+    Operation("phone_numbers", "GET", "/phone-numbers", 1),
+    Operation("agent_logs", "GET", "/voice-agents/bench-agent/logs", 1, lambda rng: {"params": {"limit": 50}}),
+    Operation("health", "GET", "/health", 1, auth=False),
+]
+
+WRITES = [
+    Operation("create_client", "POST", "/api/clients", 4, _client),
+    Operation("create_appointment", "POST", "/api/appointments", 3, _appointment),
+    Operation("create_invoice", "POST", "/api/invoices", 2, _invoice),
+    Operation("bulk_clients", "POST", "/api/clients/bulk", 1, _bulk_clients),
+]
+
+WEBHOOKS = [
+    Operation("vapi_webhook", "POST", "/webhooks/vapi", 3, _vapi_event, auth=False),
+    Operation("stripe_webhook", "POST", "/webhooks/stripe", 1, _stripe_event, auth=False),
+]
+
+ANALYTICS = [
+    Operation("analytics", "POST", "/api/analytics", 4, _analytics),
+    Operation("export_clients", "GET", "/api/exports/clients", 1, lambda rng: {"params": {"format": "ndjson"}}),
+]
+
+INTEGRATIONS = [
+    Operation("send_sms", "POST", "/sms/send", 3,
+              lambda rng: {"params": {"to": _phone(rng), "message": "Benchmark message"}}),
+    Operation("payment_intent", "POST", "/api/stripe/payment-intent", 1,
+              lambda rng: {"params": {"amount": rng.randrange(1000, 50000)}}),
+]
+
+SCENARIOS: Dict[str, List[Operation]] = {
+    "dashboard": DASHBOARD,
+    "writes": WRITES,
+    "webhooks": WEBHOOKS,
+    "analytics": ANALYTICS,
+    "integrations": INTEGRATIONS,
+    "mixed": DASHBOARD + WRITES + WEBHOOKS + ANALYTICS + INTEGRATIONS,
+}
@@ -0,0 +1,200 @@
+"""Micro-benchmark of response serialization for proxied upstream data.
+
+Compares, per response, the CPU time of:
+
+* ``decode + stdlib``: decode every stored call, wrap it in the envelope,
+  run FastAPI's ``jsonable_encoder`` and render with Starlette's
+  ``JSONResponse`` (how ``/voice-agents/{id}/logs`` used to respond);
+* ``decode + fast``: the same, rendered with ``FastJSONResponse`` (orjson
+  when installed), which is what every other route now uses;
+* ``raw passthrough``: splice the stored JSON bytes into the envelope with
+  ``RawEnvelopeResponse`` without decoding them.
+
+It also compares the list formats of ``/api/clients`` for large pages:
+JSON and MessagePack (when installed), each as row objects or
+``format=columnar``, by body size (raw and gzipped) and by the time to
+encode on the server plus decode on the client.
+
+Run from ``backend/``::
+
+    python -m benchmarks.serialization --sizes 50,500 --list-sizes 1000,5000 --output serialization.json
+"""
+
+import argparse
+import gzip
+import json
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from responses import (JSON, MSGPACK, FastJSONResponse, RawEnvelopeResponse, columnar, encode, msgpack,
+                       orjson, raw_array)
+
+
+def vapi_call(rng: random.Random) -> Dict[str, Any]:
+    """A VAPI call object of realistic size (transcript, messages, costs, analysis)."""
+    started = datetime(2024, 1, 1) + timedelta(seconds=rng.randrange(10 ** 7))
+    messages = [{
+        "role": rng.choice(["assistant", "user"]),
+        "message": " ".join(rng.choice(["hello", "schedule", "tomorrow", "price", "thanks", "window", "quote"])
+                            for _ in range(rng.randrange(5, 25))),
+        "time": started.timestamp() * 1000 + i * 4000,
+        "secondsFromStart": i * 4.0,
+    } for i in range(rng.randrange(6, 20))]
+    return {
+        "id": str(uuid.UUID(int=rng.getrandbits(128))),
+        "assistantId": "bench-agent",
+        "type": "outboundPhoneCall",
+        "status": "ended",
+        "endedReason": rng.choice(["customer-ended-call", "assistant-ended-call", "voicemail"]),
+        "createdAt": started.isoformat() + "Z",
+        "startedAt": started.isoformat() + "Z",
+        "endedAt": (started + timedelta(seconds=rng.randrange(30, 600))).isoformat() + "Z",
+        "customer": {"number": f"+1555{rng.randrange(10 ** 7):07d}", "name": None},
+        "cost": round(rng.uniform(0.01, 2.0), 4),
+        "costBreakdown": {"transport": 0.01, "stt": 0.02, "llm": 0.05, "tts": 0.03, "vapi": 0.05, "total": 0.16},
+        "messages": messages,
+        "transcript": "\n".join(f"{m['role']}: {m['message']}" for m in messages),
+        "analysis": {"summary": "Customer asked for a quote.", "successEvaluation": "true"},
+        "recordingUrl": f"https://storage.vapi.ai/{uuid.UUID(int=rng.getrandbits(128))}.wav",
+    }
+
+
+def client_row(rng: random.Random) -> Dict[str, Any]:
+    """A ``clients`` row as ``select("*")`` returns it."""
+    created = datetime(2024, 1, 1) + timedelta(seconds=rng.randrange(10 ** 7))
+    return {
+        "id": str(uuid.UUID(int=rng.getrandbits(128))),
+        "user_id": "bench-user",
+        "name": rng.choice(["Alex", "Sam", "Jordan", "Taylor", "Morgan"]) + " " + rng.choice(["Smith", "Lee", "Garcia", "Brown"]),
+        "email": f"client{rng.randrange(10 ** 6)}@example.com",
+        "phone": f"+1555{rng.randrange(10 ** 7):07d}",
+        "address": f"{rng.randrange(1, 9999)} Main St, Springfield",
+        "status": rng.choice(["lead", "prospect", "customer", "inactive"]),
+        "notes": rng.choice([None, "Prefers morning calls.", "Referred by a neighbour; wants a quote for 12 windows."]),
+        "created_at": created.isoformat() + "+00:00",
+        "updated_at": created.isoformat() + "+00:00",
+    }
+
+
+def _time(fn: Callable[[], Any], min_time: float) -> float:
+    """Median seconds per call over repeated rounds lasting ``min_time`` in total."""
+    fn()
+    rounds: List[float] = []
+    spent = 0.0
+    while spent < min_time or len(rounds) < 5:
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        rounds.append(elapsed)
+        spent += elapsed
+    rounds.sort()
+    return rounds[len(rounds) // 2]
+
+
+def run(sizes: List[int], min_time: float) -> Dict[str, Any]:
+    rng = random.Random(7)
+    results: Dict[str, Any] = {"orjson": orjson is not None, "cases": []}
+    for size in sizes:
+        stored = [json.dumps(vapi_call(rng)) for _ in range(size)]  # as kept in the call log store
+        next_cursor = "eyJjcmVhdGVkX2F0IjoiMjAyNCJ9"
+
+        def decoded(response_class):
+            def render():
+                content = {"success": True, "data": [json.loads(row) for row in stored], "next_cursor": next_cursor}
+                return response_class(jsonable_encoder(content)).body
+            return render
+
+        def raw():
+            body = raw_array(row.encode("utf-8") for row in stored)
+            return RawEnvelopeResponse(body, next_cursor=next_cursor).body
+
+        assert json.loads(raw()) == json.loads(decoded(JSONResponse)())
+        timings = {
+            "decode + stdlib": _time(decoded(JSONResponse), min_time),
+            "decode + fast": _time(decoded(FastJSONResponse), min_time),
+            "raw passthrough": _time(raw, min_time),
+        }
+        baseline = timings["decode + stdlib"]
+        results["cases"].append({
+            "calls": size,
+            "bytes": len(raw()),
+            "timings": {
+                name: {"ms": round(seconds * 1000, 3), "speedup": round(baseline / seconds, 1)}
+                for name, seconds in timings.items()
+            },
+        })
+    return results
+
+
+def _decode(body: bytes, media_type: str) -> Any:
+    if media_type == MSGPACK:
+        return msgpack.unpackb(body, raw=False)
+    return orjson.loads(body) if orjson is not None else json.loads(body)
+
+
+def run_lists(sizes: List[int], min_time: float) -> Dict[str, Any]:
+    rng = random.Random(11)
+    media_types = [JSON] + ([MSGPACK] if msgpack is not None else [])
+    results: Dict[str, Any] = {"msgpack": msgpack is not None, "cases": []}
+    for size in sizes:
+        rows = [client_row(rng) for _ in range(size)]
+        formats = {}
+        for media_type in media_types:
+            for list_format in ("rows", "columnar"):
+                def round_trip(media_type=media_type, list_format=list_format):
+                    data = columnar(rows) if list_format == "columnar" else rows
+                    body = encode({"success": True, "format": list_format, "data": data, "count": size}, media_type)
+                    _decode(body, media_type)
+                    return body
+
+                body = round_trip()
+                name = f"{'msgpack' if media_type == MSGPACK else 'json'} {list_format}"
+                formats[name] = {
+                    "bytes": len(body),
+                    "gzip_bytes": len(gzip.compress(body, 6)),
+                    "ms": _time(round_trip, min_time) * 1000,
+                }
+        baseline = formats["json rows"]
+        for timing in formats.values():
+            timing["size_ratio"] = round(timing["bytes"] / baseline["bytes"], 2)
+            timing["speedup"] = round(baseline["ms"] / timing["ms"], 1)
+            timing["ms"] = round(timing["ms"], 3)
+        results["cases"].append({"rows": size, "formats": formats})
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark call log response serialization")
+    parser.add_argument("--sizes", default="50,500", help="calls per response, comma separated")
+    parser.add_argument("--list-sizes", default="1000,5000", help="client rows per list response, comma separated")
+    parser.add_argument("--min-time", type=float, default=1.0, help="seconds to spend per measurement")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = run([int(size) for size in args.sizes.split(",")], args.min_time)
+    results["lists"] = run_lists([int(size) for size in args.list_sizes.split(",")], args.min_time)
+    print(f"JSON encoder: {'orjson' if results['orjson'] else 'json (orjson not installed)'}")
+    print(f"{'calls':>6}{'KiB':>9}  {'mode':<18}{'ms/response':>12}{'speedup':>9}")
+    for case in results["cases"]:
+        for name, timing in case["timings"].items():
+            print(f"{case['calls']:>6}{case['bytes'] / 1024:>9.0f}  {name:<18}{timing['ms']:>12.3f}"
+                  f"{timing['speedup']:>8.1f}x")
+    print()
+    print(f"{'rows':>6}  {'format':<18}{'KiB':>9}{'gzip KiB':>10}{'size':>7}{'ms enc+dec':>12}{'speedup':>9}")
+    for case in results["lists"]["cases"]:
+        for name, timing in case["formats"].items():
+            print(f"{case['rows']:>6}  {name:<18}{timing['bytes'] / 1024:>9.0f}{timing['gzip_bytes'] / 1024:>10.0f}"
+                  f"{timing['size_ratio']:>7.2f}{timing['ms']:>12.3f}{timing['speedup']:>8.1f}x")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""Bulk ingestion helpers for the ``/bulk`` create endpoints.
+
+Request bodies are either a JSON array of objects or newline-delimited JSON
+(``Content-Type: application/x-ndjson``). NDJSON bodies are parsed as they
+stream in, so memory use is bounded by the insert chunk size rather than the
+size of the upload. Every row is validated with the same Pydantic model as
+the single-row endpoint, valid rows are written as chunked multi-row inserts
+and the response reports errors per row index. A chunk Postgres rejected
+(constraint or data errors) is retried row by row; a chunk that failed in
+transit is reported as "outcome unknown" rather than written again.
+
+A JSON array longer than ``max_rows`` is rejected with 413 before anything
+is written. An NDJSON stream can't be counted up front, so ingestion stops
+at ``max_rows``: the rows before it are written and the response is the
+usual per-row report with ``truncated`` set.
+"""
+
+import json
+from typing import Any, AsyncContextManager, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, Type
+
+from fastapi import HTTPException, Request
+from postgrest.exceptions import APIError
+from pydantic import BaseModel, ValidationError
+
+from db import Database
+
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonlines",
+                        "application/x-jsonlines")
+
+
+# SQLSTATE classes of writes Postgres rejected outright: data exceptions,
+# integrity constraint violations, undefined columns / syntax errors
+_REJECTION_CLASSES = ("22", "23", "42")
+
+
+def _rejected(error: Exception) -> bool:
+    """Whether ``error`` means the insert was definitely not applied.
+
+    Anything else (timeouts, dropped connections, 5xx) may have come after
+    the rows were committed, so the insert must not be repeated.
+    """
+    if not isinstance(error, APIError):
+        return False
+    code = str(error.code or "")
+    return code.startswith("PGRST") or code[:2] in _REJECTION_CLASSES
+
+
+def _unknown(error: Exception) -> str:
+    return f"outcome unknown, the row may have been inserted: {error}"
+
+
+class _ParseError:
+    def __init__(self, message: str):
+        self.message = message
+
+
+async def iter_request_rows(request: Request, max_rows: Optional[int] = None) -> AsyncIterator[Any]:
+    """Yield decoded rows from a JSON array or streamed NDJSON request body."""
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+
+    if content_type in NDJSON_CONTENT_TYPES:
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield _decode_line(line)
+        if buffer.strip():
+            yield _decode_line(buffer)
+        return
+
+    try:
+        payload = json.loads(await request.body())
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Request body must be a JSON array or NDJSON")
+    if not isinstance(payload, list):
+        raise HTTPException(status_code=400, detail="Request body must be a JSON array or NDJSON")
+    if max_rows is not None and len(payload) > max_rows:
+        raise HTTPException(status_code=413, detail=f"Bulk requests are limited to {max_rows} rows")
+    for row in payload:
+        yield row
+
+
+def _decode_line(line: bytes) -> Any:
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return _ParseError(f"Invalid JSON: {e}")
+
+
+def _validation_errors(error: ValidationError) -> List[Dict[str, Any]]:
+    return [{"loc": list(err["loc"]), "msg": err["msg"]} for err in error.errors()]
+
+
+class BulkResult:
+    """Accumulates per-row outcomes for a bulk request."""
+
+    def __init__(self):
+        self.received = 0
+        self.inserted: List[Dict[str, Any]] = []
+        self.errors: List[Dict[str, Any]] = []
+        self.truncated = False
+
+    def to_response(self) -> Dict[str, Any]:
+        return {
+            "success": not self.errors,
+            "received": self.received,
+            "inserted": len(self.inserted),
+            "failed": len(self.errors),
+            "ids": self.inserted,
+            "errors": self.errors,
+            "truncated": self.truncated,
+        }
+
+
+async def bulk_insert(
+    db: Database,
+    table: str,
+    model: Type[BaseModel],
+    to_row: Callable[[Any], Dict[str, Any]],
+    rows: AsyncIterator[Any],
+    chunk_size: int = 500,
+    max_rows: Optional[int] = None,
+    on_chunk: Optional[Callable[[List[Any], List[Dict[str, Any]]], Awaitable[None]]] = None,
+    screen: Optional[Callable[[List[Tuple[int, Any]]], AsyncContextManager[List[Dict[str, Any]]]]] = None,
+) -> BulkResult:
+    """Validate ``rows`` with ``model`` and insert them into ``table`` in chunks.
+
+    ``on_chunk`` is awaited with the validated models and inserted records of
+    every successfully written chunk (for activity logging, rollups, ...).
+
+    ``screen``, if given, wraps each chunk's insert and ``on_chunk`` (e.g. to
+    hold locks) and is entered with the chunk's ``(index, model)`` pairs. It
+    yields one dict per row: ``{"error": message}`` skips the row and
+    reports it as failed, any other keys are added to the row's entry in
+    ``ids``.
+    """
+    result = BulkResult()
+    pending: List[Tuple[int, Any, Dict[str, Any]]] = []
+
+    async for raw in rows:
+        index = result.received
+        if max_rows is not None and index >= max_rows:
+            result.truncated = True
+            result.errors.append({"index": index, "errors": [{
+                "loc": [], "msg": f"truncated: bulk requests are limited to {max_rows} rows, this and later rows were not read"
+            }]})
+            break
+        result.received += 1
+
+        if isinstance(raw, _ParseError):
+            result.errors.append({"index": index, "errors": [{"loc": [], "msg": raw.message}]})
+            continue
+        if not isinstance(raw, dict):
+            result.errors.append({"index": index, "errors": [{"loc": [], "msg": "Row must be a JSON object"}]})
+            continue
+        try:
+            item = model(**raw)
+        except ValidationError as e:
+            result.errors.append({"index": index, "errors": _validation_errors(e)})
+            continue
+
+        pending.append((index, item, to_row(item)))
+        if len(pending) >= chunk_size:
+            await _insert_chunk(db, table, pending, result, on_chunk, screen)
+            pending = []
+
+    if pending:
+        await _insert_chunk(db, table, pending, result, on_chunk, screen)
+    return result
+
+
+async def _insert_chunk(db, table, pending, result, on_chunk, screen=None) -> None:
+    if screen is None:
+        await _write_chunk(db, table, pending, result, on_chunk, [{}] * len(pending))
+        return
+    async with screen([(index, item) for index, item, _ in pending]) as outcomes:
+        accepted = []
+        for entry, outcome in zip(pending, outcomes):
+            if "error" in outcome:
+                result.errors.append({"index": entry[0], "errors": [{"loc": [], "msg": outcome["error"]}]})
+            else:
+                accepted.append((entry, outcome))
+        if accepted:
+            await _write_chunk(db, table, [entry for entry, _ in accepted], result, on_chunk,
+                               [outcome for _, outcome in accepted])
+
+
+async def _write_chunk(db, table, pending, result, on_chunk, extras) -> None:
+    extra_by_index = {index: extra for (index, _, _), extra in zip(pending, extras)}
+    try:
+        response = await db.execute(table, lambda t: t.insert([row for _, _, row in pending]))
+        written = list(zip(pending, response.data or []))
+    except Exception as e:
+        if not _rejected(e):
+            # The chunk may have committed with only the response lost: re-inserting would duplicate it
+            for index, _, _ in pending:
+                result.errors.append({"index": index, "errors": [{"loc": [], "msg": _unknown(e)}]})
+            return
+        # Retry row by row so one bad row doesn't sink the whole chunk
+        written = []
+        for entry in pending:
+            index, _, row = entry
+            try:
+                response = await db.execute(table, lambda t: t.insert(row))
+                written.append((entry, response.data[0]))
+            except Exception as e:
+                message = str(e) if _rejected(e) else _unknown(e)
+                result.errors.append({"index": index, "errors": [{"loc": [], "msg": message}]})
+
+    for (index, _, _), record in written:
+        result.inserted.append({"index": index, "id": record.get("id"), **extra_by_index[index]})
+    if on_chunk and written:
+        await on_chunk([item for (_, item, _), _ in written], [record for _, record in written])
@@ -0,0 +1,140 @@
+"""In-process async cache for read-mostly upstream lookups.
+
+``AsyncTTLCache`` keeps loader results for ``ttl`` seconds. After that an
+entry is *stale* for another ``stale_ttl`` seconds: it is still returned
+immediately while one background task reloads it (stale-while-revalidate).
+Concurrent misses for the same key share a single load (single-flight), and
+failed loads are never cached: a failed refresh keeps serving the stale
+value, a failed miss raises to every waiter.
+
+Every cache registers itself in ``caches`` so ``/health`` can report hit
+rates, and can be invalidated explicitly when the data is known to change.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set, Union
+
+Loader = Callable[[], Awaitable[Any]]
+TTL = Union[float, Callable[[Any], float]]
+
+caches: Dict[str, "AsyncTTLCache"] = {}
+
+
+class _Entry:
+    __slots__ = ("value", "fresh_until", "stale_until")
+
+    def __init__(self, value: Any, ttl: float, stale_ttl: float):
+        now = time.monotonic()
+        self.value = value
+        self.fresh_until = now + ttl
+        self.stale_until = now + ttl + stale_ttl
+
+
+class AsyncTTLCache:
+    """LRU cache of async loader results with TTL, stale-while-revalidate and single-flight."""
+
+    def __init__(self, name: str, ttl: float = 300.0, stale_ttl: float = 0.0, maxsize: int = 1024):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._refreshing: Set[asyncio.Task] = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.load_errors = 0
+        self.evictions = 0
+        caches[name] = self
+
+    async def get(self, key: Hashable, loader: Loader, ttl: Optional[TTL] = None) -> Any:
+        """Return the cached value for ``key``, loading it with ``loader`` if needed.
+
+        ``ttl`` overrides the cache's default freshness for this key; it may be
+        a callable computing the freshness from the loaded value.
+        """
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is not None:
+            if now < entry.fresh_until:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return entry.value
+            if now < entry.stale_until:
+                self.stale_hits += 1
+                self._entries.move_to_end(key)
+                if key not in self._inflight:
+                    task = self._load(key, loader, ttl)
+                    self._refreshing.add(task)
+                    task.add_done_callback(self._refreshed)
+                return entry.value
+
+        self.misses += 1
+        task = self._inflight.get(key) or self._load(key, loader, ttl)
+        # Shielded so one cancelled caller doesn't cancel the load for the others
+        return await asyncio.shield(task)
+
+    def _load(self, key: Hashable, loader: Loader, ttl: Optional[TTL]) -> asyncio.Task:
+        async def load():
+            self.loads += 1
+            try:
+                value = await loader()
+            except Exception:
+                self.load_errors += 1
+                raise
+            finally:
+                current = self._inflight.get(key) is task
+                if current:
+                    del self._inflight[key]
+            # A load started before invalidate() must not repopulate the key
+            if current:
+                self._set(key, value, ttl)
+            return value
+
+        task = self._inflight[key] = asyncio.create_task(load())
+        return task
+
+    def _refreshed(self, task: asyncio.Task) -> None:
+        self._refreshing.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Error refreshing {self.name} cache: {task.exception()!r}")
+
+    def _set(self, key: Hashable, value: Any, ttl: Optional[TTL] = None) -> None:
+        if callable(ttl):
+            ttl = ttl(value)
+        self._entries[key] = _Entry(value, self.ttl if ttl is None else ttl, self.stale_ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[TTL] = None) -> None:
+        """Store a value obtained elsewhere (e.g. just written upstream)."""
+        self._inflight.pop(key, None)
+        self._set(key, value, ttl)
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """Drop ``key`` (or every key); the next read loads fresh data."""
+        if key is None:
+            self._entries.clear()
+            self._inflight.clear()
+        else:
+            self._entries.pop(key, None)
+            self._inflight.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.stale_hits) / lookups, 4) if lookups else None,
+            "loads": self.loads,
+            "load_errors": self.load_errors,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,275 @@
+"""Local, incrementally synced store of VAPI call records.
+
+``/voice-agents/{agent_id}/logs`` used to proxy VAPI ``GET /call`` on every
+page view. Calls are now kept in a local SQLite database and the endpoint
+reads from it, with filters and keyset pagination over any amount of
+history.
+
+The store is fed from two directions:
+
+* ``sync(agent_id)`` pulls calls created after the agent's high-watermark
+  (the newest ``createdAt`` seen so far), paging backwards through the new
+  range, then advances the watermark. The first sync backfills history.
+  Syncs run in the background, at most every ``sync_interval`` seconds per
+  agent; until an agent's backfill has finished, reads return whatever has
+  been stored so far;
+* ``call.ended`` webhooks upsert the final state of a call, which also
+  covers calls that were still in progress when they were synced. Fields
+  are merged into the stored record, so a partial webhook payload never
+  erases what a sync fetched.
+
+Like the webhook queue, all SQLite access runs on one dedicated thread.
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pagination import decode_cursor, encode_cursor
+from responses import raw_array
+
+# fetch(agent_id, limit, created_at_gt, created_at_le) -> calls, newest first
+Fetcher = Callable[[str, int, Optional[str], Optional[str]], Awaitable[List[Dict[str, Any]]]]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS calls (
+    id TEXT PRIMARY KEY,
+    assistant_id TEXT,
+    status TEXT,
+    ended_reason TEXT,
+    customer_number TEXT,
+    created_at TEXT NOT NULL,
+    ended_at TEXT,
+    cost REAL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_calls_assistant_created ON calls (assistant_id, created_at DESC, id DESC);
+CREATE TABLE IF NOT EXISTS call_sync_state (
+    assistant_id TEXT PRIMARY KEY,
+    watermark TEXT,
+    synced_at REAL NOT NULL
+);
+"""
+
+_UPSERT = """
+INSERT INTO calls (id, assistant_id, status, ended_reason, customer_number, created_at, ended_at, cost, data)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (id) DO UPDATE SET
+    assistant_id = COALESCE(excluded.assistant_id, calls.assistant_id),
+    status = COALESCE(excluded.status, calls.status),
+    ended_reason = COALESCE(excluded.ended_reason, calls.ended_reason),
+    customer_number = COALESCE(excluded.customer_number, calls.customer_number),
+    ended_at = COALESCE(excluded.ended_at, calls.ended_at),
+    cost = COALESCE(excluded.cost, calls.cost),
+    data = json_patch(calls.data, excluded.data)
+"""
+
+
+def timestamp(value: Any) -> Optional[str]:
+    """Normalize a datetime or ISO string to ``YYYY-MM-DDTHH:MM:SS.mmmZ`` (UTC).
+
+    A fixed format keeps lexicographic order equal to time order in SQLite.
+    """
+    if value is None or value == "":
+        return None
+    if not isinstance(value, datetime):
+        value = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+def _row(call: Dict[str, Any]) -> tuple:
+    return (
+        call["id"],
+        call.get("assistantId"),
+        call.get("status"),
+        call.get("endedReason"),
+        (call.get("customer") or {}).get("number"),
+        timestamp(call.get("createdAt")) or timestamp(datetime.utcnow()),
+        timestamp(call.get("endedAt")),
+        call.get("cost"),
+        json.dumps(call, separators=(",", ":"), default=str),
+    )
+
+
+class CallLogStore:
+    """SQLite-backed call history with per-agent incremental sync."""
+
+    def __init__(self, path: str, fetch: Fetcher, page_size: int = 100, sync_interval: float = 60.0):
+        self.path = path
+        self.fetch = fetch
+        self.page_size = page_size
+        self.sync_interval = sync_interval
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="call-logs")
+        self._conn: Optional[sqlite3.Connection] = None
+        self._syncs: Dict[str, asyncio.Task] = {}
+        self.synced_calls = 0
+        self.webhook_calls = 0
+        self.sync_errors = 0
+
+    async def _call(self, fn: Callable[..., Any], *args: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+        return self._conn
+
+    # -- writes --------------------------------------------------------
+
+    def _upsert(self, calls: List[Dict[str, Any]]) -> None:
+        conn = self._connection()
+        with conn:
+            conn.executemany(_UPSERT, [_row(call) for call in calls if call.get("id")])
+
+    async def record(self, call: Dict[str, Any]) -> None:
+        """Upsert a single call (e.g. from a ``call.ended`` webhook)."""
+        if call.get("id"):
+            await self._call(self._upsert, [call])
+            self.webhook_calls += 1
+
+    def _state(self, agent_id: str) -> Tuple[Optional[str], float]:
+        row = self._connection().execute(
+            "SELECT watermark, synced_at FROM call_sync_state WHERE assistant_id = ?", (agent_id,)
+        ).fetchone()
+        return (row[0], row[1]) if row else (None, 0.0)
+
+    def _save_state(self, agent_id: str, watermark: Optional[str]) -> None:
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "INSERT INTO call_sync_state (assistant_id, watermark, synced_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (assistant_id) DO UPDATE SET watermark = excluded.watermark, synced_at = excluded.synced_at",
+                (agent_id, watermark, time.time()),
+            )
+
+    # -- sync ----------------------------------------------------------
+
+    async def sync(self, agent_id: str) -> int:
+        """Pull calls newer than the agent's watermark; returns how many were stored."""
+        watermark, _ = await self._call(self._state, agent_id)
+        newest = watermark
+        upper = None
+        stored = 0
+        while True:
+            page = await self.fetch(agent_id, self.page_size, watermark, upper)
+            if page:
+                await self._call(self._upsert, page)
+                stored += len(page)
+                created = [timestamp(call["createdAt"]) for call in page if call.get("createdAt")]
+                if created:
+                    newest = max(filter(None, [newest, *created]))
+            if len(page) < self.page_size:
+                break
+            # More than a page is new: continue below the oldest call of this page
+            oldest = min(timestamp(call["createdAt"]) for call in page if call.get("createdAt"))
+            if oldest == upper:
+                break
+            upper = oldest
+        await self._call(self._save_state, agent_id, newest)
+        self.synced_calls += stored
+        return stored
+
+    async def refresh(self, agent_id: str, force: bool = False) -> bool:
+        """Sync ``agent_id`` if it is due; returns True while its first backfill is running.
+
+        Syncs run in the background and concurrent callers share one. The
+        first sync pulls the agent's whole history, so it is never awaited;
+        ``force`` waits for incremental syncs only.
+        """
+        _, synced_at = await self._call(self._state, agent_id)
+        task = self._syncs.get(agent_id)
+        if task is None:
+            if not force and time.time() - synced_at < self.sync_interval:
+                return False
+            task = self._syncs[agent_id] = asyncio.create_task(self._sync_logged(agent_id))
+            task.add_done_callback(lambda _: self._syncs.pop(agent_id, None))
+        if not synced_at:
+            return True
+        if force:
+            await asyncio.shield(task)
+        return False
+
+    async def _sync_logged(self, agent_id: str) -> None:
+        try:
+            await self.sync(agent_id)
+        except Exception as e:
+            self.sync_errors += 1
+            print(f"Error syncing calls for agent {agent_id}: {e}")
+
+    # -- reads ---------------------------------------------------------
+
+    def _query(self, agent_id: str, filters: Dict[str, Any], limit: int, cursor: Optional[str]) -> List[tuple]:
+        sql = "SELECT id, created_at, data FROM calls WHERE assistant_id = ?"
+        params: List[Any] = [agent_id]
+        for column in ("status", "ended_reason", "customer_number"):
+            if filters.get(column):
+                sql += f" AND {column} = ?"
+                params.append(filters[column])
+        if filters.get("since"):
+            sql += " AND created_at >= ?"
+            params.append(timestamp(filters["since"]))
+        if filters.get("until"):
+            sql += " AND created_at < ?"
+            params.append(timestamp(filters["until"]))
+        if cursor:
+            created_at, call_id = decode_cursor(cursor)
+            sql += " AND (created_at < ? OR (created_at = ? AND id < ?))"
+            params.extend([created_at, created_at, call_id])
+        sql += " ORDER BY created_at DESC, id DESC LIMIT ?"
+        params.append(limit + 1)
+        return self._connection().execute(sql, params).fetchall()
+
+    @staticmethod
+    def _page(rows: List[tuple], limit: int) -> Tuple[List[tuple], Optional[str]]:
+        if len(rows) > limit:
+            rows = rows[:limit]
+            return rows, encode_cursor(rows[-1][1], rows[-1][0])
+        return rows, None
+
+    def _query_raw(self, agent_id: str, filters: Dict[str, Any], limit: int,
+                   cursor: Optional[str]) -> Tuple[bytes, Optional[str]]:
+        rows, next_cursor = self._page(self._query(agent_id, filters, limit, cursor), limit)
+        return raw_array(data.encode("utf-8") for _, _, data in rows), next_cursor
+
+    async def query(self, agent_id: str, limit: int = 50, cursor: Optional[str] = None,
+                    **filters: Any) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Return one page of calls, newest first, and the cursor for the next."""
+        rows, next_cursor = self._page(await self._call(self._query, agent_id, filters, limit, cursor), limit)
+        return [json.loads(data) for _, _, data in rows], next_cursor
+
+    async def query_raw(self, agent_id: str, limit: int = 50, cursor: Optional[str] = None,
+                        **filters: Any) -> Tuple[bytes, Optional[str]]:
+        """Like ``query``, but the page is the stored JSON joined into an array, never decoded."""
+        return await self._call(self._query_raw, agent_id, filters, limit, cursor)
+
+    # -- lifecycle -----------------------------------------------------
+
+    async def stop(self) -> None:
+        tasks = list(self._syncs.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._conn is not None:
+            await self._call(self._conn.close)
+            self._conn = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "syncing": len(self._syncs),
+            "synced_calls": self.synced_calls,
+            "webhook_calls": self.webhook_calls,
+            "sync_errors": self.sync_errors,
+        }
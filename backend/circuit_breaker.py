@@ -0,0 +1,188 @@
+"""Per-upstream circuit breakers with adaptive read timeouts.
+
+Each upstream registered in ``http_clients`` gets a ``CircuitBreaker`` that
+sees every request made through its pooled client, so VAPI, Twilio, Stripe
+and Google calls are protected without changes at the call sites.
+
+* **closed**: requests flow. The outcome of the last ``window_size`` calls
+  is kept; once at least ``min_calls`` are recorded and either the failure
+  rate (transport errors, timeouts, 5xx) or the slow-call rate (slower than
+  ``slow_call_threshold``) reaches its threshold, the breaker opens.
+* **open**: requests fail immediately with ``CircuitOpenError`` (a 503) for
+  ``open_duration`` seconds instead of tying up a worker until the httpx
+  timeout.
+* **half-open**: up to ``half_open_max_calls`` probe requests are let
+  through; if they all succeed the breaker closes, any failure re-opens it.
+
+While closed, the read timeout adapts to the upstream's recent latency:
+``p99 * timeout_multiplier``, clamped between ``min_timeout`` and the
+configured read timeout, so a degrading upstream fails fast instead of
+holding connections for the full static timeout.
+
+Thresholds come from ``<UPSTREAM>_BREAKER_*`` environment variables with
+``BREAKER_*`` as the default for every upstream.
+"""
+
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from fastapi import HTTPException
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpenError(HTTPException):
+    """Raised instead of calling an upstream whose breaker is open."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(
+            status_code=503,
+            detail=f"{name} is temporarily unavailable",
+            headers={"Retry-After": str(max(1, int(retry_after + 0.999)))},
+        )
+        self.upstream = name
+
+
+def _env(upstream: str, name: str, default: str) -> str:
+    return os.getenv(f"{upstream.upper()}_BREAKER_{name}", os.getenv(f"BREAKER_{name}", default))
+
+
+@dataclass
+class BreakerConfig:
+    enabled: bool = True
+    window_size: int = 20
+    min_calls: int = 10
+    failure_rate_threshold: float = 0.5
+    slow_call_threshold: float = 5.0
+    slow_call_rate_threshold: float = 0.8
+    open_duration: float = 30.0
+    half_open_max_calls: int = 2
+    adaptive_timeout: bool = True
+    timeout_multiplier: float = 3.0
+    min_timeout: float = 2.0
+
+    @classmethod
+    def from_env(cls, name: str) -> "BreakerConfig":
+        default = cls()
+        return cls(
+            enabled=_env(name, "ENABLED", "true").lower() in ("1", "true", "yes"),
+            window_size=int(_env(name, "WINDOW_SIZE", str(default.window_size))),
+            min_calls=int(_env(name, "MIN_CALLS", str(default.min_calls))),
+            failure_rate_threshold=float(_env(name, "FAILURE_RATE", str(default.failure_rate_threshold))),
+            slow_call_threshold=float(_env(name, "SLOW_CALL_SECONDS", str(default.slow_call_threshold))),
+            slow_call_rate_threshold=float(_env(name, "SLOW_CALL_RATE", str(default.slow_call_rate_threshold))),
+            open_duration=float(_env(name, "OPEN_SECONDS", str(default.open_duration))),
+            half_open_max_calls=int(_env(name, "HALF_OPEN_CALLS", str(default.half_open_max_calls))),
+            adaptive_timeout=_env(name, "ADAPTIVE_TIMEOUT", "true").lower() in ("1", "true", "yes"),
+            timeout_multiplier=float(_env(name, "TIMEOUT_MULTIPLIER", str(default.timeout_multiplier))),
+            min_timeout=float(_env(name, "MIN_TIMEOUT", str(default.min_timeout))),
+        )
+
+
+class CircuitBreaker:
+    """Tracks call outcomes for one upstream and decides whether to allow calls."""
+
+    def __init__(self, name: str, config: BreakerConfig, max_timeout: float):
+        self.name = name
+        self.config = config
+        self.max_timeout = max_timeout
+        self.state = CLOSED
+        self._outcomes: deque = deque(maxlen=config.window_size)  # (failed, slow)
+        self._latencies: deque = deque(maxlen=100)
+        self._opened_at = 0.0
+        self._probes = 0
+        self._probe_successes = 0
+        self.opened = 0
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        """Reserve a call; raises ``CircuitOpenError`` when calls are not allowed.
+
+        Returns ``True`` if the call is a half-open probe.
+        """
+        if not self.config.enabled:
+            return False
+        if self.state == OPEN:
+            remaining = self._opened_at + self.config.open_duration - time.monotonic()
+            if remaining > 0:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, remaining)
+            self._transition(HALF_OPEN)
+        if self.state == HALF_OPEN:
+            if self._probes >= self.config.half_open_max_calls:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, 1.0)
+            self._probes += 1
+            return True
+        return False
+
+    def record(self, probe: bool, failed: bool, elapsed: float) -> None:
+        if not self.config.enabled:
+            return
+        slow = elapsed >= self.config.slow_call_threshold
+        if probe:
+            self._probes = max(0, self._probes - 1)
+            if self.state != HALF_OPEN:
+                return
+            if failed or slow:
+                self._open()
+            else:
+                self._probe_successes += 1
+                if self._probe_successes >= self.config.half_open_max_calls:
+                    self._transition(CLOSED)
+            return
+        if self.state != CLOSED:
+            return
+
+        self._outcomes.append((failed, slow))
+        if not failed:
+            self._latencies.append(elapsed)
+        if len(self._outcomes) >= self.config.min_calls:
+            failures = sum(1 for f, _ in self._outcomes if f) / len(self._outcomes)
+            slow_calls = sum(1 for _, s in self._outcomes if s) / len(self._outcomes)
+            if failures >= self.config.failure_rate_threshold or slow_calls >= self.config.slow_call_rate_threshold:
+                self._open()
+
+    def release(self, probe: bool) -> None:
+        """Give back a probe slot for a call that was cancelled before completing."""
+        if probe:
+            self._probes = max(0, self._probes - 1)
+
+    def timeout(self) -> Optional[float]:
+        """Adaptive read timeout, or ``None`` to keep the configured one."""
+        if not self.config.enabled or not self.config.adaptive_timeout:
+            return None
+        if len(self._latencies) < self.config.min_calls:
+            return None
+        latencies = sorted(self._latencies)
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        return min(self.max_timeout, max(self.config.min_timeout, p99 * self.config.timeout_multiplier))
+
+    def _open(self) -> None:
+        self.opened += 1
+        self._opened_at = time.monotonic()
+        self._transition(OPEN)
+
+    def _transition(self, state: str) -> None:
+        if state != self.state:
+            print(f"Circuit breaker for {self.name}: {self.state} -> {state}")
+        self.state = state
+        self._probes = 0
+        self._probe_successes = 0
+        if state == CLOSED:
+            self._outcomes.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        outcomes = list(self._outcomes)
+        timeout = self.timeout()
+        return {
+            "state": self.state if self.config.enabled else "disabled",
+            "failure_rate": round(sum(1 for f, _ in outcomes if f) / len(outcomes), 3) if outcomes else None,
+            "slow_call_rate": round(sum(1 for _, s in outcomes if s) / len(outcomes), 3) if outcomes else None,
+            "read_timeout": round(timeout, 3) if timeout is not None else self.max_timeout,
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,123 @@
+"""Non-blocking data access layer over the synchronous Supabase client.
+
+``supabase-py`` performs blocking HTTP calls, so executing a query directly
+inside an ``async def`` route stalls the event loop for the full PostgREST
+round-trip. Every query is instead built and executed on a bounded thread
+pool; the pool size (``DB_MAX_CONCURRENCY``) caps how many queries are in
+flight at once and anything beyond that waits in the executor queue.
+
+Usage::
+
+    result = await db.execute("clients", lambda t: t.select("*").eq("status", "active"))
+    result = await db.rpc("analytics_revenue_summary", {"p_start": ..., "p_end": ...})
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+from metrics import DB_LATENCY
+
+
+@dataclass
+class _LabelStats:
+    calls: int = 0
+    errors: int = 0
+    total_time: float = 0.0
+    max_time: float = 0.0
+
+
+class Database:
+    """Runs Supabase queries on a bounded thread pool and records timings."""
+
+    def __init__(self, client: Any, max_concurrency: int = 10):
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._labels: Dict[str, _LabelStats] = {}
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.total_queue_wait = 0.0
+        self.max_queue_wait = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.client is not None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="db")
+        return self._executor
+
+    async def run(self, fn: Callable[..., Any], *args: Any, label: str = "call") -> Any:
+        """Run a blocking callable on the pool, recording queue wait and run time."""
+        submitted = time.perf_counter()
+        with self._lock:
+            self.queued += 1
+
+        def task():
+            started = time.perf_counter()
+            wait = started - submitted
+            with self._lock:
+                self.queued -= 1
+                self.in_flight += 1
+                self.total_queue_wait += wait
+                self.max_queue_wait = max(self.max_queue_wait, wait)
+                stats = self._labels.setdefault(label, _LabelStats())
+            failed = False
+            try:
+                return fn(*args)
+            except Exception:
+                failed = True
+                raise
+            finally:
+                elapsed = time.perf_counter() - started
+                with self._lock:
+                    stats.calls += 1
+                    stats.errors += failed
+                    stats.total_time += elapsed
+                    stats.max_time = max(stats.max_time, elapsed)
+                    self.in_flight -= 1
+                    self.completed += 1
+                DB_LATENCY.observe((label, "error" if failed else "ok"), elapsed)
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, task)
+
+    async def execute(self, table: str, build: Callable[[Any], Any]) -> Any:
+        """Build a query against ``table`` with ``build`` and execute it off-loop."""
+        return await self.run(lambda: build(self.client.table(table)).execute(), label=table)
+
+    async def rpc(self, fn: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        """Call a Postgres function through PostgREST off-loop."""
+        return await self.run(lambda: self.client.rpc(fn, params or {}).execute(), label=f"rpc:{fn}")
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "queued": self.queued,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "avg_queue_wait_ms": round(self.total_queue_wait / self.completed * 1000, 2) if self.completed else None,
+            "max_queue_wait_ms": round(self.max_queue_wait * 1000, 2),
+            "queries": {
+                label: {
+                    "calls": stats.calls,
+                    "errors": stats.errors,
+                    "avg_ms": round(stats.total_time / stats.calls * 1000, 2) if stats.calls else None,
+                    "max_ms": round(stats.max_time * 1000, 2),
+                }
+                for label, stats in self._labels.items()
+            },
+        }
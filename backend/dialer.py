@@ -0,0 +1,331 @@
+"""Outbound dialer: schedules VAPI calls for lists of numbers.
+
+A dialer job is an agent plus a list of numbers. A single scheduler task
+places calls as capacity allows:
+
+* at most ``per_agent_limit`` live calls per agent and ``global_limit``
+  across all agents. A call holds its slot from the moment it is placed
+  until VAPI reports ``call.ended`` through the webhook queue (or
+  ``call_timeout`` passes without one);
+* optionally only inside a calling-hour window, evaluated in the number's
+  (or the job's) time zone;
+* busy / no-answer outcomes are retried after ``retry_delay`` until
+  ``max_attempts`` is reached. So are create-call requests that never
+  reached VAPI (connect errors) or got a 429/5xx. A request that was sent
+  but got no response (``CallOutcomeUnknown``) is not retried, since the
+  call may already have been placed.
+
+Outcomes come from webhooks, never from polling VAPI. Job state lives in
+memory; jobs still running at shutdown are lost on restart.
+"""
+
+import asyncio
+import time
+import uuid
+from datetime import datetime, time as dtime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from fastapi import HTTPException
+
+PlaceCall = Callable[[str, str], Awaitable[Dict[str, Any]]]
+
+# endedReason values that mean nobody picked up and the number is worth retrying
+RETRY_REASONS = {"customer-busy", "customer-did-not-answer", "busy", "no-answer"}
+
+_TERMINAL = ("completed", "failed", "cancelled")
+
+
+class CallOutcomeUnknown(HTTPException):
+    """The create-call request was sent but no response came back."""
+
+    def __init__(self, detail: str = "VAPI did not respond; the call may have been placed"):
+        super().__init__(status_code=504, detail=detail)
+
+
+def parse_window(start: Optional[str], end: Optional[str]) -> Optional[tuple]:
+    """Parse ``"09:00"``/``"20:00"`` into a window, or ``None`` for "any time"."""
+    if not start and not end:
+        return None
+    try:
+        return dtime.fromisoformat(start or "00:00"), dtime.fromisoformat(end or "23:59:59")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Calling window times must be HH:MM")
+
+
+def check_timezone(name: str) -> str:
+    try:
+        ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise HTTPException(status_code=400, detail=f"Unknown time zone '{name}'")
+    return name
+
+
+def next_window_open(now: float, tz: str, window: tuple) -> Optional[float]:
+    """Return ``None`` if ``now`` is inside the window, else when it next opens."""
+    start, end = window
+    local = datetime.fromtimestamp(now, timezone.utc).astimezone(ZoneInfo(tz))
+    current = local.time()
+    if start <= end:
+        inside = start <= current < end
+    else:  # window wraps past midnight
+        inside = current >= start or current < end
+    if inside:
+        return None
+    opens = local.replace(hour=start.hour, minute=start.minute, second=0, microsecond=0)
+    if opens <= local:
+        opens += timedelta(days=1)
+    return opens.timestamp()
+
+
+class DialerJob:
+    def __init__(self, user_id: str, agent_id: str, numbers: List[Dict[str, Any]],
+                 timezone_name: str, window: Optional[tuple], max_attempts: int, retry_delay: float):
+        self.id = str(uuid.uuid4())
+        self.user_id = user_id
+        self.agent_id = agent_id
+        self.timezone = timezone_name
+        self.window = window
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.status = "running"
+        self.created_at = datetime.utcnow().isoformat()
+        self.completed_at: Optional[str] = None
+        self.entries = [
+            {"number": n["number"], "timezone": n.get("timezone") or timezone_name, "status": "pending",
+             "attempts": 0, "call_id": None, "outcome": None, "error": None, "next_attempt_at": 0.0}
+            for n in numbers
+        ]
+
+    def summary(self) -> Dict[str, Any]:
+        counts = {"pending": 0, "dialing": 0, "live": 0, "completed": 0, "failed": 0, "cancelled": 0}
+        for entry in self.entries:
+            counts[entry["status"]] += 1
+        return {
+            "id": self.id,
+            "agent_id": self.agent_id,
+            "status": self.status,
+            "total": len(self.entries),
+            **counts,
+            "created_at": self.created_at,
+            "completed_at": self.completed_at,
+        }
+
+
+class Dialer:
+    """Places calls for dialer jobs within per-agent and global live-call limits."""
+
+    def __init__(self, place_call: PlaceCall, global_limit: int = 20, per_agent_limit: int = 5,
+                 max_attempts: int = 3, retry_delay: float = 900.0, call_timeout: float = 3600.0,
+                 poll_interval: float = 30.0, retain: int = 100):
+        self.place_call = place_call
+        self.global_limit = global_limit
+        self.per_agent_limit = per_agent_limit
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.call_timeout = call_timeout
+        self.poll_interval = poll_interval
+        self.retain = retain
+        self._jobs: Dict[str, DialerJob] = {}
+        self._calls: Dict[str, tuple] = {}  # call_id -> (job, entry, placed_at)
+        self._early_endings: Dict[str, Dict[str, Any]] = {}
+        self._live: Dict[str, int] = {}  # agent_id -> calls holding a slot
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._dialing: set = set()
+        self.placed = 0
+        self.completed = 0
+        self.retried = 0
+        self.failed = 0
+
+    @property
+    def live_calls(self) -> int:
+        return sum(self._live.values())
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    def submit(self, user_id: str, agent_id: str, numbers: List[Dict[str, Any]], timezone_name: str = "UTC",
+               window: Optional[tuple] = None, max_attempts: Optional[int] = None,
+               retry_delay: Optional[float] = None) -> DialerJob:
+        """Register a job; calls are placed by the scheduler task."""
+        job = DialerJob(user_id, agent_id, numbers, timezone_name, window,
+                        max_attempts or self.max_attempts,
+                        self.retry_delay if retry_delay is None else retry_delay)
+        self._jobs[job.id] = job
+        self._prune()
+        self._wake()
+        return job
+
+    def get(self, job_id: str, user_id: str) -> DialerJob:
+        job = self._jobs.get(job_id)
+        if job is None or job.user_id != user_id:
+            raise HTTPException(status_code=404, detail="Dialer job not found")
+        return job
+
+    def cancel(self, job: DialerJob) -> None:
+        """Stop placing new calls for ``job``; live calls run to completion."""
+        for entry in job.entries:
+            if entry["status"] == "pending":
+                entry["status"] = "cancelled"
+        if job.status == "running":
+            job.status = "cancelled"
+            self._finish_if_done(job)
+
+    def _wake(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    # -- scheduling ----------------------------------------------------
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            delay = self._dispatch()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def _dispatch(self) -> float:
+        """Place every call that is due and fits; return seconds until the next check."""
+        now = time.time()
+        next_check = now + self.poll_interval
+
+        for call_id, (job, entry, placed_at) in list(self._calls.items()):
+            if now - placed_at > self.call_timeout:
+                self._end(call_id, {"endedReason": "timeout"}, now)
+
+        for job in list(self._jobs.values()):
+            if job.status != "running":
+                continue
+            for entry in job.entries:
+                if entry["status"] != "pending":
+                    continue
+                if self.live_calls >= self.global_limit:
+                    return max(0.0, next_check - now)
+                if self._live.get(job.agent_id, 0) >= self.per_agent_limit:
+                    break
+                if entry["next_attempt_at"] > now:
+                    next_check = min(next_check, entry["next_attempt_at"])
+                    continue
+                if job.window is not None:
+                    opens = next_window_open(now, entry["timezone"], job.window)
+                    if opens is not None:
+                        entry["next_attempt_at"] = opens
+                        next_check = min(next_check, opens)
+                        continue
+                self._dial(job, entry)
+        return max(0.0, next_check - now)
+
+    def _dial(self, job: DialerJob, entry: Dict[str, Any]) -> None:
+        entry["status"] = "dialing"
+        entry["attempts"] += 1
+        self._live[job.agent_id] = self._live.get(job.agent_id, 0) + 1
+        task = asyncio.create_task(self._place(job, entry))
+        self._dialing.add(task)
+        task.add_done_callback(self._dialing.discard)
+
+    async def _place(self, job: DialerJob, entry: Dict[str, Any]) -> None:
+        try:
+            result = await self.place_call(job.agent_id, entry["number"])
+            call_id = (result.get("data") or {}).get("id")
+        except CallOutcomeUnknown as e:
+            # Dialing again could ring the number twice
+            self._release(job.agent_id)
+            entry["outcome"] = "unknown"
+            self._retry_or_fail(job, entry, str(e.detail), False)
+            self._wake()
+            return
+        except Exception as e:
+            status = getattr(e, "status_code", None)
+            retryable = status is not None and (status == 429 or status >= 500)
+            self._release(job.agent_id)
+            self._retry_or_fail(job, entry, str(getattr(e, "detail", e)), retryable)
+            self._wake()
+            return
+
+        self.placed += 1
+        entry.update(status="live", call_id=call_id, error=None)
+        if not call_id:
+            # Can't match a webhook to this call: free the slot now
+            entry.update(status="completed", outcome="unknown")
+            self._release(job.agent_id)
+            self._finish_if_done(job)
+            self._wake()
+            return
+        self._calls[call_id] = (job, entry, time.time())
+        early = self._early_endings.pop(call_id, None)
+        if early is not None:
+            self._end(call_id, early, time.time())
+
+    def _release(self, agent_id: str) -> None:
+        self._live[agent_id] = max(0, self._live.get(agent_id, 0) - 1)
+
+    def _retry_or_fail(self, job: DialerJob, entry: Dict[str, Any], error: str, retryable: bool) -> None:
+        entry["error"] = error
+        if job.status == "running" and retryable and entry["attempts"] < job.max_attempts:
+            self.retried += 1
+            entry.update(status="pending", next_attempt_at=time.time() + job.retry_delay)
+        else:
+            self.failed += 1
+            entry["status"] = "failed"
+            self._finish_if_done(job)
+
+    def _finish_if_done(self, job: DialerJob) -> None:
+        if all(entry["status"] in _TERMINAL for entry in job.entries):
+            if job.status == "running":
+                job.status = "completed"
+            job.completed_at = job.completed_at or datetime.utcnow().isoformat()
+
+    # -- outcomes ------------------------------------------------------
+
+    def call_ended(self, call_id: str, data: Dict[str, Any]) -> None:
+        """Record a ``call.ended`` webhook and free the call's slot."""
+        if call_id in self._calls:
+            self._end(call_id, data, time.time())
+            self._wake()
+        elif self._dialing:
+            # The webhook beat the create-call response; apply it once the id is known
+            self._early_endings[call_id] = data
+            while len(self._early_endings) > 1000:
+                self._early_endings.pop(next(iter(self._early_endings)))
+
+    def _end(self, call_id: str, data: Dict[str, Any], now: float) -> None:
+        job, entry, _ = self._calls.pop(call_id)
+        self._release(job.agent_id)
+        reason = data.get("endedReason") or (data.get("call") or {}).get("endedReason") or "ended"
+        entry["outcome"] = reason
+        if reason in RETRY_REASONS or reason == "timeout":
+            self._retry_or_fail(job, entry, reason, reason in RETRY_REASONS)
+        else:
+            self.completed += 1
+            entry.update(status="completed", error=None)
+            self._finish_if_done(job)
+
+    def _prune(self) -> None:
+        finished = [job for job in self._jobs.values() if job.completed_at]
+        for job in finished[:max(0, len(finished) - self.retain)]:
+            del self._jobs[job.id]
+
+    async def stop(self) -> None:
+        tasks = list(self._dialing) + ([self._task] if self._task else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "jobs_running": sum(1 for job in self._jobs.values() if job.status == "running"),
+            "live_calls": self.live_calls,
+            "global_limit": self.global_limit,
+            "per_agent_limit": self.per_agent_limit,
+            "placed": self.placed,
+            "completed": self.completed,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
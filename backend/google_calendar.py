@@ -0,0 +1,407 @@
+"""Google Calendar token storage and batched event sync.
+
+Tokens: the OAuth tokens returned by the code exchange are persisted per
+user in ``google_calendar_tokens`` (service-role access only). Access
+tokens are served from an in-memory ``AsyncTTLCache``: an entry is fresh
+until ``refresh_ahead`` seconds before the token expires, then stale until
+``expiry_skew`` seconds before it, and a stale hit returns the still-valid
+token while a single background refresh fetches the next one. Refreshes are
+single-flight per user and the refreshed token is written back, so a
+restart picks up where the cache left off.
+
+Sync: appointment events are queued (``CalendarSyncQueue``) and flushed per
+user through Google's batch endpoint, up to ``batch_size`` (at most 50)
+inserts per HTTP request. A flush of many appointments costs one token
+lookup per user and one request per 50 events instead of one of each per
+appointment. Created event ids are written to ``appointments.google_calendar_id``;
+rate-limited, unauthorized and 5xx inserts (and failed batch requests) are
+retried after ``retry_delay`` seconds, up to ``max_attempts``.
+
+Inserts are not idempotent by themselves and a failed batch may have been
+partly applied, so every event gets an id derived from its appointment id
+(``event_id``): a replayed insert of an event that already exists gets a
+409, which counts as synced instead of creating a duplicate.
+
+Only users with stored tokens should be queued; ``GoogleTokenStore.connected``
+answers that from a short-lived cache.
+"""
+
+import asyncio
+import base64
+import json
+import re
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from cache import AsyncTTLCache
+from db import Database
+
+GOOGLE_BATCH_LIMIT = 50
+RETRY_STATUSES = {401, 403, 429, 500, 502, 503, 504}
+
+_STOP = object()
+
+# (status, parsed JSON body) per batch part, keyed by the part's Content-ID
+BatchResults = Dict[str, Tuple[int, Any]]
+
+
+class CalendarNotConnected(HTTPException):
+    """The user has no usable Google Calendar authorization."""
+
+    def __init__(self, detail: str = "Google Calendar is not connected"):
+        super().__init__(status_code=409, detail=detail)
+
+
+def event_id(appointment_id: str) -> str:
+    """The Google event id for an appointment (base32hex, as Google requires)."""
+    return base64.b32hexencode(str(appointment_id).encode()).decode().lower().rstrip("=")
+
+
+def _timestamp(value: Any) -> float:
+    if not value:
+        return 0.0
+    parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+class GoogleTokenStore:
+    """Persisted OAuth tokens plus a proactively refreshed access-token cache."""
+
+    def __init__(self, db: Database, refresh: Callable[[str], Awaitable[Dict[str, Any]]],
+                 refresh_ahead: float = 300.0, expiry_skew: float = 60.0, maxsize: int = 10000,
+                 table: str = "google_calendar_tokens", connection_ttl: float = 60.0):
+        self.db = db
+        self.refresh = refresh
+        self.refresh_ahead = refresh_ahead
+        self.table = table
+        self.cache = AsyncTTLCache(
+            "google_access_tokens", ttl=0.0, stale_ttl=max(0.0, refresh_ahead - expiry_skew), maxsize=maxsize
+        )
+        self.connections = AsyncTTLCache("google_calendar_connections", ttl=connection_ttl, maxsize=maxsize)
+
+    def _ttl(self, value: Tuple[str, float]) -> float:
+        return max(0.0, value[1] - time.time() - self.refresh_ahead)
+
+    async def save(self, user_id: str, token_data: Dict[str, Any]) -> None:
+        """Persist a token response and prime the cache with its access token."""
+        await self._store(user_id, token_data)
+
+    async def _store(self, user_id: str, token_data: Dict[str, Any]) -> Tuple[str, float]:
+        expires_at = time.time() + float(token_data.get("expires_in") or 3600)
+        row = {
+            "user_id": user_id,
+            "access_token": token_data["access_token"],
+            "expires_at": datetime.fromtimestamp(expires_at, timezone.utc).isoformat(),
+            "updated_at": datetime.utcnow().isoformat(),
+        }
+        # Google only returns a refresh token on consent; keep the stored one otherwise
+        if token_data.get("refresh_token"):
+            row["refresh_token"] = token_data["refresh_token"]
+        if token_data.get("scope"):
+            row["scope"] = token_data["scope"]
+        await self.db.execute(self.table, lambda t: t.upsert(row, on_conflict="user_id"))
+        value = (token_data["access_token"], expires_at)
+        self.cache.set(user_id, value, self._ttl)
+        self.connections.set(user_id, True)
+        return value
+
+    async def connected(self, user_id: str) -> bool:
+        """Whether ``user_id`` has stored tokens (without refreshing anything)."""
+        return await self.connections.get(user_id, lambda: self._has_tokens(user_id))
+
+    async def _has_tokens(self, user_id: str) -> bool:
+        result = await self.db.execute(self.table, lambda t: t.select("user_id").eq("user_id", user_id).limit(1))
+        return bool(result.data)
+
+    async def access_token(self, user_id: str) -> str:
+        """A valid access token for ``user_id``; raises ``CalendarNotConnected``."""
+        token, _ = await self.cache.get(user_id, lambda: self._load(user_id), self._ttl)
+        return token
+
+    async def _load(self, user_id: str) -> Tuple[str, float]:
+        result = await self.db.execute(self.table, lambda t: t.select("*").eq("user_id", user_id).limit(1))
+        if not result.data:
+            raise CalendarNotConnected()
+        row = result.data[0]
+        expires_at = _timestamp(row.get("expires_at"))
+        if row.get("access_token") and expires_at - time.time() > self.refresh_ahead:
+            return row["access_token"], expires_at
+        if not row.get("refresh_token"):
+            raise CalendarNotConnected("Google Calendar authorization expired; reconnect the calendar")
+
+        try:
+            token_data = await self.refresh(row["refresh_token"])
+        except CalendarNotConnected:
+            # Refresh token revoked or expired: forget it so the user is asked to reconnect
+            await self.disconnect(user_id)
+            raise
+        return await self._store(user_id, token_data)
+
+    def invalidate(self, user_id: str) -> None:
+        """Drop a cached access token Google rejected; the next lookup refreshes it."""
+        self.cache.invalidate(user_id)
+
+    async def disconnect(self, user_id: str) -> None:
+        self.cache.invalidate(user_id)
+        await self.db.execute(self.table, lambda t: t.delete().eq("user_id", user_id))
+        self.connections.set(user_id, False)
+
+# -- batch requests ----------------------------------------------------
+
+def encode_batch(parts: List[Tuple[str, str, str, Optional[Dict[str, Any]]]]) -> Tuple[str, bytes]:
+    """Build a ``multipart/mixed`` batch body from ``(content_id, method, path, json)`` parts.
+
+    Returns the request's Content-Type (with boundary) and body.
+    """
+    boundary = f"batch_{uuid.uuid4().hex}"
+    lines: List[str] = []
+    for content_id, method, path, body in parts:
+        lines += [f"--{boundary}", "Content-Type: application/http", f"Content-ID: <{content_id}>", "",
+                  f"{method} {path} HTTP/1.1"]
+        if body is not None:
+            lines += ["Content-Type: application/json; charset=UTF-8", "", json.dumps(body)]
+        else:
+            lines.append("")
+        lines.append("")
+    lines.append(f"--{boundary}--")
+    return f"multipart/mixed; boundary={boundary}", "\r\n".join(lines).encode()
+
+
+def _split_headers(text: str) -> Tuple[Dict[str, str], str]:
+    head, _, rest = text.partition("\n\n")
+    headers = {}
+    for line in head.split("\n"):
+        name, sep, value = line.partition(":")
+        if sep:
+            headers[name.strip().lower()] = value.strip()
+    return headers, rest
+
+
+def decode_batch(content_type: str, body: bytes) -> BatchResults:
+    """Parse a batch response into ``{content_id: (status, json)}``."""
+    match = re.search(r'boundary="?([^";]+)"?', content_type)
+    if not match:
+        raise ValueError(f"Batch response is not multipart: {content_type}")
+    results: BatchResults = {}
+    for part in body.decode("utf-8").replace("\r\n", "\n").split(f"--{match.group(1)}"):
+        part = part.strip("\n")
+        if not part or part.startswith("--"):
+            continue
+        headers, response = _split_headers(part)
+        content_id = headers.get("content-id", "").strip("<>")
+        if content_id.startswith("response-"):
+            content_id = content_id[len("response-"):]
+        status_line, _, rest = response.partition("\n")
+        _, payload = _split_headers(rest)
+        try:
+            data = json.loads(payload) if payload.strip() else None
+        except ValueError:
+            data = payload
+        results[content_id] = (int(status_line.split()[1]), data)
+    return results
+
+
+# -- sync queue --------------------------------------------------------
+
+class CalendarSyncItem:
+    __slots__ = ("user_id", "appointment_id", "event", "attempts")
+
+    def __init__(self, user_id: str, appointment_id: str, event: Dict[str, Any]):
+        self.user_id = user_id
+        self.appointment_id = appointment_id
+        self.event = event
+        self.attempts = 0
+
+
+class CalendarSyncQueue:
+    """Buffers appointment events and inserts them into Google Calendar in batches.
+
+    ``send(user_id, [(appointment_id, event), ...])`` performs one batch
+    request and returns its per-part results keyed by appointment id.
+    """
+
+    def __init__(self, db: Database, send: Callable[[str, List[Tuple[str, Dict[str, Any]]]], Awaitable[BatchResults]],
+                 batch_size: int = GOOGLE_BATCH_LIMIT, flush_interval: float = 2.0, max_queue: int = 10000,
+                 max_attempts: int = 3, retry_delay: float = 30.0):
+        self.db = db
+        self.send = send
+        self.batch_size = max(1, min(batch_size, GOOGLE_BATCH_LIMIT))
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._delayed: Dict[CalendarSyncItem, asyncio.TimerHandle] = {}
+        self.accepted = 0
+        self.dropped = 0
+        self.synced = 0
+        self.retried = 0
+        self.failed = 0
+        self.skipped = 0
+        self.batches = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.create_task(self._run())
+
+    async def put(self, user_id: str, appointment_id: str, event: Dict[str, Any]) -> bool:
+        """Queue an event for ``user_id``'s calendar; returns ``False`` if it was dropped."""
+        item = CalendarSyncItem(user_id, appointment_id, event)
+        if not self.running:
+            # Not started (e.g. scripts): sync straight away
+            await self._flush([item])
+            return True
+        try:
+            self._queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        self.accepted += 1
+        return True
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = loop.time() + self.flush_interval
+            stopping = False
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+            if stopping:
+                break
+
+        # Final attempt for anything accepted before the stop or waiting to be retried
+        remaining = list(self._delayed)
+        for handle in self._delayed.values():
+            handle.cancel()
+        self._delayed.clear()
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not _STOP:
+                remaining.append(item)
+        for item in remaining:
+            item.attempts = max(item.attempts, self.max_attempts - 1)
+        for start in range(0, len(remaining), self.batch_size):
+            await self._flush(remaining[start:start + self.batch_size])
+
+    async def _flush(self, batch: List[CalendarSyncItem]) -> None:
+        by_user: Dict[str, List[CalendarSyncItem]] = {}
+        for item in batch:
+            by_user.setdefault(item.user_id, []).append(item)
+        await asyncio.gather(*(self._flush_user(user_id, items) for user_id, items in by_user.items()))
+
+    async def _flush_user(self, user_id: str, items: List[CalendarSyncItem]) -> None:
+        for item in items:
+            item.attempts += 1
+        self.batches += 1
+        try:
+            results = await self.send(user_id, [
+                (item.appointment_id, {**item.event, "id": event_id(item.appointment_id)}) for item in items
+            ])
+        except CalendarNotConnected:
+            self.skipped += len(items)
+            return
+        except HTTPException as e:
+            self._retry_or_fail(items, e.status_code in RETRY_STATUSES, e.detail)
+            return
+        except Exception as e:
+            self._retry_or_fail(items, True, repr(e))
+            return
+
+        synced: List[Tuple[str, str]] = []
+        for item in items:
+            status, data = results.get(item.appointment_id, (0, None))
+            if 200 <= status < 300 and isinstance(data, dict):
+                synced.append((item.appointment_id, data.get("id")))
+            elif status == 409:
+                # Inserted by an earlier attempt whose response was lost
+                synced.append((item.appointment_id, event_id(item.appointment_id)))
+            else:
+                self._retry_or_fail([item], status in RETRY_STATUSES or status == 0, data)
+        self.synced += len(synced)
+        if synced and self.db.enabled:
+            await asyncio.gather(*(self._record(appointment_id, event_id) for appointment_id, event_id in synced))
+
+    async def _record(self, appointment_id: str, event_id: Optional[str]) -> None:
+        try:
+            await self.db.execute("appointments", lambda t: t.update({
+                "google_calendar_id": event_id,
+                "updated_at": datetime.utcnow().isoformat()
+            }).eq("id", appointment_id))
+        except Exception as e:
+            print(f"Error recording Google Calendar event for appointment {appointment_id}: {e}")
+
+    def _retry_or_fail(self, items: List[CalendarSyncItem], retryable: bool, reason: Any) -> None:
+        retry = [item for item in items if retryable and item.attempts < self.max_attempts]
+        failed = len(items) - len(retry)
+        if failed:
+            self.failed += failed
+            print(f"Error syncing {failed} appointments to Google Calendar: {reason}")
+        if not retry:
+            return
+        self.retried += len(retry)
+        loop = asyncio.get_running_loop()
+        for item in retry:
+            if not self.running:
+                self.failed += 1
+                continue
+            self._delayed[item] = loop.call_later(self.retry_delay * item.attempts, self._requeue, item)
+
+    def _requeue(self, item: CalendarSyncItem) -> None:
+        self._delayed.pop(item, None)
+        try:
+            self._queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Flush queued events (one last attempt for pending retries) and stop."""
+        if not self.running:
+            return
+        try:
+            await asyncio.wait_for(self._queue.put(_STOP), timeout)
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+            print(f"Calendar sync did not drain within {timeout}s; {self._queue.qsize()} events lost")
+        self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._queue.qsize() if self._queue else 0,
+            "waiting_retry": len(self._delayed),
+            "accepted": self.accepted,
+            "dropped": self.dropped,
+            "synced": self.synced,
+            "retried": self.retried,
+            "failed": self.failed,
+            "skipped_not_connected": self.skipped,
+            "batches": self.batches,
+        }
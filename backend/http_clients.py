@@ -0,0 +1,264 @@
+"""Shared, pooled HTTP clients for outbound integrations.
+
+One long-lived ``httpx.AsyncClient`` is kept per upstream (VAPI, Twilio,
+Google, ...) so connections, DNS lookups and TLS sessions are reused across
+requests instead of being re-established on every call. Clients are created
+lazily on first use and closed by the application lifespan.
+
+Every knob can be tuned per upstream through environment variables, e.g.::
+
+    HTTP_MAX_CONNECTIONS=100            # default for all upstreams
+    VAPI_HTTP_MAX_CONNECTIONS=200       # override for one upstream
+    TWILIO_HTTP_TIMEOUT=5
+    HTTP2_ENABLED=true                  # or VAPI_HTTP2_ENABLED; needs ``h2``
+
+Every client also goes through the upstream's circuit breaker (see
+``circuit_breaker.py``), which fails fast with a 503 while the upstream is
+unhealthy and tightens the read timeout to its recent latency.
+"""
+
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+import httpx
+
+from circuit_breaker import BreakerConfig, CircuitBreaker, CircuitOpenError
+from metrics import observe_upstream
+
+# Transport errors raised before the request reached the upstream, so retrying
+# can't repeat a side effect. Anything else (read timeouts, dropped
+# connections) may have happened after the upstream acted on the request.
+NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+def _env(upstream: str, name: str, default: str) -> str:
+    """Read ``<UPSTREAM>_HTTP_<NAME>`` falling back to ``HTTP_<NAME>``."""
+    return os.getenv(f"{upstream.upper()}_HTTP_{name}", os.getenv(f"HTTP_{name}", default))
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+@dataclass
+class UpstreamConfig:
+    """Connection pool and timeout settings for a single upstream."""
+    name: str
+    base_url: str = ""
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+    connect_timeout: float = 5.0
+    read_timeout: float = 15.0
+    write_timeout: float = 15.0
+    pool_timeout: float = 5.0
+    http2: bool = False
+
+    @classmethod
+    def from_env(cls, name: str, base_url: str = "", **defaults: Any) -> "UpstreamConfig":
+        """Build a config from defaults overridden by environment variables."""
+        config = cls(name=name, base_url=base_url, **defaults)
+        timeout = _env(name, "TIMEOUT", "")
+        if timeout:
+            config.read_timeout = config.write_timeout = float(timeout)
+        config.max_connections = int(_env(name, "MAX_CONNECTIONS", str(config.max_connections)))
+        config.max_keepalive_connections = int(
+            _env(name, "MAX_KEEPALIVE", str(config.max_keepalive_connections))
+        )
+        config.keepalive_expiry = float(_env(name, "KEEPALIVE_EXPIRY", str(config.keepalive_expiry)))
+        config.connect_timeout = float(_env(name, "CONNECT_TIMEOUT", str(config.connect_timeout)))
+        config.read_timeout = float(_env(name, "READ_TIMEOUT", str(config.read_timeout)))
+        config.write_timeout = float(_env(name, "WRITE_TIMEOUT", str(config.write_timeout)))
+        config.pool_timeout = float(_env(name, "POOL_TIMEOUT", str(config.pool_timeout)))
+        http2 = os.getenv(f"{name.upper()}_HTTP2_ENABLED", os.getenv("HTTP2_ENABLED", str(config.http2)))
+        config.http2 = http2.lower() in ("1", "true", "yes")
+        return config
+
+    @property
+    def timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(
+            connect=self.connect_timeout,
+            read=self.read_timeout,
+            write=self.write_timeout,
+            pool=self.pool_timeout,
+        )
+
+    @property
+    def limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+
+@dataclass
+class _UpstreamStats:
+    requests: int = 0
+    errors: int = 0
+    in_flight: int = 0
+    max_in_flight: int = 0
+    total_time: float = 0.0
+
+
+class _InstrumentedTransport(httpx.AsyncBaseTransport):
+    """Wraps the pooled transport with the circuit breaker and usage counters."""
+
+    def __init__(self, transport: httpx.AsyncHTTPTransport, stats: _UpstreamStats, breaker: CircuitBreaker):
+        self.transport = transport
+        self.stats = stats
+        self.breaker = breaker
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        breaker = self.breaker
+        try:
+            probe = breaker.allow()
+        except CircuitOpenError:
+            observe_upstream(breaker.name, request.method, request.url.path, "circuit_open", 0.0)
+            raise
+        timeout = breaker.timeout()
+        if timeout is not None:
+            current = dict(request.extensions.get("timeout") or {})
+            if current.get("read") is None or current["read"] > timeout:
+                current["read"] = timeout
+                request.extensions = {**request.extensions, "timeout": current}
+
+        stats = self.stats
+        stats.requests += 1
+        stats.in_flight += 1
+        stats.max_in_flight = max(stats.max_in_flight, stats.in_flight)
+        started = time.perf_counter()
+        try:
+            response = await self.transport.handle_async_request(request)
+        except Exception:
+            elapsed = time.perf_counter() - started
+            stats.errors += 1
+            breaker.record(probe, True, elapsed)
+            observe_upstream(breaker.name, request.method, request.url.path, "error", elapsed)
+            raise
+        except BaseException:
+            # Cancelled: there is no outcome to record, just free the probe slot
+            breaker.release(probe)
+            raise
+        finally:
+            stats.in_flight -= 1
+            stats.total_time += time.perf_counter() - started
+        elapsed = time.perf_counter() - started
+        if response.status_code >= 500:
+            stats.errors += 1
+        breaker.record(probe, response.status_code >= 500, elapsed)
+        observe_upstream(breaker.name, request.method, request.url.path, str(response.status_code), elapsed)
+        return response
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+class UpstreamClients:
+    """Registry of pooled ``httpx.AsyncClient`` instances, one per upstream."""
+
+    def __init__(self):
+        self._configs: Dict[str, UpstreamConfig] = {}
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._stats: Dict[str, _UpstreamStats] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def register(self, config: UpstreamConfig) -> None:
+        """Register (or replace) the settings for an upstream."""
+        self._configs[config.name] = config
+        self._stats.setdefault(config.name, _UpstreamStats())
+        self._breakers[config.name] = CircuitBreaker(
+            config.name, BreakerConfig.from_env(config.name), config.read_timeout
+        )
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        """Return the shared client for ``name``, creating it on first use."""
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            client = self._build(name)
+            self._clients[name] = client
+        return client
+
+    def _build(self, name: str) -> httpx.AsyncClient:
+        config = self._configs.get(name)
+        if config is None:
+            config = UpstreamConfig.from_env(name)
+            self.register(config)
+
+        http2 = config.http2 and _http2_available()
+        if config.http2 and not http2:
+            print(f"HTTP/2 requested for {name} but the 'h2' package is not installed; using HTTP/1.1")
+
+        transport = _InstrumentedTransport(
+            httpx.AsyncHTTPTransport(limits=config.limits, http2=http2),
+            self._stats[name],
+            self._breakers[name],
+        )
+        return httpx.AsyncClient(
+            base_url=config.base_url,
+            timeout=config.timeout,
+            transport=transport,
+        )
+
+    async def start(self) -> None:
+        """Eagerly open a client for every registered upstream."""
+        for name in self._configs:
+            self.get(name)
+
+    async def aclose(self) -> None:
+        """Close every client and release pooled connections."""
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.aclose()
+
+    def breaker(self, name: str) -> CircuitBreaker:
+        return self._breakers[name]
+
+    def any_open(self) -> bool:
+        """Whether any upstream is currently failing fast."""
+        return any(breaker.state != "closed" for breaker in self._breakers.values())
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool configuration and usage counters, keyed by upstream name."""
+        result = {}
+        for name, config in self._configs.items():
+            stats = self._stats[name]
+            client = self._clients.get(name)
+            completed = stats.requests - stats.in_flight
+            result[name] = {
+                "open": client is not None and not client.is_closed,
+                "http2": config.http2,
+                "max_connections": config.max_connections,
+                "max_keepalive_connections": config.max_keepalive_connections,
+                "keepalive_expiry": config.keepalive_expiry,
+                "connections": _pool_connections(client),
+                "requests": stats.requests,
+                "errors": stats.errors,
+                "in_flight": stats.in_flight,
+                "max_in_flight": stats.max_in_flight,
+                "avg_latency_ms": round(stats.total_time / completed * 1000, 2) if completed else None,
+                "breaker": self._breakers[name].stats(),
+            }
+        return result
+
+
+def _pool_connections(client: Optional[httpx.AsyncClient]) -> Optional[Dict[str, int]]:
+    """Best-effort snapshot of the underlying httpcore pool."""
+    if client is None or client.is_closed:
+        return None
+    transport = getattr(client, "_transport", None)
+    pool = getattr(getattr(transport, "transport", None), "_pool", None)
+    connections = getattr(pool, "connections", None)
+    if connections is None:
+        return None
+    idle = sum(1 for conn in connections if conn.is_idle())
+    return {"total": len(connections), "idle": idle, "active": len(connections) - idle}
+
+
+upstream_clients = UpstreamClients()
@@ -1,20 +1,67 @@
-from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ValidationError
 from typing import Optional, List, Dict, Any
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from contextlib import AsyncExitStack, asynccontextmanager
+import hashlib
+import json
 import os
-import stripe
-from supabase import create_client, Client
+import uuid
 import httpx
+from urllib.parse import urlencode
+from supabase import create_client, Client
 import asyncio
 
+from activity_sink import ActivitySink
+from analytics import AnalyticsEngine, RollupStore
+from auth import TokenCache, TokenVerifier
+from bulk import bulk_insert, iter_request_rows
+from cache import AsyncTTLCache, caches
+from call_logs import CallLogStore
+from exports import EXPORTS, MEDIA_TYPES, guarded, iter_table, stream_csv, stream_ndjson
+from google_calendar import CalendarNotConnected, CalendarSyncQueue, GoogleTokenStore, decode_batch, encode_batch
+from pagination import keyset_page, split_page
+from projections import select_columns
+from profiler import ProfilerMiddleware
+from responses import LIST_FORMATS, FastJSONResponse, RawEnvelopeResponse, columnar, conditional_response, dumps
+from schedule_index import ClientSchedule, ScheduleIndex, as_datetime, epoch
+from sms_campaigns import CampaignRunner, SendOutcomeUnknown, validate_template
+from webhook_queue import WebhookQueue
+from db import Database
+from dialer import CallOutcomeUnknown, Dialer, check_timezone, parse_window
+from http_clients import NOT_SENT_ERRORS, UpstreamConfig, upstream_clients
+from metrics import Gauge, MetricsMiddleware, monitor_event_loop, registry
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open shared resources on startup and release them on shutdown"""
+    await upstream_clients.start()
+    await activity_sink.start()
+    await calendar_sync.start()
+    await webhook_queue.start()
+    await dialer.start()
+    loop_monitor = asyncio.create_task(monitor_event_loop())
+    yield
+    loop_monitor.cancel()
+    await dialer.stop()
+    await call_logs.stop()
+    await sms_campaigns.stop()
+    await webhook_queue.stop()
+    await calendar_sync.stop()
+    await activity_sink.stop()
+    await upstream_clients.aclose()
+    db.shutdown()
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Ikon Systems Dashboard API",
     description="Backend API for Ikon Systems Dashboard with comprehensive integrations",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
 
 # CORS middleware
@@ -26,6 +73,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Opt-in request profiler: not installed at all unless a token or sample rate is configured
+PROFILE_ADMIN_TOKEN = os.getenv("PROFILE_ADMIN_TOKEN")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+if PROFILE_ADMIN_TOKEN or PROFILE_SAMPLE_RATE > 0:
+    app.add_middleware(
+        ProfilerMiddleware,
+        output_dir=os.getenv("PROFILE_DIR", "data/profiles"),
+        token=PROFILE_ADMIN_TOKEN,
+        sample_rate=PROFILE_SAMPLE_RATE,
+        interval=float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+    )
+
+# Request metrics for /metrics; added last so it wraps (and times) everything else
+app.add_middleware(MetricsMiddleware)
+
 # Security
 security = HTTPBearer()
 
@@ -34,21 +96,53 @@ supabase_url = os.getenv("SUPABASE_URL")
 supabase_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
 supabase: Client = create_client(supabase_url, supabase_key) if supabase_url and supabase_key else None
 
-# Initialize Stripe
-stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
+# All Supabase queries go through the data access layer so they run off the event loop
+db = Database(supabase, max_concurrency=int(os.getenv("DB_MAX_CONCURRENCY", "10")))
+
+# Activity log entries are buffered and flushed as multi-row inserts
+activity_sink = ActivitySink(
+    db,
+    batch_size=int(os.getenv("ACTIVITY_BATCH_SIZE", "100")),
+    flush_interval=float(os.getenv("ACTIVITY_FLUSH_INTERVAL_MS", "500")) / 1000,
+    max_queue=int(os.getenv("ACTIVITY_QUEUE_SIZE", "10000")),
+    enqueue_timeout=float(os.getenv("ACTIVITY_ENQUEUE_TIMEOUT_MS", "100")) / 1000
+)
 
 # Google Calendar configuration
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
 GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET")
 GOOGLE_REDIRECT_URI = os.getenv("GOOGLE_REDIRECT_URI", "http://localhost:3000/auth/google/callback")
 
+# Outbound HTTP pools: one long-lived client per upstream, tunable via
+# <UPSTREAM>_HTTP_* environment variables (see http_clients.py)
+upstream_clients.register(UpstreamConfig.from_env("vapi", read_timeout=30.0))
+upstream_clients.register(UpstreamConfig.from_env("twilio", read_timeout=10.0))
+upstream_clients.register(UpstreamConfig.from_env("google", read_timeout=10.0))
+upstream_clients.register(UpstreamConfig.from_env("stripe", read_timeout=30.0))
+upstream_clients.register(UpstreamConfig.from_env("supabase_auth", read_timeout=5.0))
+
+# Token verification: local JWT checks with a JWKS/secret, remote get_user as fallback
+SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
+token_verifier = TokenVerifier(
+    jwt_secret=SUPABASE_JWT_SECRET,
+    jwks_url=f"{supabase_url.rstrip('/')}/auth/v1/.well-known/jwks.json" if supabase_url else None,
+    remote=(lambda token: db.run(supabase.auth.get_user, token, label="auth:get_user")) if supabase else None,
+    mode=os.getenv("SUPABASE_AUTH_MODE", "local"),
+    audience=os.getenv("SUPABASE_JWT_AUDIENCE", "authenticated"),
+    cache=TokenCache(
+        maxsize=int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000")),
+        ttl=float(os.getenv("AUTH_TOKEN_CACHE_TTL", "60"))
+    ),
+    jwks_ttl=float(os.getenv("SUPABASE_JWKS_TTL", "3600"))
+)
+
 # Enhanced Models
 class VoiceAgentCreate(BaseModel):
     name: str = Field(..., min_length=1, max_length=100)
-    phone_number: str = Field(..., regex=r'^\+?1?\d{9,15}$')
+    phone_number: str = Field(..., pattern=r'^\+?1?\d{9,15}$')
     script: str = Field(..., min_length=10, max_length=1000)
     client_id: str = Field(..., min_length=1)
-    type: str = Field(default="sales", regex="^(sales|support|appointment|follow_up|custom)$")
+    type: str = Field(default="sales", pattern="^(sales|support|appointment|follow_up|custom)$")
     model: str = Field(default="gpt-4")
     voice: str = Field(default="alloy")
     max_duration: int = Field(default=300, ge=60, le=1800)
@@ -65,7 +159,7 @@ class VoiceAgentResponse(BaseModel):
 class AppointmentCreate(BaseModel):
     client_id: str = Field(..., min_length=1)
     date_time: datetime
-    type: str = Field(..., regex="^(demo|call|follow_up|meeting|consultation)$")
+    type: str = Field(..., pattern="^(demo|call|follow_up|meeting|consultation)$")
     title: Optional[str] = Field(None, max_length=200)
     description: Optional[str] = Field(None, max_length=1000)
     duration: Optional[int] = Field(60, ge=15, le=480)
@@ -85,17 +179,17 @@ class InvoiceCreate(BaseModel):
 class PaymentCreate(BaseModel):
     invoice_id: str = Field(..., min_length=1)
     amount: float = Field(..., gt=0)
-    payment_method: str = Field(..., regex="^(stripe|check|cash|bank_transfer)$")
+    payment_method: str = Field(..., pattern="^(stripe|check|cash|bank_transfer)$")
     payment_date: datetime
     reference_number: Optional[str] = Field(None, max_length=100)
     notes: Optional[str] = Field(None, max_length=500)
 
 class ClientCreate(BaseModel):
     name: str = Field(..., min_length=1, max_length=100)
-    email: str = Field(..., regex=r'^[^@]+@[^@]+\.[^@]+$')
-    phone: str = Field(..., regex=r'^\+?1?\d{9,15}$')
+    email: str = Field(..., pattern=r'^[^@]+@[^@]+\.[^@]+$')
+    phone: str = Field(..., pattern=r'^\+?1?\d{9,15}$')
     address: str = Field(..., min_length=1, max_length=200)
-    status: str = Field(default="lead", regex="^(lead|prospect|active|churned)$")
+    status: str = Field(default="lead", pattern="^(lead|prospect|active|churned)$")
     bilingual_preference: bool = Field(default=False)
     notes: Optional[str] = Field(None, max_length=1000)
 
@@ -103,18 +197,41 @@ class ProjectCreate(BaseModel):
     client_id: str = Field(..., min_length=1)
     name: str = Field(..., min_length=1, max_length=100)
     description: str = Field(..., min_length=1, max_length=1000)
-    status: str = Field(default="planning", regex="^(planning|in_progress|on_hold|completed|cancelled)$")
-    priority: str = Field(default="medium", regex="^(low|medium|high|urgent)$")
+    status: str = Field(default="planning", pattern="^(planning|in_progress|on_hold|completed|cancelled)$")
+    priority: str = Field(default="medium", pattern="^(low|medium|high|urgent)$")
     budget: float = Field(..., gt=0)
     timeline: str = Field(..., min_length=1, max_length=100)
     start_date: Optional[datetime] = None
     due_date: Optional[datetime] = None
     notes: Optional[str] = Field(None, max_length=1000)
 
+ANALYTICS_METRICS = ["revenue", "clients", "projects", "appointments"]
+
 class AnalyticsRequest(BaseModel):
     start_date: datetime
     end_date: datetime
-    metrics: List[str] = Field(default=["revenue", "clients", "projects", "appointments"])
+    metrics: List[str] = Field(default=ANALYTICS_METRICS)
+
+class SmsRecipient(BaseModel):
+    to: str = Field(..., min_length=1)
+    variables: Dict[str, Any] = Field(default_factory=dict)
+
+class SmsCampaignCreate(BaseModel):
+    message: str = Field(..., min_length=1, max_length=1600)
+    recipients: List[SmsRecipient] = Field(..., min_length=1)
+    from_number: Optional[str] = None
+
+class DialerNumber(BaseModel):
+    number: str = Field(..., min_length=1)
+    timezone: Optional[str] = None
+
+class DialerJobCreate(BaseModel):
+    numbers: List[DialerNumber] = Field(..., min_length=1)
+    timezone: str = "UTC"
+    window_start: Optional[str] = None
+    window_end: Optional[str] = None
+    max_attempts: Optional[int] = Field(None, ge=1, le=10)
+    retry_delay_minutes: Optional[float] = Field(None, ge=0)
 
 class WebhookPayload(BaseModel):
     event_type: str
@@ -125,7 +242,7 @@ class WebhookPayload(BaseModel):
 class VAPIService:
     def __init__(self):
         self.api_key = os.getenv("VAPI_API_KEY")
-        self.base_url = "https://api.vapi.ai"
+        self.base_url = os.getenv("VAPI_BASE_URL", "https://api.vapi.ai")
         self.enabled = bool(self.api_key)
     
     async def create_agent(self, agent_data: VoiceAgentCreate) -> Dict[str, Any]:
@@ -134,62 +251,72 @@ class VAPIService:
             raise HTTPException(status_code=503, detail="VAPI service not configured")
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.base_url}/assistant",
-                    headers={"Authorization": f"Bearer {self.api_key}"},
-                    json={
-                        "name": agent_data.name,
-                        "model": {
-                            "provider": "openai",
-                            "model": agent_data.model,
-                            "voice": agent_data.voice,
-                            "maxDurationSeconds": agent_data.max_duration
-                        },
-                        "voice": {
-                            "provider": "elevenlabs",
-                            "voiceId": "21m00Tcm4TlvDq8ikWAM"
-                        },
-                        "firstMessage": agent_data.script,
-                        "systemMessage": f"You are a professional {agent_data.type} assistant for Ikon Systems.",
-                        "phoneNumberId": agent_data.phone_number
-                    }
-                )
+            client = upstream_clients.get("vapi")
+            response = await client.post(
+                f"{self.base_url}/assistant",
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                json={
+                    "name": agent_data.name,
+                    "model": {
+                        "provider": "openai",
+                        "model": agent_data.model,
+                        "voice": agent_data.voice,
+                        "maxDurationSeconds": agent_data.max_duration
+                    },
+                    "voice": {
+                        "provider": "elevenlabs",
+                        "voiceId": "21m00Tcm4TlvDq8ikWAM"
+                    },
+                    "firstMessage": agent_data.script,
+                    "systemMessage": f"You are a professional {agent_data.type} assistant for Ikon Systems.",
+                    "phoneNumberId": agent_data.phone_number
+                }
+            )
+            
+            if response.status_code == 201:
+                agent_data = response.json()
+                return {
+                    "success": True,
+                    "agent_id": agent_data.get("id"),
+                    "data": agent_data
+                }
+            else:
+                raise HTTPException(status_code=response.status_code, detail=response.text)
                 
-                if response.status_code == 201:
-                    agent_data = response.json()
-                    return {
-                        "success": True,
-                        "agent_id": agent_data.get("id"),
-                        "data": agent_data
-                    }
-                else:
-                    raise HTTPException(status_code=response.status_code, detail=response.text)
-                    
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"VAPI service error: {str(e)}")
 
-    async def get_agent_logs(self, agent_id: str, limit: int = 50) -> List[Dict[str, Any]]:
-        """Get logs for a specific agent"""
+    async def get_agent_logs(self, agent_id: str, limit: int = 100,
+                             created_at_gt: Optional[str] = None,
+                             created_at_le: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Get calls for a specific agent, newest first
+        
+        Used by the call log sync; errors are raised rather than returning
+        an empty page so a failed sync never advances the watermark.
+        """
         if not self.enabled:
             return []
         
-        try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.base_url}/call",
-                    headers={"Authorization": f"Bearer {self.api_key}"},
-                    params={"assistantId": agent_id, "limit": limit}
-                )
-                
-                if response.status_code == 200:
-                    return response.json().get("data", [])
-                else:
-                    return []
-                    
-        except Exception as e:
-            print(f"Error fetching agent logs: {e}")
-            return []
+        params = {"assistantId": agent_id, "limit": limit}
+        if created_at_gt:
+            params["createdAtGt"] = created_at_gt
+        if created_at_le:
+            params["createdAtLe"] = created_at_le
+        
+        client = upstream_clients.get("vapi")
+        response = await client.get(
+            f"{self.base_url}/call",
+            headers={"Authorization": f"Bearer {self.api_key}"},
+            params=params
+        )
+        
+        if response.status_code == 200:
+            data = response.json()
+            return data if isinstance(data, list) else data.get("data", [])
+        else:
+            raise HTTPException(status_code=response.status_code, detail=response.text)
 
     async def update_agent(self, agent_id: str, updates: Dict[str, Any]) -> Dict[str, Any]:
         """Update an existing agent"""
@@ -197,18 +324,20 @@ class VAPIService:
             raise HTTPException(status_code=503, detail="VAPI service not configured")
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.patch(
-                    f"{self.base_url}/assistant/{agent_id}",
-                    headers={"Authorization": f"Bearer {self.api_key}"},
-                    json=updates
-                )
+            client = upstream_clients.get("vapi")
+            response = await client.patch(
+                f"{self.base_url}/assistant/{agent_id}",
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                json=updates
+            )
+            
+            if response.status_code == 200:
+                return {"success": True, "data": response.json()}
+            else:
+                raise HTTPException(status_code=response.status_code, detail=response.text)
                 
-                if response.status_code == 200:
-                    return {"success": True, "data": response.json()}
-                else:
-                    raise HTTPException(status_code=response.status_code, detail=response.text)
-                    
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"VAPI service error: {str(e)}")
 
@@ -218,106 +347,226 @@ class VAPIService:
             raise HTTPException(status_code=503, detail="VAPI service not configured")
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.delete(
-                    f"{self.base_url}/assistant/{agent_id}",
-                    headers={"Authorization": f"Bearer {self.api_key}"}
-                )
-                
-                return response.status_code == 200
-                
+            client = upstream_clients.get("vapi")
+            response = await client.delete(
+                f"{self.base_url}/assistant/{agent_id}",
+                headers={"Authorization": f"Bearer {self.api_key}"}
+            )
+            
+            return response.status_code == 200
+            
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"VAPI service error: {str(e)}")
 
     async def make_call(self, agent_id: str, phone_number: str) -> Dict[str, Any]:
-        """Make a call using an agent"""
+        """Make a call using an agent
+        
+        Raises ``CallOutcomeUnknown`` (504) when the request was sent but no
+        response came back: the call may have been placed, so callers must
+        not simply retry.
+        """
         if not self.enabled:
             raise HTTPException(status_code=503, detail="VAPI service not configured")
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.base_url}/call",
-                    headers={"Authorization": f"Bearer {self.api_key}"},
-                    json={
-                        "assistantId": agent_id,
-                        "customer": {
-                            "number": phone_number
-                        }
+            client = upstream_clients.get("vapi")
+            response = await client.post(
+                f"{self.base_url}/call",
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                json={
+                    "assistantId": agent_id,
+                    "customer": {
+                        "number": phone_number
                     }
-                )
-                
-                if response.status_code == 201:
-                    return {"success": True, "data": response.json()}
-                else:
-                    raise HTTPException(status_code=response.status_code, detail=response.text)
-                    
+                }
+            )
+        except HTTPException:
+            raise
+        except NOT_SENT_ERRORS as e:
+            # Never reached VAPI, so safe to retry
+            raise HTTPException(status_code=503, detail=f"VAPI service unavailable: {str(e)}")
         except Exception as e:
-            raise HTTPException(status_code=500, detail=f"VAPI service error: {str(e)}")
+            raise CallOutcomeUnknown(f"VAPI service error, the call may have been placed: {str(e)}")
+        
+        if response.status_code != 201:
+            raise HTTPException(status_code=response.status_code, detail=response.text)
+        try:
+            return {"success": True, "data": response.json()}
+        except ValueError:
+            # Placed, but the id is unreadable
+            return {"success": True, "data": {}}
 
 # Twilio Integration
 class TwilioService:
     def __init__(self):
         self.account_sid = os.getenv("TWILIO_ACCOUNT_SID")
         self.auth_token = os.getenv("TWILIO_AUTH_TOKEN")
-        self.base_url = f"https://api.twilio.com/2010-04-01/Accounts/{self.account_sid}"
+        api_base = os.getenv("TWILIO_API_BASE", "https://api.twilio.com")
+        self.base_url = f"{api_base}/2010-04-01/Accounts/{self.account_sid}"
+        # Numbers change rarely: serve from cache, refreshing in the background once stale
+        self.phone_numbers_cache = AsyncTTLCache(
+            "twilio_phone_numbers",
+            ttl=float(os.getenv("PHONE_NUMBERS_CACHE_TTL", "3600")),
+            stale_ttl=float(os.getenv("PHONE_NUMBERS_CACHE_STALE_TTL", "86400"))
+        )
     
-    async def send_sms(self, to: str, message: str) -> Dict[str, Any]:
-        """Send SMS via Twilio"""
+    async def send_sms(self, to: str, message: str, sender: Optional[str] = None) -> Dict[str, Any]:
+        """Send SMS via Twilio
+        
+        Upstream error statuses are passed through (with Retry-After on 429)
+        so callers such as the campaign runner can decide what to retry.
+        Raises ``SendOutcomeUnknown`` (504) when the request was sent but no
+        response came back: the message may have been accepted.
+        """
         if not self.account_sid or not self.auth_token:
             raise HTTPException(status_code=503, detail="Twilio service not configured")
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.base_url}/Messages.json",
-                    auth=(self.account_sid, self.auth_token),
-                    data={
-                        "To": to,
-                        "From": os.getenv("TWILIO_PHONE_NUMBER"),
-                        "Body": message
-                    }
-                )
-                
-                if response.status_code == 201:
-                    return {"success": True, "data": response.json()}
-                else:
-                    raise HTTPException(status_code=response.status_code, detail=response.text)
-                    
+            client = upstream_clients.get("twilio")
+            response = await client.post(
+                f"{self.base_url}/Messages.json",
+                auth=(self.account_sid, self.auth_token),
+                data={
+                    "To": to,
+                    "From": sender or os.getenv("TWILIO_PHONE_NUMBER"),
+                    "Body": message
+                }
+            )
+        except HTTPException:
+            raise
+        except NOT_SENT_ERRORS as e:
+            # Never reached Twilio, so safe to retry
+            raise HTTPException(status_code=503, detail=f"Twilio service unavailable: {str(e)}")
         except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Twilio service error: {str(e)}")
+            raise SendOutcomeUnknown(f"Twilio service error, the message may have been sent: {str(e)}")
+        
+        if response.status_code != 201:
+            retry_after = response.headers.get("Retry-After")
+            raise HTTPException(
+                status_code=response.status_code,
+                detail=response.text,
+                headers={"Retry-After": retry_after} if retry_after else None
+            )
+        try:
+            return {"success": True, "data": response.json()}
+        except ValueError:
+            # Accepted, but the SID is unreadable
+            return {"success": True, "data": {}}
 
     async def get_phone_numbers(self) -> List[Dict[str, Any]]:
-        """Get all phone numbers from Twilio"""
+        """Get all phone numbers from Twilio (cached)"""
+        return json.loads(await self.get_phone_numbers_raw())
+
+    async def get_phone_numbers_raw(self) -> bytes:
+        """The cached phone number list as encoded JSON, ready to splice into a response"""
         if not self.account_sid or not self.auth_token:
-            return []
+            return b"[]"
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.base_url}/IncomingPhoneNumbers.json",
-                    auth=(self.account_sid, self.auth_token)
-                )
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    return data.get("incoming_phone_numbers", [])
-                else:
-                    return []
-                    
+            return await self.phone_numbers_cache.get(self.account_sid, self._fetch_phone_numbers)
         except Exception as e:
             print(f"Error fetching phone numbers: {e}")
-            return []
+            return b"[]"
+
+    async def _fetch_phone_numbers(self) -> bytes:
+        client = upstream_clients.get("twilio")
+        response = await client.get(
+            f"{self.base_url}/IncomingPhoneNumbers.json",
+            auth=(self.account_sid, self.auth_token)
+        )
+        
+        if response.status_code == 200:
+            # Decoded once per cache fill; cache hits are served as these bytes
+            data = response.json()
+            return dumps(data.get("incoming_phone_numbers", []))
+        else:
+            # Raised so the failure isn't cached as an empty list
+            raise HTTPException(status_code=response.status_code, detail=response.text)
+
+    def invalidate_phone_numbers(self) -> None:
+        """Forget cached phone numbers (e.g. after buying or releasing one)"""
+        self.phone_numbers_cache.invalidate(self.account_sid)
 
 # Stripe Integration
 class StripeService:
+    """Stripe REST client over the shared connection pool
+    
+    Calls go straight to the Stripe API through the pooled async client
+    instead of the blocking ``stripe`` SDK. Every POST carries an
+    Idempotency-Key (generated unless the caller supplies one), so
+    timeouts, 429s and 5xx responses are retried safely without creating
+    duplicate objects.
+    """
     def __init__(self):
         self.secret_key = os.getenv("STRIPE_SECRET_KEY")
+        self.base_url = os.getenv("STRIPE_API_BASE", "https://api.stripe.com")
+        self.api_version = os.getenv("STRIPE_API_VERSION")
+        self.max_retries = int(os.getenv("STRIPE_MAX_RETRIES", "2"))
         self.enabled = bool(self.secret_key)
     
+    @staticmethod
+    def _encode(params: Dict[str, Any], prefix: str = "") -> List[tuple]:
+        """Flatten params into Stripe's form encoding (metadata[key]=value)"""
+        pairs = []
+        for key, value in params.items():
+            name = f"{prefix}[{key}]" if prefix else key
+            if value is None:
+                continue
+            if isinstance(value, dict):
+                pairs.extend(StripeService._encode(value, name))
+            elif isinstance(value, (list, tuple)):
+                pairs.extend(StripeService._encode(dict(enumerate(value)), name))
+            elif isinstance(value, bool):
+                pairs.append((name, "true" if value else "false"))
+            else:
+                pairs.append((name, str(value)))
+        return pairs
+    
+    async def _request(self, method: str, path: str, params: Optional[Dict[str, Any]] = None,
+                       idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+        """Send a request, retrying transient failures under one idempotency key"""
+        headers = {}
+        pairs = self._encode(params or {})
+        if method == "POST":
+            headers["Idempotency-Key"] = idempotency_key or str(uuid.uuid4())
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        if self.api_version:
+            headers["Stripe-Version"] = self.api_version
+        
+        client = upstream_clients.get("stripe")
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await client.request(
+                    method,
+                    f"{self.base_url}/v1/{path}",
+                    auth=(self.secret_key, ""),
+                    headers=headers,
+                    content=urlencode(pairs) if method == "POST" else None,
+                    params=pairs if method != "POST" else None
+                )
+            except httpx.TransportError:
+                if attempt == self.max_retries:
+                    raise
+            else:
+                retryable = response.status_code == 429 or response.status_code >= 500
+                if response.headers.get("Stripe-Should-Retry") == "false":
+                    retryable = False
+                if not retryable or attempt == self.max_retries:
+                    if response.status_code >= 400:
+                        error = response.json().get("error", {}) if response.content else {}
+                        raise HTTPException(
+                            status_code=response.status_code,
+                            detail=error.get("message") or response.text
+                        )
+                    return response.json()
+            await asyncio.sleep(min(2.0, 0.5 * 2 ** attempt))
+    
     async def create_payment_intent(self, amount: float, currency: str = "usd", 
                                   customer_id: Optional[str] = None, 
-                                  metadata: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+                                  metadata: Optional[Dict[str, str]] = None,
+                                  idempotency_key: Optional[str] = None) -> Dict[str, Any]:
         """Create a payment intent"""
         if not self.enabled:
             raise HTTPException(status_code=503, detail="Stripe service not configured")
@@ -332,19 +581,22 @@ class StripeService:
             if customer_id:
                 intent_data["customer"] = customer_id
             
-            payment_intent = stripe.PaymentIntent.create(**intent_data)
+            payment_intent = await self._request("POST", "payment_intents", intent_data, idempotency_key)
             
             return {
                 "success": True,
-                "client_secret": payment_intent.client_secret,
-                "id": payment_intent.id
+                "client_secret": payment_intent["client_secret"],
+                "id": payment_intent["id"]
             }
             
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Stripe service error: {str(e)}")
 
     async def create_customer(self, email: str, name: Optional[str] = None, 
-                            phone: Optional[str] = None) -> Dict[str, Any]:
+                            phone: Optional[str] = None,
+                            idempotency_key: Optional[str] = None) -> Dict[str, Any]:
         """Create a Stripe customer"""
         if not self.enabled:
             raise HTTPException(status_code=503, detail="Stripe service not configured")
@@ -356,45 +608,54 @@ class StripeService:
             if phone:
                 customer_data["phone"] = phone
             
-            customer = stripe.Customer.create(**customer_data)
+            customer = await self._request("POST", "customers", customer_data, idempotency_key)
             
             return {
                 "success": True,
-                "customer_id": customer.id,
+                "customer_id": customer["id"],
                 "data": customer
             }
             
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Stripe service error: {str(e)}")
 
     async def create_invoice(self, customer_id: str, amount: float, 
-                           description: str, due_date: Optional[datetime] = None) -> Dict[str, Any]:
+                           description: str, due_date: Optional[datetime] = None,
+                           idempotency_key: Optional[str] = None) -> Dict[str, Any]:
         """Create a Stripe invoice"""
         if not self.enabled:
             raise HTTPException(status_code=503, detail="Stripe service not configured")
         
+        # Both steps derive their keys from one base key so retrying the
+        # whole operation never duplicates the item or the invoice
+        base_key = idempotency_key or str(uuid.uuid4())
+        
         try:
             # Create invoice item
-            invoice_item = stripe.InvoiceItem.create(
-                customer=customer_id,
-                amount=int(amount * 100),
-                currency="usd",
-                description=description
-            )
+            await self._request("POST", "invoiceitems", {
+                "customer": customer_id,
+                "amount": int(amount * 100),
+                "currency": "usd",
+                "description": description
+            }, f"{base_key}:item")
             
             # Create invoice
-            invoice = stripe.Invoice.create(
-                customer=customer_id,
-                due_date=int(due_date.timestamp()) if due_date else None,
-                auto_advance=True
-            )
+            invoice = await self._request("POST", "invoices", {
+                "customer": customer_id,
+                "due_date": int(due_date.timestamp()) if due_date else None,
+                "auto_advance": True
+            }, f"{base_key}:invoice")
             
             return {
                 "success": True,
-                "invoice_id": invoice.id,
+                "invoice_id": invoice["id"],
                 "data": invoice
             }
             
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Stripe service error: {str(e)}")
 
@@ -404,7 +665,16 @@ class GoogleCalendarService:
         self.client_id = GOOGLE_CLIENT_ID
         self.client_secret = GOOGLE_CLIENT_SECRET
         self.redirect_uri = GOOGLE_REDIRECT_URI
+        self.token_url = os.getenv("GOOGLE_TOKEN_URL", "https://oauth2.googleapis.com/token")
+        self.api_base = os.getenv("GOOGLE_CALENDAR_API_BASE", "https://www.googleapis.com")
         self.enabled = bool(self.client_id and self.client_secret)
+        # Persisted per-user tokens; access tokens are cached and refreshed before they expire
+        self.tokens = GoogleTokenStore(
+            db,
+            self.refresh_access_token,
+            refresh_ahead=float(os.getenv("GOOGLE_TOKEN_REFRESH_AHEAD", "300")),
+            maxsize=int(os.getenv("GOOGLE_TOKEN_CACHE_SIZE", "10000"))
+        )
     
     def get_auth_url(self, user_id: str) -> str:
         """Generate Google OAuth URL"""
@@ -426,48 +696,116 @@ class GoogleCalendarService:
         return f"https://accounts.google.com/o/oauth2/v2/auth?{urlencode(params)}"
 
     async def exchange_code_for_token(self, code: str, user_id: str) -> Dict[str, Any]:
-        """Exchange authorization code for access token"""
+        """Exchange authorization code for tokens and store them for the user"""
         if not self.enabled:
             raise HTTPException(status_code=503, detail="Google Calendar service not configured")
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    "https://oauth2.googleapis.com/token",
-                    data={
-                        "client_id": self.client_id,
-                        "client_secret": self.client_secret,
-                        "code": code,
-                        "grant_type": "authorization_code",
-                        "redirect_uri": self.redirect_uri
-                    }
-                )
+            client = upstream_clients.get("google")
+            response = await client.post(
+                self.token_url,
+                data={
+                    "client_id": self.client_id,
+                    "client_secret": self.client_secret,
+                    "code": code,
+                    "grant_type": "authorization_code",
+                    "redirect_uri": self.redirect_uri
+                }
+            )
+            
+            if response.status_code == 200:
+                token_data = response.json()
+                await self.tokens.save(user_id, token_data)
                 
-                if response.status_code == 200:
-                    token_data = response.json()
-                    
-                    # Store tokens in database (implement your storage logic)
-                    # For now, we'll return the tokens
-                    return {
-                        "success": True,
-                        "access_token": token_data.get("access_token"),
-                        "refresh_token": token_data.get("refresh_token"),
-                        "expires_in": token_data.get("expires_in")
-                    }
-                else:
-                    raise HTTPException(status_code=response.status_code, detail=response.text)
-                    
+                # Tokens stay server-side; the client only learns the calendar is connected
+                return {
+                    "success": True,
+                    "connected": True,
+                    "scope": token_data.get("scope"),
+                    "expires_in": token_data.get("expires_in")
+                }
+            else:
+                raise HTTPException(status_code=response.status_code, detail=response.text)
+                
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Google Calendar service error: {str(e)}")
 
+    async def refresh_access_token(self, refresh_token: str) -> Dict[str, Any]:
+        """Get a new access token; raises CalendarNotConnected if the grant was revoked"""
+        client = upstream_clients.get("google")
+        response = await client.post(
+            self.token_url,
+            data={
+                "client_id": self.client_id,
+                "client_secret": self.client_secret,
+                "refresh_token": refresh_token,
+                "grant_type": "refresh_token"
+            }
+        )
+        
+        if response.status_code == 200:
+            return response.json()
+        if response.status_code in (400, 401) and "invalid_grant" in response.text:
+            raise CalendarNotConnected("Google Calendar authorization was revoked; reconnect the calendar")
+        raise HTTPException(status_code=response.status_code, detail=response.text)
+
     async def create_calendar_event(self, user_id: str, event_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Create a calendar event"""
+        """Create a single event in the user's primary calendar"""
         if not self.enabled:
             raise HTTPException(status_code=503, detail="Google Calendar service not configured")
         
-        # This would require the user's access token
-        # Implement token retrieval and event creation logic here
-        return {"success": True, "message": "Event creation not fully implemented"}
+        try:
+            access_token = await self.tokens.access_token(user_id)
+            client = upstream_clients.get("google")
+            response = await client.post(
+                f"{self.api_base}/calendar/v3/calendars/primary/events",
+                headers={"Authorization": f"Bearer {access_token}"},
+                json=event_data
+            )
+            
+            if response.status_code == 401:
+                self.tokens.invalidate(user_id)
+            if response.status_code not in (200, 201):
+                raise HTTPException(status_code=response.status_code, detail=response.text)
+            
+            return {"success": True, "event": response.json()}
+            
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Google Calendar service error: {str(e)}")
+
+    async def insert_events(self, user_id: str, events: List[tuple]) -> Dict[str, tuple]:
+        """Insert ``(appointment_id, event)`` pairs with one batch request
+        
+        Returns ``{appointment_id: (status, body)}`` for every part.
+        """
+        if not self.enabled:
+            raise HTTPException(status_code=503, detail="Google Calendar service not configured")
+        
+        access_token = await self.tokens.access_token(user_id)
+        content_type, body = encode_batch([
+            (appointment_id, "POST", "/calendar/v3/calendars/primary/events", event)
+            for appointment_id, event in events
+        ])
+        client = upstream_clients.get("google")
+        response = await client.post(
+            f"{self.api_base}/batch/calendar/v3",
+            headers={"Authorization": f"Bearer {access_token}", "Content-Type": content_type},
+            content=body
+        )
+        
+        if response.status_code == 401:
+            self.tokens.invalidate(user_id)
+        if response.status_code != 200:
+            raise HTTPException(status_code=response.status_code, detail=response.text)
+        
+        results = decode_batch(response.headers.get("Content-Type", ""), response.content)
+        if any(status == 401 for status, _ in results.values()):
+            self.tokens.invalidate(user_id)
+        return results
 
 # Initialize services
 vapi_service = VAPIService()
@@ -475,20 +813,107 @@ twilio_service = TwilioService()
 stripe_service = StripeService()
 google_calendar_service = GoogleCalendarService()
 
+# New appointments are pushed to the creator's Google Calendar in batches
+calendar_sync = CalendarSyncQueue(
+    db,
+    google_calendar_service.insert_events,
+    batch_size=int(os.getenv("GOOGLE_SYNC_BATCH_SIZE", "50")),
+    flush_interval=float(os.getenv("GOOGLE_SYNC_FLUSH_INTERVAL", "2")),
+    max_queue=int(os.getenv("GOOGLE_SYNC_QUEUE_SIZE", "10000")),
+    max_attempts=int(os.getenv("GOOGLE_SYNC_MAX_ATTEMPTS", "3")),
+    retry_delay=float(os.getenv("GOOGLE_SYNC_RETRY_DELAY", "30"))
+)
+analytics_engine = AnalyticsEngine(db)
+rollup_store = RollupStore(db, analytics_engine)
+
+# Inbound webhooks are persisted locally and processed by background workers
+webhook_queue = WebhookQueue(
+    os.getenv("WEBHOOK_QUEUE_PATH", "data/webhook_queue.sqlite3"),
+    workers=int(os.getenv("WEBHOOK_WORKERS", "4")),
+    max_attempts=int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "8")),
+    base_backoff=float(os.getenv("WEBHOOK_RETRY_BACKOFF", "2"))
+)
+
+# Bulk SMS: per-sender token buckets (SMS_SENDER_RATES="+1555...=3,...") and bounded concurrency
+sms_campaigns = CampaignRunner(
+    twilio_service.send_sms,
+    concurrency=int(os.getenv("SMS_CAMPAIGN_CONCURRENCY", "10")),
+    default_rate=float(os.getenv("SMS_SENDER_RATE", "1")),
+    sender_rates=CampaignRunner.parse_rates(os.getenv("SMS_SENDER_RATES", "")),
+    max_attempts=int(os.getenv("SMS_MAX_ATTEMPTS", "5"))
+)
+SMS_CAMPAIGN_MAX_RECIPIENTS = int(os.getenv("SMS_CAMPAIGN_MAX_RECIPIENTS", "10000"))
+
+# VAPI call history is synced into a local store and served from there
+call_logs = CallLogStore(
+    os.getenv("CALL_LOG_DB_PATH", "data/call_logs.sqlite3"),
+    vapi_service.get_agent_logs,
+    page_size=int(os.getenv("CALL_LOG_SYNC_PAGE_SIZE", "100")),
+    sync_interval=float(os.getenv("CALL_LOG_SYNC_INTERVAL", "60"))
+)
+
+# Outbound dialer: live-call caps per agent and globally; outcomes arrive via call.ended webhooks
+dialer = Dialer(
+    vapi_service.make_call,
+    global_limit=int(os.getenv("DIALER_MAX_LIVE_CALLS", "20")),
+    per_agent_limit=int(os.getenv("DIALER_MAX_LIVE_CALLS_PER_AGENT", "5")),
+    max_attempts=int(os.getenv("DIALER_MAX_ATTEMPTS", "3")),
+    retry_delay=float(os.getenv("DIALER_RETRY_DELAY", "900")),
+    call_timeout=float(os.getenv("DIALER_CALL_TIMEOUT", "3600"))
+)
+DIALER_MAX_NUMBERS = int(os.getenv("DIALER_MAX_NUMBERS", "5000"))
+
+async def load_client_appointments(client_id: str) -> List[Dict[str, Any]]:
+    """Fetch every appointment of a client, a keyset page at a time"""
+    rows, cursor = [], None
+    while True:
+        result = await db.execute("appointments", lambda t, cursor=cursor: keyset_page(
+            t.select("id,created_at,date_time,duration,status").eq("client_id", client_id), 1000, cursor=cursor
+        ))
+        page, cursor = split_page(result.data or [], 1000)
+        rows.extend(page)
+        if cursor is None:
+            return rows
+
+# Appointment intervals per client, for overlap checks and free-slot search
+schedule_index = ScheduleIndex(
+    load_client_appointments,
+    ttl=float(os.getenv("SCHEDULE_INDEX_TTL", "300")),
+    maxsize=int(os.getenv("SCHEDULE_INDEX_MAX_CLIENTS", "1000"))
+)
+# "reject" answers overlapping appointments with 409; "flag" creates them and lists the conflicts
+APPOINTMENT_OVERLAP_POLICY = os.getenv("APPOINTMENT_OVERLAP_POLICY", "reject")
+
+# Scrape-time gauges for /metrics
+Gauge("upstream_circuit_open", "1 while an integration's circuit breaker is not closed", ("upstream",),
+      collect=lambda: [((name,), int(pool["breaker"]["state"] not in ("closed", "disabled")))
+                       for name, pool in upstream_clients.stats().items()])
+Gauge("db_queries_in_flight", "Database queries running on the pool",
+      collect=lambda: [((), db.in_flight)])
+Gauge("db_queries_queued", "Database queries waiting for a pool thread",
+      collect=lambda: [((), db.queued)])
+Gauge("activity_sink_queued", "Activity log entries waiting to be flushed",
+      collect=lambda: [((), activity_sink.stats()["queued"])])
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+# Bulk ingestion limits
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "500"))
+BULK_MAX_ROWS = int(os.getenv("BULK_MAX_ROWS", "50000"))
+
+# Rows fetched per upstream page while streaming exports
+EXPORT_PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", "1000"))
+
+# "rollups" answers /api/analytics from per-day buckets, "live" aggregates the source tables
+ANALYTICS_SOURCE = os.getenv("ANALYTICS_SOURCE", "rollups")
+
 # Authentication
 async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Verify JWT token"""
-    if not supabase:
+    if not token_verifier.enabled:
         raise HTTPException(status_code=503, detail="Database not configured")
     
-    try:
-        # Verify token with Supabase
-        response = supabase.auth.get_user(credentials.credentials)
-        if not response.user:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        return response.user
-    except Exception as e:
-        raise HTTPException(status_code=401, detail="Invalid token")
+    # Verified locally when possible; falls back to Supabase get_user
+    return await token_verifier.verify(credentials.credentials)
 
 async def get_current_user(token: str = Depends(verify_token)):
     """Get current authenticated user"""
@@ -496,21 +921,110 @@ async def get_current_user(token: str = Depends(verify_token)):
 
 async def log_activity(user_id: str, action: str, entity_type: str, entity_id: str, entity_name: str, details: Optional[Dict] = None):
     """Log user activity"""
-    if not supabase:
+    if not db.enabled:
         return
     
+    # Buffered and written as multi-row inserts by the activity sink
+    await activity_sink.put({
+        "user_id": user_id,
+        "action": action,
+        "entity_type": entity_type,
+        "entity_id": entity_id,
+        "entity_name": entity_name,
+        "details": details or {},
+        "created_at": datetime.utcnow().isoformat()
+    })
+
+# Row builders shared by the single and bulk create endpoints
+def client_row(client_data: ClientCreate) -> Dict[str, Any]:
+    """Build the clients table row for a validated ClientCreate"""
+    return {
+        "name": client_data.name,
+        "email": client_data.email,
+        "phone": client_data.phone,
+        "address": client_data.address,
+        "status": client_data.status,
+        "bilingual_preference": client_data.bilingual_preference,
+        "notes": client_data.notes,
+        "created_at": datetime.utcnow().isoformat(),
+        "updated_at": datetime.utcnow().isoformat()
+    }
+
+def project_row(project_data: ProjectCreate) -> Dict[str, Any]:
+    """Build the projects table row for a validated ProjectCreate"""
+    return {
+        "client_id": project_data.client_id,
+        "name": project_data.name,
+        "description": project_data.description,
+        "status": project_data.status,
+        "priority": project_data.priority,
+        "budget": project_data.budget,
+        "timeline": project_data.timeline,
+        "start_date": project_data.start_date.isoformat() if project_data.start_date else None,
+        "due_date": project_data.due_date.isoformat() if project_data.due_date else None,
+        "notes": project_data.notes,
+        "created_at": datetime.utcnow().isoformat(),
+        "updated_at": datetime.utcnow().isoformat()
+    }
+
+def appointment_row(appointment_data: AppointmentCreate) -> Dict[str, Any]:
+    """Build the appointments table row for a validated AppointmentCreate"""
+    return {
+        "client_id": appointment_data.client_id,
+        "date_time": appointment_data.date_time.isoformat(),
+        "type": appointment_data.type,
+        "title": appointment_data.title,
+        "description": appointment_data.description,
+        "duration": appointment_data.duration,
+        "location": appointment_data.location,
+        "notes": appointment_data.notes,
+        "created_at": datetime.utcnow().isoformat(),
+        "updated_at": datetime.utcnow().isoformat()
+    }
+
+def appointment_event(appointment_data: AppointmentCreate) -> Dict[str, Any]:
+    """Build the Google Calendar event for a validated AppointmentCreate"""
+    start = appointment_data.date_time
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    end = start + timedelta(minutes=appointment_data.duration or 60)
+    event = {
+        "summary": appointment_data.title or f"{appointment_data.type.replace('_', ' ').title()} appointment",
+        "description": appointment_data.description,
+        "location": appointment_data.location,
+        "start": {"dateTime": start.isoformat()},
+        "end": {"dateTime": end.isoformat()}
+    }
+    return {key: value for key, value in event.items() if value is not None}
+
+async def sync_to_calendar(user_id: str, events: List[tuple]) -> None:
+    """Queue ``(appointment_id, event)`` pairs for the user's Google Calendar, if connected"""
+    if not google_calendar_service.enabled:
+        return
     try:
-        supabase.table("activities").insert({
-            "user_id": user_id,
-            "action": action,
-            "entity_type": entity_type,
-            "entity_id": entity_id,
-            "entity_name": entity_name,
-            "details": details or {},
-            "created_at": datetime.utcnow().isoformat()
-        }).execute()
+        if not await google_calendar_service.tokens.connected(user_id):
+            return
     except Exception as e:
-        print(f"Error logging activity: {e}")
+        print(f"Error checking Google Calendar connection: {e}")
+        return
+    for appointment_id, event in events:
+        await calendar_sync.put(user_id, appointment_id, event)
+
+def invoice_row(invoice_data: InvoiceCreate) -> Dict[str, Any]:
+    """Build the invoices table row for a validated InvoiceCreate"""
+    return {
+        "client_id": invoice_data.client_id,
+        "project_id": invoice_data.project_id,
+        "title": invoice_data.title,
+        "description": invoice_data.description,
+        "amount": invoice_data.amount,
+        "tax_rate": invoice_data.tax_rate,
+        "due_date": invoice_data.due_date.isoformat(),
+        "notes": invoice_data.notes,
+        "status": "pending",
+        "created_at": datetime.utcnow().isoformat(),
+        "updated_at": datetime.utcnow().isoformat()
+    }
 
 # Routes
 @app.get("/")
@@ -531,18 +1045,42 @@ async def root():
 async def health_check():
     """Health check endpoint"""
     return {
-        "status": "healthy",
+        # "degraded" while any integration's circuit breaker is not closed
+        "status": "degraded" if upstream_clients.any_open() else "healthy",
         "timestamp": datetime.utcnow().isoformat(),
         "version": "2.0.0",
         "services": {
-            "database": supabase is not None,
+            "database": db.enabled,
             "vapi": vapi_service.enabled,
             "stripe": stripe_service.enabled,
             "twilio": bool(twilio_service.account_sid),
             "google_calendar": google_calendar_service.enabled
-        }
+        },
+        "http_pools": upstream_clients.stats(),
+        "auth": token_verifier.stats(),
+        "db": db.stats(),
+        "activity_sink": activity_sink.stats(),
+        "calendar_sync": calendar_sync.stats(),
+        "schedule_index": schedule_index.stats(),
+        "webhooks": await webhook_queue.stats(),
+        "sms_campaigns": sms_campaigns.stats(),
+        "dialer": dialer.stats(),
+        "call_logs": call_logs.stats(),
+        "caches": {name: cache.stats() for name, cache in caches.items()}
     }
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    """Prometheus metrics in text exposition format
+    
+    Protected by ``Authorization: Bearer $METRICS_TOKEN`` when METRICS_TOKEN is set.
+    """
+    if METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    # Refreshes the webhook queue gauges; the SQLite read stays on the queue's thread
+    await webhook_queue.stats()
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 # Client Management
 @app.post("/api/clients")
 async def create_client(
@@ -551,22 +1089,12 @@ async def create_client(
     current_user = Depends(get_current_user)
 ):
     """Create a new client"""
-    if not supabase:
+    if not db.enabled:
         raise HTTPException(status_code=503, detail="Database not configured")
     
     try:
         # Insert client into database
-        result = supabase.table("clients").insert({
-            "name": client_data.name,
-            "email": client_data.email,
-            "phone": client_data.phone,
-            "address": client_data.address,
-            "status": client_data.status,
-            "bilingual_preference": client_data.bilingual_preference,
-            "notes": client_data.notes,
-            "created_at": datetime.utcnow().isoformat(),
-            "updated_at": datetime.utcnow().isoformat()
-        }).execute()
+        result = await db.execute("clients", lambda t: t.insert(client_row(client_data)))
         
         if result.data:
             client_id = result.data[0]["id"]
@@ -594,29 +1122,52 @@ async def create_client(
 
 @app.get("/api/clients")
 async def get_clients(
+    request: Request,
     status: Optional[str] = None,
     limit: int = 50,
     offset: int = 0,
+    cursor: Optional[str] = None,
+    format: str = "rows",
+    fields: Optional[str] = None,
     current_user = Depends(get_current_user)
 ):
-    """Get all clients with optional filtering"""
-    if not supabase:
+    """Get all clients with optional filtering
+    
+    Pass the returned ``next_cursor`` as ``cursor`` to fetch the next page.
+    Cursor pages cost the same at any depth; ``offset`` is still accepted
+    but gets slower the deeper it goes. Send the returned ETag back as
+    If-None-Match to get a 304 when the page hasn't changed.
+    
+    ``format=columnar`` returns ``data`` as column names plus one array per
+    column; ``Accept: application/msgpack`` returns MessagePack. ``fields``
+    is ``summary``, ``full`` (the default) or a comma-separated column list.
+    """
+    if not db.enabled:
         raise HTTPException(status_code=503, detail="Database not configured")
+    if format not in LIST_FORMATS:
+        raise HTTPException(status_code=422, detail=f"format must be one of: {', '.join(LIST_FORMATS)}")
+    columns = select_columns("clients", fields)
     
     try:
-        query = supabase.table("clients").select("*")
-        
-        if status:
-            query = query.eq("status", status)
+        def build(query):
+            query = query.select(columns)
+            if status:
+                query = query.eq("status", status)
+            return keyset_page(query, limit, cursor=cursor, offset=offset)
         
-        result = query.range(offset, offset + limit - 1).execute()
+        result = await db.execute("clients", build)
+        rows, next_cursor = split_page(result.data, limit)
         
-        return {
+        return conditional_response(request, {
             "success": True,
-            "data": result.data,
-            "count": len(result.data)
-        }
+            "format": format,
+            "data": columnar(rows) if format == "columnar" else rows,
+            "count": len(rows),
+            "next_cursor": next_cursor
+        }, "/api/clients")
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -628,25 +1179,12 @@ async def create_project(
     current_user = Depends(get_current_user)
 ):
     """Create a new project"""
-    if not supabase:
+    if not db.enabled:
         raise HTTPException(status_code=503, detail="Database not configured")
     
     try:
         # Insert project into database
-        result = supabase.table("projects").insert({
-            "client_id": project_data.client_id,
-            "name": project_data.name,
-            "description": project_data.description,
-            "status": project_data.status,
-            "priority": project_data.priority,
-            "budget": project_data.budget,
-            "timeline": project_data.timeline,
-            "start_date": project_data.start_date.isoformat() if project_data.start_date else None,
-            "due_date": project_data.due_date.isoformat() if project_data.due_date else None,
-            "notes": project_data.notes,
-            "created_at": datetime.utcnow().isoformat(),
-            "updated_at": datetime.utcnow().isoformat()
-        }).execute()
+        result = await db.execute("projects", lambda t: t.insert(project_row(project_data)))
         
         if result.data:
             project_id = result.data[0]["id"]
@@ -679,24 +1217,33 @@ async def create_appointment(
     background_tasks: BackgroundTasks,
     current_user = Depends(get_current_user)
 ):
-    """Create a new appointment"""
-    if not supabase:
+    """Create a new appointment
+    
+    Overlaps with the client's other appointments are rejected with 409,
+    or created and listed in ``conflicts`` when APPOINTMENT_OVERLAP_POLICY
+    is ``flag``.
+    """
+    if not db.enabled:
         raise HTTPException(status_code=503, detail="Database not configured")
     
     try:
-        # Insert appointment into database
-        result = supabase.table("appointments").insert({
-            "client_id": appointment_data.client_id,
-            "date_time": appointment_data.date_time.isoformat(),
-            "type": appointment_data.type,
-            "title": appointment_data.title,
-            "description": appointment_data.description,
-            "duration": appointment_data.duration,
-            "location": appointment_data.location,
-            "notes": appointment_data.notes,
-            "created_at": datetime.utcnow().isoformat(),
-            "updated_at": datetime.utcnow().isoformat()
-        }).execute()
+        client_id = appointment_data.client_id
+        start = epoch(appointment_data.date_time)
+        end = start + 60 * (appointment_data.duration or 60)
+        
+        # Check and insert under the client's lock so concurrent requests can't double-book
+        async with schedule_index.lock(client_id):
+            conflicts = await schedule_index.conflicts_for(client_id, start, end)
+            if conflicts and APPOINTMENT_OVERLAP_POLICY == "reject":
+                raise HTTPException(
+                    status_code=409,
+                    detail=f"Appointment overlaps existing appointments: {', '.join(conflicts)}"
+                )
+            
+            # Insert appointment into database
+            result = await db.execute("appointments", lambda t: t.insert(appointment_row(appointment_data)))
+            if result.data:
+                schedule_index.add(client_id, result.data[0]["id"], start, end)
         
         if result.data:
             appointment_id = result.data[0]["id"]
@@ -710,15 +1257,72 @@ async def create_appointment(
                 appointment_id,
                 appointment_data.title or f"{appointment_data.type} appointment"
             )
+            background_tasks.add_task(
+                rollup_store.record, "appointments", appointment_data.date_time, appointment_data.type
+            )
+            background_tasks.add_task(
+                sync_to_calendar, current_user.id, [(appointment_id, appointment_event(appointment_data))]
+            )
             
             return {
                 "success": True,
                 "appointment_id": appointment_id,
-                "data": result.data[0]
+                "data": result.data[0],
+                "conflicts": conflicts
             }
         else:
             raise HTTPException(status_code=500, detail="Failed to create appointment")
             
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/clients/{client_id}/free-slots")
+async def get_free_slots(
+    client_id: str,
+    duration: int = 60,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = 1,
+    step: Optional[int] = None,
+    current_user = Depends(get_current_user)
+):
+    """Find the earliest free slots of ``duration`` minutes for a client
+    
+    Searches ``[start, end)`` (now to a week from now by default) and
+    returns up to ``limit`` slots; slots within one free gap are ``step``
+    minutes apart (``duration`` by default).
+    """
+    if not db.enabled:
+        raise HTTPException(status_code=503, detail="Database not configured")
+    if not 15 <= duration <= 480:
+        raise HTTPException(status_code=422, detail="duration must be between 15 and 480 minutes")
+    if not 1 <= limit <= 100:
+        raise HTTPException(status_code=422, detail="limit must be between 1 and 100")
+    if step is not None and step < 5:
+        raise HTTPException(status_code=422, detail="step must be at least 5 minutes")
+    
+    try:
+        window_start = epoch(start) if start else datetime.now(timezone.utc).timestamp()
+        window_end = epoch(end) if end else window_start + 7 * 86400
+        if window_end <= window_start:
+            raise HTTPException(status_code=422, detail="end must be after start")
+        
+        slots = await schedule_index.free_slots(
+            client_id, window_start, window_end, duration * 60, limit, step * 60 if step else None
+        )
+        
+        return {
+            "success": True,
+            "data": [
+                {"start": as_datetime(slot_start).isoformat(), "end": as_datetime(slot_end).isoformat()}
+                for slot_start, slot_end in slots
+            ]
+        }
+        
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -730,24 +1334,12 @@ async def create_invoice(
     current_user = Depends(get_current_user)
 ):
     """Create a new invoice"""
-    if not supabase:
+    if not db.enabled:
         raise HTTPException(status_code=503, detail="Database not configured")
     
     try:
         # Insert invoice into database
-        result = supabase.table("invoices").insert({
-            "client_id": invoice_data.client_id,
-            "project_id": invoice_data.project_id,
-            "title": invoice_data.title,
-            "description": invoice_data.description,
-            "amount": invoice_data.amount,
-            "tax_rate": invoice_data.tax_rate,
-            "due_date": invoice_data.due_date.isoformat(),
-            "notes": invoice_data.notes,
-            "status": "pending",
-            "created_at": datetime.utcnow().isoformat(),
-            "updated_at": datetime.utcnow().isoformat()
-        }).execute()
+        result = await db.execute("invoices", lambda t: t.insert(invoice_row(invoice_data)))
         
         if result.data:
             invoice_id = result.data[0]["id"]
@@ -770,9 +1362,103 @@ async def create_invoice(
         else:
             raise HTTPException(status_code=500, detail="Failed to create invoice")
             
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Bulk creation: JSON array or streamed NDJSON, validated per row, inserted in chunks
+async def bulk_create(request: Request, table: str, model, to_row, entity_type: str,
+                      current_user, on_chunk=None, screen=None) -> Dict[str, Any]:
+    """Shared implementation of the /bulk create endpoints"""
+    if not db.enabled:
+        raise HTTPException(status_code=503, detail="Database not configured")
+    
+    try:
+        result = await bulk_insert(
+            db, table, model, to_row, iter_request_rows(request, BULK_MAX_ROWS),
+            chunk_size=BULK_CHUNK_SIZE,
+            max_rows=BULK_MAX_ROWS,
+            on_chunk=on_chunk,
+            screen=screen
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    if result.inserted:
+        # One summary activity per import rather than one per row
+        await log_activity(
+            current_user.id,
+            "create",
+            entity_type,
+            result.inserted[0]["id"],
+            f"Bulk import of {len(result.inserted)} {table}",
+            {"bulk": True, "count": len(result.inserted)}
+        )
+    
+    return result.to_response()
+
+@app.post("/api/clients/bulk")
+async def bulk_create_clients(request: Request, current_user = Depends(get_current_user)):
+    """Create many clients from a JSON array or NDJSON stream"""
+    return await bulk_create(request, "clients", ClientCreate, client_row, "client", current_user)
+
+@app.post("/api/projects/bulk")
+async def bulk_create_projects(request: Request, current_user = Depends(get_current_user)):
+    """Create many projects from a JSON array or NDJSON stream"""
+    return await bulk_create(request, "projects", ProjectCreate, project_row, "project", current_user)
+
+@app.post("/api/appointments/bulk")
+async def bulk_create_appointments(request: Request, current_user = Depends(get_current_user)):
+    """Create many appointments from a JSON array or NDJSON stream
+    
+    Rows are checked for overlaps with existing appointments and with
+    earlier rows of the same request, like ``POST /api/appointments``:
+    overlapping rows fail, or are created with their ``conflicts`` listed
+    when APPOINTMENT_OVERLAP_POLICY is ``flag``.
+    """
+    @asynccontextmanager
+    async def screen(entries):
+        # Hold every client's lock in the chunk from the check until the index is updated
+        async with AsyncExitStack() as stack:
+            for client_id in sorted({item.client_id for _, item in entries}):
+                await stack.enter_async_context(schedule_index.lock(client_id))
+            
+            batch: Dict[str, ClientSchedule] = {}
+            outcomes = []
+            for index, item in entries:
+                start = epoch(item.date_time)
+                end = start + 60 * (item.duration or 60)
+                pending = batch.setdefault(item.client_id, ClientSchedule())
+                conflicts = await schedule_index.conflicts_for(item.client_id, start, end)
+                conflicts += pending.overlapping(start, end)
+                if conflicts and APPOINTMENT_OVERLAP_POLICY == "reject":
+                    outcomes.append({"error": f"Appointment overlaps existing appointments: {', '.join(conflicts)}"})
+                    continue
+                pending.add(f"row {index}", start, end)
+                outcomes.append({"conflicts": conflicts})
+            yield outcomes
+    
+    async def on_chunk(items, records):
+        for item, record in zip(items, records):
+            start = epoch(item.date_time)
+            schedule_index.add(item.client_id, record["id"], start, start + 60 * (item.duration or 60))
+        await rollup_store.record_many("appointments", [(item.date_time, item.type) for item in items])
+        await sync_to_calendar(
+            current_user.id, [(record["id"], appointment_event(item)) for item, record in zip(items, records)]
+        )
+    
+    return await bulk_create(
+        request, "appointments", AppointmentCreate, appointment_row, "appointment", current_user, on_chunk, screen
+    )
+
+@app.post("/api/invoices/bulk")
+async def bulk_create_invoices(request: Request, current_user = Depends(get_current_user)):
+    """Create many invoices from a JSON array or NDJSON stream"""
+    return await bulk_create(request, "invoices", InvoiceCreate, invoice_row, "invoice", current_user)
+
 # Voice Agent Management
 @app.post("/api/voice-agents")
 async def create_voice_agent(
@@ -789,8 +1475,8 @@ async def create_voice_agent(
             agent_id = result["agent_id"]
             
             # Store agent in database
-            if supabase:
-                supabase.table("voice_agents").insert({
+            if db.enabled:
+                await db.execute("voice_agents", lambda t: t.insert({
                     "vapi_agent_id": agent_id,
                     "name": agent_data.name,
                     "phone_number": agent_data.phone_number,
@@ -803,7 +1489,7 @@ async def create_voice_agent(
                     "status": "active",
                     "created_at": datetime.utcnow().isoformat(),
                     "updated_at": datetime.utcnow().isoformat()
-                }).execute()
+                }))
             
             # Log activity
             background_tasks.add_task(
@@ -823,6 +1509,8 @@ async def create_voice_agent(
         else:
             raise HTTPException(status_code=500, detail="Failed to create voice agent")
             
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -845,9 +1533,95 @@ async def make_voice_call(
         else:
             raise HTTPException(status_code=500, detail="Failed to make call")
             
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/voice-agents/{agent_id}/dialer-jobs")
+async def create_dialer_job(
+    agent_id: str,
+    job_data: DialerJobCreate,
+    current_user = Depends(get_current_user)
+):
+    """Schedule outbound calls to a list of numbers
+    
+    Calls are placed in the background within the live-call limits and,
+    if ``window_start``/``window_end`` are given, only during those local
+    hours in each number's time zone (default: the job's ``timezone``).
+    Busy and no-answer calls are retried.
+    """
+    if not vapi_service.enabled:
+        raise HTTPException(status_code=503, detail="VAPI service not configured")
+    if len(job_data.numbers) > DIALER_MAX_NUMBERS:
+        raise HTTPException(status_code=413, detail=f"Dialer jobs are limited to {DIALER_MAX_NUMBERS} numbers")
+    
+    window = parse_window(job_data.window_start, job_data.window_end)
+    check_timezone(job_data.timezone)
+    numbers, seen = [], set()
+    for entry in job_data.numbers:
+        if entry.timezone:
+            check_timezone(entry.timezone)
+        if entry.number not in seen:
+            seen.add(entry.number)
+            numbers.append({"number": entry.number, "timezone": entry.timezone})
+    
+    try:
+        job = dialer.submit(
+            current_user.id,
+            agent_id,
+            numbers,
+            timezone_name=job_data.timezone,
+            window=window,
+            max_attempts=job_data.max_attempts,
+            retry_delay=job_data.retry_delay_minutes * 60 if job_data.retry_delay_minutes is not None else None
+        )
+        
+        await log_activity(
+            current_user.id,
+            "created",
+            "dialer_job",
+            job.id,
+            f"Dialer job for {len(numbers)} numbers"
+        )
+        
+        return {
+            "success": True,
+            "data": job.summary()
+        }
+        
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/dialer-jobs/{job_id}")
+async def get_dialer_job(
+    job_id: str,
+    status: Optional[str] = None,
+    current_user = Depends(get_current_user)
+):
+    """Get dialer job progress and per-number outcomes (optionally filtered by status)"""
+    job = dialer.get(job_id, current_user.id)
+    return {
+        "success": True,
+        "data": {
+            **job.summary(),
+            "numbers": [entry for entry in job.entries if status is None or entry["status"] == status]
+        }
+    }
+
+@app.post("/api/dialer-jobs/{job_id}/cancel")
+async def cancel_dialer_job(
+    job_id: str,
+    current_user = Depends(get_current_user)
+):
+    """Stop placing new calls for a dialer job; calls already live are not hung up"""
+    job = dialer.get(job_id, current_user.id)
+    dialer.cancel(job)
+    return {
+        "success": True,
+        "data": job.summary()
+    }
+
 # Payment Management
 @app.post("/api/payments")
 async def create_payment(
@@ -856,12 +1630,12 @@ async def create_payment(
     current_user = Depends(get_current_user)
 ):
     """Create a new payment"""
-    if not supabase:
+    if not db.enabled:
         raise HTTPException(status_code=503, detail="Database not configured")
     
     try:
         # Insert payment into database
-        result = supabase.table("payments").insert({
+        result = await db.execute("payments", lambda t: t.insert({
             "invoice_id": payment_data.invoice_id,
             "amount": payment_data.amount,
             "payment_method": payment_data.payment_method,
@@ -871,7 +1645,7 @@ async def create_payment(
             "status": "completed",
             "created_at": datetime.utcnow().isoformat(),
             "updated_at": datetime.utcnow().isoformat()
-        }).execute()
+        }))
         
         if result.data:
             payment_id = result.data[0]["id"]
@@ -885,6 +1659,9 @@ async def create_payment(
                 payment_id,
                 f"Payment of ${payment_data.amount}"
             )
+            background_tasks.add_task(
+                rollup_store.record, "revenue", payment_data.payment_date, total=payment_data.amount
+            )
             
             return {
                 "success": True,
@@ -904,19 +1681,27 @@ async def create_stripe_payment_intent(
     currency: str = "usd",
     customer_id: Optional[str] = None,
     metadata: Optional[Dict[str, str]] = None,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     current_user = Depends(get_current_user)
 ):
-    """Create a Stripe payment intent"""
+    """Create a Stripe payment intent
+    
+    Clients retrying a request should resend the same Idempotency-Key
+    header so Stripe returns the original intent instead of a new one.
+    """
     try:
         result = await stripe_service.create_payment_intent(
             amount=amount,
             currency=currency,
             customer_id=customer_id,
-            metadata=metadata
+            metadata=metadata,
+            idempotency_key=idempotency_key
         )
         
         return result
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -940,117 +1725,189 @@ async def google_calendar_callback(
     current_user = Depends(get_current_user)
 ):
     """Handle Google Calendar OAuth callback"""
+    # state carries the user id the auth URL was issued for
+    if state != current_user.id:
+        raise HTTPException(status_code=400, detail="OAuth state does not match the signed-in user")
+    
     try:
-        result = await google_calendar_service.exchange_code_for_token(code, state)
+        result = await google_calendar_service.exchange_code_for_token(code, current_user.id)
         return result
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # Analytics
+async def analytics_payload(analytics_request: AnalyticsRequest) -> Dict[str, Any]:
+    """Compute the analytics response body"""
+    # Aggregated in Postgres; independent metrics are fetched concurrently
+    engine = rollup_store if ANALYTICS_SOURCE == "rollups" else analytics_engine
+    try:
+        analytics_data = await engine.compute(
+            analytics_request.metrics,
+            analytics_request.start_date,
+            analytics_request.end_date
+        )
+    except Exception as e:
+        if engine is analytics_engine:
+            raise
+        print(f"Analytics rollups unavailable, aggregating live: {e}")
+        analytics_data = await analytics_engine.compute(
+            analytics_request.metrics,
+            analytics_request.start_date,
+            analytics_request.end_date
+        )
+    
+    return {
+        "success": True,
+        "data": analytics_data,
+        "period": {
+            "start": analytics_request.start_date.isoformat(),
+            "end": analytics_request.end_date.isoformat()
+        }
+    }
+
 @app.post("/api/analytics")
 async def get_analytics(
     analytics_request: AnalyticsRequest,
     current_user = Depends(get_current_user)
 ):
     """Get analytics data"""
-    if not supabase:
+    if not db.enabled:
         raise HTTPException(status_code=503, detail="Database not configured")
     
     try:
-        analytics_data = {}
-        
-        # Revenue analytics
-        if "revenue" in analytics_request.metrics:
-            revenue_result = supabase.table("payments").select("amount").gte(
-                "payment_date", analytics_request.start_date.isoformat()
-            ).lte("payment_date", analytics_request.end_date.isoformat()).execute()
-            
-            total_revenue = sum(payment["amount"] for payment in revenue_result.data)
-            analytics_data["revenue"] = {
-                "total": total_revenue,
-                "count": len(revenue_result.data)
-            }
-        
-        # Client analytics
-        if "clients" in analytics_request.metrics:
-            clients_result = supabase.table("clients").select("status").execute()
-            client_counts = {}
-            for client in clients_result.data:
-                status = client["status"]
-                client_counts[status] = client_counts.get(status, 0) + 1
-            
-            analytics_data["clients"] = client_counts
-        
-        # Project analytics
-        if "projects" in analytics_request.metrics:
-            projects_result = supabase.table("projects").select("status").execute()
-            project_counts = {}
-            for project in projects_result.data:
-                status = project["status"]
-                project_counts[status] = project_counts.get(status, 0) + 1
-            
-            analytics_data["projects"] = project_counts
+        return await analytics_payload(analytics_request)
         
-        # Appointment analytics
-        if "appointments" in analytics_request.metrics:
-            appointments_result = supabase.table("appointments").select("type").gte(
-                "date_time", analytics_request.start_date.isoformat()
-            ).lte("date_time", analytics_request.end_date.isoformat()).execute()
-            
-            appointment_counts = {}
-            for appointment in appointments_result.data:
-                appointment_type = appointment["type"]
-                appointment_counts[appointment_type] = appointment_counts.get(appointment_type, 0) + 1
-            
-            analytics_data["appointments"] = appointment_counts
-        
-        return {
-            "success": True,
-            "data": analytics_data,
-            "period": {
-                "start": analytics_request.start_date.isoformat(),
-                "end": analytics_request.end_date.isoformat()
-            }
-        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/analytics")
+async def get_analytics_query(
+    request: Request,
+    start_date: datetime,
+    end_date: datetime,
+    metrics: Optional[str] = None,
+    current_user = Depends(get_current_user)
+):
+    """Get analytics data with ETag revalidation
+    
+    Same result as POST /api/analytics, with ``metrics`` as a comma
+    separated list; If-None-Match with the last ETag returns 304 when
+    nothing changed.
+    """
+    if not db.enabled:
+        raise HTTPException(status_code=503, detail="Database not configured")
+    
+    if end_date < start_date:
+        raise HTTPException(status_code=422, detail="end_date must not be before start_date")
+    fields = {"start_date": start_date, "end_date": end_date}
+    if metrics:
+        fields["metrics"] = [metric.strip() for metric in metrics.split(",") if metric.strip()]
+        unknown = [metric for metric in fields["metrics"] if metric not in ANALYTICS_METRICS]
+        if unknown:
+            raise HTTPException(
+                status_code=422,
+                detail=f"Unknown metrics: {', '.join(unknown)} (expected {', '.join(ANALYTICS_METRICS)})"
+            )
+    try:
+        analytics_request = AnalyticsRequest(**fields)
+    except ValidationError as e:
+        raise HTTPException(
+            status_code=422,
+            detail=[{"loc": ["query", *err["loc"]], "msg": err["msg"]} for err in e.errors()]
+        )
+    
+    try:
+        payload = await analytics_payload(analytics_request)
+        return conditional_response(request, payload, "/api/analytics")
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # Webhooks
+def webhook_event_id(body: bytes, *candidates: Optional[str]) -> str:
+    """Provider event id for deduplication, falling back to a hash of the body"""
+    for candidate in candidates:
+        if candidate:
+            return str(candidate)
+    return hashlib.sha256(body).hexdigest()
+
+async def process_vapi_event(body: bytes):
+    """Process a queued VAPI webhook"""
+    payload = WebhookPayload(**json.loads(body))
+    
+    if payload.event_type == "call.ended":
+        call_id = payload.data.get("id") or (payload.data.get("call") or {}).get("id")
+        if call_id:
+            # Frees the dialer slot and records the outcome for dialer jobs
+            dialer.call_ended(call_id, payload.data)
+            # Final call state goes into the local call log store
+            call = {key: value for key, value in payload.data.items() if key != "call"}
+            await call_logs.record({**call, **(payload.data.get("call") or {}), "id": call_id})
+    
+    # Update database based on webhook data
+    if db.enabled and payload.event_type == "call.ended":
+        call_data = payload.data
+        # Update call status in database
+        # Implement your logic here
+
+async def process_stripe_event(body: bytes):
+    """Process a queued Stripe webhook"""
+    payload = json.loads(body)
+    event_type = payload.get("type")
+    
+    # Update database based on webhook data
+    if db.enabled and event_type == "payment_intent.succeeded":
+        payment_data = payload.get("data", {}).get("object", {})
+        # Update payment status in database
+        # Implement your logic here
+
+webhook_queue.register("vapi", process_vapi_event)
+webhook_queue.register("stripe", process_stripe_event)
+
 @app.post("/webhooks/vapi")
-async def vapi_webhook(payload: WebhookPayload):
-    """Handle VAPI webhooks"""
+async def vapi_webhook(request: Request):
+    """Handle VAPI webhooks
+    
+    The event is persisted to the durable webhook queue and acknowledged
+    immediately; processing happens on the queue's workers.
+    """
+    body = await request.body()
     try:
-        # Process VAPI webhook
-        print(f"VAPI Webhook: {payload.event_type} - {payload.data}")
-        
-        # Update database based on webhook data
-        if supabase and payload.event_type == "call.ended":
-            call_data = payload.data
-            # Update call status in database
-            # Implement your logic here
-        
+        payload = WebhookPayload(**json.loads(body))
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=422, detail=f"Invalid webhook payload: {e}")
+    
+    call = payload.data.get("call") or {}
+    call_id = payload.data.get("id") or call.get("id")
+    event_id = webhook_event_id(body, f"{payload.event_type}:{call_id}" if call_id else None)
+    
+    try:
+        await webhook_queue.enqueue("vapi", event_id, payload.event_type, body)
         return {"success": True}
-        
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/webhooks/stripe")
-async def stripe_webhook(payload: Dict[str, Any]):
-    """Handle Stripe webhooks"""
+async def stripe_webhook(request: Request):
+    """Handle Stripe webhooks
+    
+    Queued durably and deduplicated by Stripe event id; see /webhooks/vapi.
+    """
+    body = await request.body()
     try:
-        # Process Stripe webhook
-        event_type = payload.get("type")
-        print(f"Stripe Webhook: {event_type}")
-        
-        # Update database based on webhook data
-        if supabase and event_type == "payment_intent.succeeded":
-            payment_data = payload.get("data", {}).get("object", {})
-            # Update payment status in database
-            # Implement your logic here
-        
+        payload = json.loads(body)
+        if not isinstance(payload, dict):
+            raise ValueError("expected a JSON object")
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid webhook payload: {e}")
+    
+    try:
+        await webhook_queue.enqueue("stripe", webhook_event_id(body, payload.get("id")), payload.get("type"), body)
         return {"success": True}
-        
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1058,15 +1915,44 @@ async def stripe_webhook(payload: Dict[str, Any]):
 @app.get("/voice-agents/{agent_id}/logs")
 async def get_agent_logs(
     agent_id: str,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    ended_reason: Optional[str] = None,
+    customer_number: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    refresh: bool = False,
     current_user = Depends(get_current_user)
 ):
-    """Get logs for a specific voice agent"""
+    """Get logs for a specific voice agent
+    
+    Served from the local call log store, newest first, with
+    ``cursor``/``next_cursor`` paging. New calls are synced from VAPI at
+    most every CALL_LOG_SYNC_INTERVAL seconds (``refresh=true`` forces a
+    sync before reading). While an agent's first history backfill runs in
+    the background, the calls stored so far are returned with a 202 and
+    ``"backfilling": true``.
+    """
     try:
-        logs = await vapi_service.get_agent_logs(agent_id)
-        return {
-            "success": True,
-            "data": logs
-        }
+        backfilling = await call_logs.refresh(agent_id, force=refresh)
+        # Stored call JSON is spliced into the response as-is, never decoded
+        logs, next_cursor = await call_logs.query_raw(
+            agent_id,
+            limit=max(1, min(limit, 500)),
+            cursor=cursor,
+            status=status,
+            ended_reason=ended_reason,
+            customer_number=customer_number,
+            since=since,
+            until=until
+        )
+        if backfilling:
+            return RawEnvelopeResponse(logs, status_code=202, headers={"Retry-After": "5"},
+                                       next_cursor=next_cursor, backfilling=True)
+        return RawEnvelopeResponse(logs, next_cursor=next_cursor)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1080,52 +1966,185 @@ async def send_sms(
     try:
         result = await twilio_service.send_sms(to, message)
         return result
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/phone-numbers")
-async def get_phone_numbers(current_user = Depends(get_current_user)):
-    """Get all Twilio phone numbers"""
+@app.post("/sms/campaigns")
+async def create_sms_campaign(
+    campaign_data: SmsCampaignCreate,
+    current_user = Depends(get_current_user)
+):
+    """Send a templated SMS to many recipients from a background job
+    
+    ``{name}`` placeholders in the message are filled from each
+    recipient's ``variables``. Returns immediately; poll
+    ``GET /sms/campaigns/{id}`` for progress.
+    """
+    if not twilio_service.account_sid or not twilio_service.auth_token:
+        raise HTTPException(status_code=503, detail="Twilio service not configured")
+    if len(campaign_data.recipients) > SMS_CAMPAIGN_MAX_RECIPIENTS:
+        raise HTTPException(status_code=413, detail=f"Campaigns are limited to {SMS_CAMPAIGN_MAX_RECIPIENTS} recipients")
+    
     try:
-        phone_numbers = await twilio_service.get_phone_numbers()
+        validate_template(campaign_data.message)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid message template: {e}")
+    
+    sender = campaign_data.from_number or os.getenv("TWILIO_PHONE_NUMBER")
+    if not sender:
+        raise HTTPException(status_code=400, detail="No sender number configured")
+    
+    # One message per number, keeping the first occurrence
+    recipients, seen = [], set()
+    for recipient in campaign_data.recipients:
+        if recipient.to not in seen:
+            seen.add(recipient.to)
+            recipients.append({"to": recipient.to, "variables": recipient.variables})
+    
+    try:
+        campaign = sms_campaigns.start(current_user.id, sender, campaign_data.message, recipients)
+        
+        await log_activity(
+            current_user.id,
+            "created",
+            "sms_campaign",
+            campaign.id,
+            f"SMS campaign to {len(recipients)} recipients"
+        )
+        
         return {
             "success": True,
-            "data": phone_numbers
+            "data": campaign.summary()
         }
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/sms/campaigns/{campaign_id}")
+async def get_sms_campaign(
+    campaign_id: str,
+    status: Optional[str] = None,
+    current_user = Depends(get_current_user)
+):
+    """Get campaign progress, with per-recipient status (optionally filtered by status)"""
+    campaign = sms_campaigns.get(campaign_id, current_user.id)
+    recipients = [
+        {key: value for key, value in recipient.items() if key != "variables"}
+        for recipient in campaign.recipients
+        if status is None or recipient["status"] == status
+    ]
+    return {
+        "success": True,
+        "data": {**campaign.summary(), "recipients": recipients}
+    }
+
+@app.get("/phone-numbers")
+async def get_phone_numbers(refresh: bool = False, current_user = Depends(get_current_user)):
+    """Get all Twilio phone numbers
+    
+    Served from cache; ``refresh=true`` drops the cached list first.
+    """
+    try:
+        if refresh:
+            twilio_service.invalidate_phone_numbers()
+        return RawEnvelopeResponse(await twilio_service.get_phone_numbers_raw())
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/activities")
 async def get_recent_activities(
+    request: Request,
     limit: int = 20,
     offset: int = 0,
+    cursor: Optional[str] = None,
+    format: str = "rows",
+    fields: Optional[str] = None,
     current_user = Depends(get_current_user)
 ):
-    """Get recent user activities"""
-    if not supabase:
+    """Get recent user activities
+    
+    Supports the same constant-cost ``cursor``/``next_cursor`` paging, ETag
+    revalidation, columnar/MessagePack formats and ``fields`` projections as
+    ``/api/clients``; ``offset`` remains for compatibility.
+    """
+    if not db.enabled:
         raise HTTPException(status_code=503, detail="Database not configured")
+    if format not in LIST_FORMATS:
+        raise HTTPException(status_code=422, detail=f"format must be one of: {', '.join(LIST_FORMATS)}")
+    columns = select_columns("activities", fields)
     
     try:
-        result = supabase.table("activities").select("*").eq(
-            "user_id", current_user.id
-        ).order("created_at", desc=True).range(offset, offset + limit - 1).execute()
+        result = await db.execute("activities", lambda t: keyset_page(
+            t.select(columns).eq("user_id", current_user.id), limit, cursor=cursor, offset=offset
+        ))
+        rows, next_cursor = split_page(result.data, limit)
         
-        return {
+        return conditional_response(request, {
             "success": True,
-            "data": result.data
-        }
+            "format": format,
+            "data": columnar(rows) if format == "columnar" else rows,
+            "next_cursor": next_cursor
+        }, "/api/activities")
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Exports
+@app.get("/api/exports/{entity}")
+async def export_entity(
+    entity: str,
+    format: str = "csv",
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    current_user = Depends(get_current_user)
+):
+    """Stream clients, invoices, payments or activities as CSV or NDJSON
+    
+    Activities are limited to the current user's, as in ``/api/activities``.
+    """
+    if not db.enabled:
+        raise HTTPException(status_code=503, detail="Database not configured")
+    if entity not in EXPORTS:
+        raise HTTPException(status_code=404, detail=f"Unknown export '{entity}'")
+    if format not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="format must be 'csv' or 'ndjson'")
+    
+    export = EXPORTS[entity]
+    owner_column = export.get("owner_column")
+    rows = iter_table(
+        db,
+        export["table"],
+        date_column=export["date_column"],
+        start=start_date,
+        end=end_date,
+        page_size=EXPORT_PAGE_SIZE,
+        owner=(owner_column, current_user.id) if owner_column else None
+    )
+    encoder = stream_csv if format == "csv" else stream_ndjson
+    filename = f"{entity}-{datetime.utcnow().strftime('%Y%m%d')}.{format}"
+    
+    return StreamingResponse(
+        guarded(encoder(rows), entity),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 # Error handlers
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc):
-    return {"error": exc.detail, "status_code": exc.status_code}
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"error": exc.detail, "status_code": exc.status_code},
+        headers=getattr(exc, "headers", None)
+    )
 
 @app.exception_handler(Exception)
 async def general_exception_handler(request, exc):
-    return {"error": "Internal server error", "status_code": 500}
+    return JSONResponse(status_code=500, content={"error": "Internal server error", "status_code": 500})
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,242 @@
+"""Prometheus text-format metrics with no external dependencies.
+
+Metrics are plain in-process counters, gauges and fixed-bucket histograms.
+Recording is a dict lookup, a bisect and a few additions under an
+uncontended lock (DB timings are recorded from the query threads), so it is
+cheap enough for every request; all formatting work happens only when
+``/metrics`` is scraped.
+
+Recorded:
+
+* ``http_requests_total`` / ``http_request_duration_seconds`` by method,
+  route template and status, plus ``http_requests_in_flight``
+  (``MetricsMiddleware``);
+* ``http_conditional_requests_total`` by route and ETag revalidation
+  outcome (``responses.conditional_response``);
+* ``upstream_requests_total`` / ``upstream_request_duration_seconds`` by
+  integration, operation and status (``http_clients`` transport);
+* ``db_query_duration_seconds`` by table (``db.Database``);
+* ``event_loop_lag_seconds`` (``monitor_event_loop``).
+"""
+
+import asyncio
+import re
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, labels: Tuple = (), amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [
+            f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}" for labels, value in items
+        ]
+
+
+class Gauge(_Metric):
+    """A settable gauge, or one computed at scrape time by ``collect``."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 collect: Optional[Callable[[], Iterable[Tuple[Tuple, float]]]] = None):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._collect = collect
+
+    def set(self, value: float, labels: Tuple = ()) -> None:
+        self._values[labels] = value
+
+    def inc(self, labels: Tuple = (), amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, labels: Tuple = (), amount: float = 1) -> None:
+        self.inc(labels, -amount)
+
+    def render(self) -> List[str]:
+        if self._collect is not None:
+            items = list(self._collect())
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        return self.header() + [
+            f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}" for labels, value in items
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple, List[float]] = {}  # per-bucket counts..., +Inf count, sum
+
+    def observe(self, labels: Tuple, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(labels, list(series)) for labels, series in self._series.items()]
+        lines = self.header()
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(series[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> None:
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests handled", ("method", "route", "status"))
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency", ("method", "route", "status"))
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests currently being handled")
+HTTP_CONDITIONAL = Counter("http_conditional_requests_total",
+                           "Requests to ETag-enabled routes by outcome (not_modified, modified, unconditional)",
+                           ("route", "outcome"))
+UPSTREAM_REQUESTS = Counter("upstream_requests_total", "Outbound integration requests",
+                            ("upstream", "operation", "status"))
+UPSTREAM_LATENCY = Histogram("upstream_request_duration_seconds", "Outbound integration request latency",
+                             ("upstream", "operation"))
+DB_LATENCY = Histogram("db_query_duration_seconds", "Database query latency", ("table", "outcome"))
+LOOP_LAG = Gauge("event_loop_lag_seconds", "Most recent event loop scheduling delay")
+LOOP_LAG_HISTOGRAM = Histogram("event_loop_lag_distribution_seconds", "Event loop scheduling delay",
+                               buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+WEBHOOK_QUEUE_DEPTH = Gauge("webhook_queue_depth", "Webhook events pending or processing")
+WEBHOOK_QUEUE_LAG = Gauge("webhook_queue_lag_seconds", "Age of the oldest pending or processing webhook event")
+WEBHOOK_DEAD_LETTERS = Gauge("webhook_dead_letters", "Webhook events in the dead-letter state")
+
+# Path segments that are identifiers, collapsed so operations have bounded cardinality
+_ID_SEGMENT = re.compile(r"^(\d+|[0-9a-fA-F-]{32,36}|(?=.*\d)[A-Za-z0-9_-]{16,})$")
+
+
+def operation(method: str, path: str) -> str:
+    """``POST /call/3f0c...`` -> ``POST /call/{id}``."""
+    segments = ["{id}" if _ID_SEGMENT.match(part) else part for part in path.split("/")]
+    return f"{method} {'/'.join(segments)}"
+
+
+def observe_upstream(upstream: str, method: str, path: str, status: str, elapsed: float) -> None:
+    op = operation(method, path)
+    UPSTREAM_REQUESTS.inc((upstream, op, status))
+    UPSTREAM_LATENCY.observe((upstream, op), elapsed)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording per-route latency and in-flight requests.
+
+    The route label is the matched path template (``/api/clients/{client_id}``)
+    so cardinality stays bounded; unmatched paths are reported as ``unmatched``.
+    """
+
+    def __init__(self, app: Any, exclude: Sequence[str] = ("/metrics",)):
+        self.app = app
+        self.exclude = set(exclude)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exclude:
+            await self.app(scope, receive, send)
+            return
+
+        status = "500"
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            HTTP_IN_FLIGHT.dec()
+            route = scope.get("route")
+            labels = (scope["method"], getattr(route, "path", "unmatched"), status)
+            HTTP_REQUESTS.inc(labels)
+            HTTP_LATENCY.observe(labels, elapsed)
+
+
+async def monitor_event_loop(interval: float = 0.5) -> None:
+    """Measure how late the loop wakes a sleeping task; run as a background task."""
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - expected)
+        LOOP_LAG.set(lag)
+        LOOP_LAG_HISTOGRAM.observe((), lag)
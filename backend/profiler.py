@@ -0,0 +1,201 @@
+"""Opt-in, per-request sampling profiler.
+
+``ProfilerMiddleware`` is only installed when ``PROFILE_ADMIN_TOKEN`` or
+``PROFILE_SAMPLE_RATE`` is configured, so a normal deployment pays nothing
+for it. When installed, a request is profiled if it carries
+``X-Profile: <PROFILE_ADMIN_TOKEN>`` or wins the ``PROFILE_SAMPLE_RATE``
+draw.
+
+While a profiled request runs, a background thread wakes every
+``interval`` seconds and looks at the request's asyncio task:
+
+* if the event loop is currently running that task, the loop thread's
+  Python stack is recorded under a ``[cpu]`` root;
+* otherwise the task is suspended, and its coroutine ``await`` chain is
+  recorded under an ``[await]`` root, ending in what it is waiting on
+  (e.g. the executor future of a Supabase query or an httpx read).
+
+Profiles are written in speedscope's JSON format (open them at
+https://www.speedscope.app or convert to a flamegraph) to
+``PROFILE_DIR``; the file name is returned in the ``X-Profile-File``
+response header.
+"""
+
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+_Frame = Tuple[str, str, int]
+_Sample = Tuple[str, List[_Frame], float]  # kind, stack (outermost first), weight in seconds
+
+
+def _frame_key(frame) -> _Frame:
+    code = frame.f_code
+    return getattr(code, "co_qualname", code.co_name), code.co_filename, code.co_firstlineno
+
+
+def _coroutine_chain(coro) -> Tuple[List[Any], Any]:
+    """Frames of a suspended coroutine chain (outermost first) and the awaited leaf."""
+    frames = []
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None) or getattr(coro, "ag_frame", None)
+        if frame is None:
+            break
+        frames.append(frame)
+        awaited = getattr(coro, "cr_await", None)
+        if awaited is None:
+            awaited = getattr(coro, "gi_yieldfrom", None)
+        if awaited is None or not (hasattr(awaited, "cr_frame") or hasattr(awaited, "gi_frame")):
+            return frames, awaited
+        coro = awaited
+    return frames, None
+
+
+class _Sampler(threading.Thread):
+    def __init__(self, loop: asyncio.AbstractEventLoop, task: asyncio.Task, loop_thread: int,
+                 interval: float, max_duration: float):
+        super().__init__(name="request-profiler", daemon=True)
+        self.loop = loop
+        self.task = task
+        self.loop_thread = loop_thread
+        self.interval = interval
+        self.max_samples = int(max_duration / interval)
+        self.samples: List[_Sample] = []
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        root = self.task.get_coro()
+        last = time.perf_counter()
+        while not self._stop_event.wait(self.interval) and len(self.samples) < self.max_samples:
+            # Weight by real elapsed time: a CPU-bound loop holding the GIL
+            # delays our wakeups, and fixed weights would undercount it
+            now = time.perf_counter()
+            try:
+                kind, stack = self._sample(root)
+            except Exception:
+                # The task's frames changed under us; skip this tick
+                continue
+            self.samples.append((kind, stack, now - last))
+            last = now
+
+    def _sample(self, root) -> Tuple[str, List[_Frame]]:
+        if asyncio.current_task(self.loop) is self.task:
+            frame = sys._current_frames().get(self.loop_thread)
+            root_frame = getattr(root, "cr_frame", None)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_key(frame))
+                if frame is root_frame:
+                    break
+                frame = frame.f_back
+            return "cpu", stack[::-1]
+
+        frames, awaited = _coroutine_chain(root)
+        stack = [_frame_key(frame) for frame in frames]
+        waiting = type(awaited).__name__.replace("FutureIter", "Future") if awaited is not None else None
+        stack.append((f"[waiting on {waiting}]" if waiting else "[scheduled]", "", 0))
+        return "await", stack
+
+    def stop(self) -> List[_Sample]:
+        """Stop sampling and return the samples (without blocking on the thread)."""
+        self._stop_event.set()
+        return list(self.samples)
+
+
+def to_speedscope(name: str, samples: List[_Sample], duration: float) -> Dict[str, Any]:
+    """Build a speedscope ``sampled`` profile with ``[cpu]``/``[await]`` roots."""
+    frames: List[Dict[str, Any]] = []
+    index: Dict[_Frame, int] = {}
+
+    def frame_id(key: _Frame) -> int:
+        if key not in index:
+            index[key] = len(frames)
+            frame = {"name": key[0]}
+            if key[1]:
+                frame.update(file=key[1], line=key[2])
+            frames.append(frame)
+        return index[key]
+
+    stacks = [[frame_id((f"[{kind}]", "", 0))] + [frame_id(key) for key in stack] for kind, stack, _ in samples]
+    weights = [weight for _, _, weight in samples]
+    cpu = sum(weight for kind, _, weight in samples if kind == "cpu")
+    sampled = sum(weights)
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "ikon-systems-dashboard request profiler",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": f"{name} ({duration * 1000:.0f} ms wall, {cpu * 1000:.0f} ms cpu, "
+                    f"{(sampled - cpu) * 1000:.0f} ms await)",
+            "unit": "seconds",
+            "startValue": 0,
+            "endValue": sampled,
+            "samples": stacks,
+            "weights": weights,
+        }],
+    }
+
+
+class ProfilerMiddleware:
+    """Pure ASGI middleware profiling requests selected by header token or sample rate."""
+
+    def __init__(self, app: Any, output_dir: str, token: Optional[str] = None, sample_rate: float = 0.0,
+                 interval: float = 0.005, max_duration: float = 60.0):
+        self.app = app
+        self.output_dir = output_dir
+        self.token = token
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.max_duration = max_duration
+        self.header = b"x-profile"
+
+    def _selected(self, scope) -> bool:
+        if self.token:
+            for name, value in scope.get("headers", ()):
+                if name == self.header and value.decode("latin-1") == self.token:
+                    return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._selected(scope):
+            await self.app(scope, receive, send)
+            return
+
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        stamp = time.strftime("%Y%m%dT%H%M%S")
+        slug = re.sub(r"[^A-Za-z0-9]+", "-", scope["path"]).strip("-") or "root"
+        filename = f"{stamp}-{scope['method']}-{slug}-{random.randrange(16 ** 6):06x}.speedscope.json"
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-profile-file", filename.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        sampler = _Sampler(loop, asyncio.current_task(), threading.get_ident(), self.interval, self.max_duration)
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            samples = sampler.stop()
+            duration = time.perf_counter() - started
+            profile = to_speedscope(f"{scope['method']} {scope['path']}", samples, duration)
+            try:
+                await loop.run_in_executor(None, self._write, filename, profile)
+            except Exception as e:
+                print(f"Error writing profile {filename}: {e}")
+
+    def _write(self, filename: str, profile: Dict[str, Any]) -> None:
+        os.makedirs(self.output_dir, exist_ok=True)
+        with open(os.path.join(self.output_dir, filename), "w") as f:
+            json.dump(profile, f)
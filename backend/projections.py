@@ -0,0 +1,57 @@
+"""Column projections for list endpoints.
+
+List endpoints accept ``fields=`` as either a named projection (``summary``
+or ``full``) or a comma-separated list of columns. Columns are checked
+against a per-table allow-list and pushed down into the PostgREST
+``select``, so a table view that only shows names and statuses doesn't
+pull notes, addresses or JSON ``details`` blobs over the wire.
+
+``id`` and ``created_at`` are always selected: cursor pagination needs them.
+"""
+
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException
+
+ALWAYS = ("id", "created_at")
+
+TABLE_COLUMNS: Dict[str, Tuple[str, ...]] = {
+    "clients": ("id", "name", "email", "phone", "address", "status", "bilingual_preference", "notes",
+                "created_at", "updated_at"),
+    "activities": ("id", "user_id", "action", "entity_type", "entity_id", "entity_name", "details",
+                   "created_at"),
+}
+
+# ``None`` selects every column ("*")
+PROJECTIONS: Dict[str, Dict[str, Optional[Tuple[str, ...]]]] = {
+    "clients": {
+        "summary": ("id", "name", "email", "phone", "status", "created_at"),
+        "full": None,
+    },
+    "activities": {
+        "summary": ("id", "action", "entity_type", "entity_id", "entity_name", "created_at"),
+        "full": None,
+    },
+}
+
+
+def select_columns(table: str, fields: Optional[str] = None, default: str = "full") -> str:
+    """PostgREST ``select`` for a projection name or column list, or raise a 422."""
+    fields = (fields or default).strip()
+    projections = PROJECTIONS[table]
+    if fields in projections:
+        columns = projections[fields]
+        return "*" if columns is None else ",".join(columns)
+
+    requested = [column.strip() for column in fields.split(",") if column.strip()]
+    unknown = [column for column in requested if column not in TABLE_COLUMNS[table]]
+    if unknown or not requested:
+        raise HTTPException(
+            status_code=422,
+            detail=f"fields must be one of {', '.join(projections)} or a list of: {', '.join(TABLE_COLUMNS[table])}"
+        )
+    columns = list(ALWAYS)
+    for column in requested:
+        if column not in columns:
+            columns.append(column)
+    return ",".join(columns)
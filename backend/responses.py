@@ -0,0 +1,134 @@
+"""JSON responses that avoid redundant encoding work.
+
+``FastJSONResponse`` is the app's default response class: it encodes with
+``orjson`` when it is installed (several times faster than the standard
+library) and falls back to the same compact ``json.dumps`` Starlette uses.
+
+``RawEnvelopeResponse`` is for data that already exists as JSON text, such
+as call logs stored verbatim or an upstream body kept in cache: the bytes
+are spliced into the ``{"success": true, "data": ...}`` envelope without
+being decoded into Python objects and encoded again.
+
+``conditional_response`` renders a payload once, tags it with a strong
+ETag (a hash of the body) and answers a matching ``If-None-Match`` with an
+empty 304, so dashboards that re-poll unchanged data skip the download.
+Responses are per user, so they are marked ``private, no-cache``
+(browsers keep them but revalidate every time) and vary on Authorization.
+It also negotiates MessagePack for clients sending
+``Accept: application/msgpack`` when ``msgpack`` is installed.
+
+``columnar`` reshapes a list of row dicts into column names plus one
+array per column, so large tables don't repeat every key on every row.
+"""
+
+import hashlib
+import json
+from typing import Any, Dict, Iterable, List, Optional
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+
+from metrics import HTTP_CONDITIONAL
+
+try:
+    import orjson
+except ImportError:  # optional speed-up
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # optional binary format
+    msgpack = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+LIST_FORMATS = ("rows", "columnar")
+
+
+def dumps(content: Any) -> bytes:
+    """Encode ``content`` as compact UTF-8 JSON."""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None,
+                      separators=(",", ":")).encode("utf-8")
+
+
+def raw_array(items: Iterable[bytes]) -> bytes:
+    """Join already-encoded JSON values into a JSON array."""
+    return b"[" + b",".join(items) + b"]"
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class RawEnvelopeResponse(Response):
+    """``{"success": true, "data": <raw>, **fields}`` where ``raw`` is trusted JSON bytes."""
+
+    media_type = "application/json"
+
+    def __init__(self, data: bytes, status_code: int = 200, headers: Optional[dict] = None, **fields: Any):
+        body = b'{"success":true,"data":' + data
+        if fields:
+            body += b"," + dumps(fields)[1:-1]
+        super().__init__(body + b"}", status_code=status_code, headers=headers)
+
+
+def columnar(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """``{"columns": [...], "values": [[column 0 values], ...]}`` for a list of rows."""
+    columns: Dict[str, None] = {}
+    for row in rows:
+        for key in row:
+            columns.setdefault(key, None)
+    names = list(columns)
+    return {"columns": names, "values": [[row.get(name) for row in rows] for name in names]}
+
+
+def negotiate(request: Request) -> str:
+    """MessagePack if the client accepts it and it is available, JSON otherwise."""
+    if msgpack is not None:
+        accept = request.headers.get("accept", "")
+        if MSGPACK in accept or "application/x-msgpack" in accept:
+            return MSGPACK
+    return JSON
+
+
+def encode(content: Any, media_type: str = JSON) -> bytes:
+    if media_type == MSGPACK:
+        return msgpack.packb(content, use_bin_type=True)
+    return dumps(content)
+
+
+def compute_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison, as RFC 9110 requires for If-None-Match (proxies may weaken tags)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if (tag[2:] if tag.startswith("W/") else tag) == opaque:
+            return True
+    return False
+
+
+def conditional_response(request: Request, content: Any, route: str,
+                         cache_control: str = "private, no-cache") -> Response:
+    """Render ``content`` with an ETag, or a 304 if the client already has it."""
+    media_type = negotiate(request)
+    body = encode(jsonable_encoder(content), media_type)
+    etag = compute_etag(body)
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": "Authorization, Accept"}
+    if_none_match = request.headers.get("if-none-match")
+    if etag_matches(if_none_match, etag):
+        HTTP_CONDITIONAL.inc((route, "not_modified"))
+        return Response(status_code=304, headers=headers)
+    HTTP_CONDITIONAL.inc((route, "modified" if if_none_match else "unconditional"))
+    return Response(body, media_type=media_type, headers=headers)
@@ -0,0 +1,222 @@
+"""In-memory interval index of appointments for conflict checks and free-slot search.
+
+Each client's appointments are loaded on first use (and again after
+``ttl`` seconds, to pick up changes made outside the API) and kept in two
+sorted structures:
+
+* the individual intervals ordered by start, so the appointments overlapping
+  a new one are found with a bisect plus a scan bounded by the longest
+  appointment;
+* the union of busy time as disjoint blocks, with a max-tree over the gaps
+  between consecutive blocks, so "the first gap of at least N minutes after
+  T" is a bisect plus a tree descent: O(log n) however many appointments
+  the range contains.
+
+Appointments created through the API are added as they are written. All
+times are epoch seconds; naive datetimes are treated as UTC.
+"""
+
+import asyncio
+import time
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+INACTIVE_STATUSES = {"cancelled", "no_show", "rescheduled"}
+_INF = float("inf")
+
+
+def epoch(value: Any) -> float:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def as_datetime(seconds: float) -> datetime:
+    return datetime.fromtimestamp(seconds, timezone.utc)
+
+
+class _MaxTree:
+    """Array max segment tree answering "first index >= lo with value >= x"."""
+
+    def __init__(self, values: List[float]):
+        size = 1
+        while size < len(values):
+            size *= 2
+        self.size = size
+        self.tree = [-_INF] * (2 * size)
+        self.tree[size:size + len(values)] = values
+        for node in range(size - 1, 0, -1):
+            self.tree[node] = max(self.tree[2 * node], self.tree[2 * node + 1])
+
+    def first_at_least(self, lo: int, threshold: float) -> int:
+        def search(node: int, node_lo: int, node_hi: int) -> int:
+            if node_hi <= lo or self.tree[node] < threshold:
+                return -1
+            if node >= self.size:
+                return node - self.size
+            mid = (node_lo + node_hi) // 2
+            found = search(2 * node, node_lo, mid)
+            return found if found >= 0 else search(2 * node + 1, mid, node_hi)
+
+        return search(1, 0, self.size)
+
+
+class ClientSchedule:
+    """Busy intervals of one client."""
+
+    def __init__(self):
+        self.intervals: List[Tuple[float, float, str]] = []  # (start, end, appointment id) by start
+        self.ids: set = set()
+        self.longest = 0.0
+        self.starts: List[float] = []  # disjoint busy blocks
+        self.ends: List[float] = []
+        self._gaps: Optional[_MaxTree] = None
+        self.loaded_at = time.monotonic()
+
+    def add(self, appointment_id: str, start: float, end: float) -> None:
+        if appointment_id in self.ids or end <= start:
+            return
+        self.ids.add(appointment_id)
+        insort(self.intervals, (start, end, appointment_id))
+        self.longest = max(self.longest, end - start)
+
+        # Merge into the busy blocks it touches or overlaps
+        first = bisect_left(self.ends, start)
+        last = bisect_right(self.starts, end)
+        if first < last:
+            start = min(start, self.starts[first])
+            end = max(end, self.ends[last - 1])
+        self.starts[first:last] = [start]
+        self.ends[first:last] = [end]
+        self._gaps = None
+
+    def overlapping(self, start: float, end: float) -> List[str]:
+        """Ids of appointments overlapping ``[start, end)``."""
+        # Only intervals starting after start - longest can still be running at start
+        index = bisect_right(self.intervals, (start - self.longest, _INF, ""))
+        found = []
+        while index < len(self.intervals) and self.intervals[index][0] < end:
+            other_start, other_end, appointment_id = self.intervals[index]
+            if other_end > start:
+                found.append(appointment_id)
+            index += 1
+        return found
+
+    def _gap_tree(self) -> _MaxTree:
+        # Gap i is the free time after block i; the last one is unbounded
+        if self._gaps is None:
+            gaps = [self.starts[i + 1] - self.ends[i] for i in range(len(self.starts) - 1)]
+            self._gaps = _MaxTree(gaps + [_INF])
+        return self._gaps
+
+    def first_free(self, after: float, before: float, duration: float) -> Optional[float]:
+        """Start of the earliest free ``duration`` in ``[after, before)``, if any."""
+        block = bisect_right(self.ends, after)
+        if block == len(self.starts) or self.starts[block] > after:
+            # ``after`` is free: use it if the time until the next block is enough
+            next_start = self.starts[block] if block < len(self.starts) else _INF
+            if next_start - after >= duration:
+                return after if after + duration <= before else None
+
+        # Otherwise the slot starts at the end of block ``block`` or a later one
+        gap = self._gap_tree().first_at_least(block, duration)
+        if gap < 0:
+            return None
+        slot = self.ends[gap]
+        return slot if slot + duration <= before else None
+
+
+class ScheduleIndex:
+    """Per-client ``ClientSchedule``s, loaded lazily and bounded in number."""
+
+    def __init__(self, load: Callable[[str], Awaitable[List[Dict[str, Any]]]], ttl: float = 300.0,
+                 maxsize: int = 1000, default_duration: int = 60):
+        self.load = load
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.default_duration = default_duration
+        self._schedules: "OrderedDict[str, ClientSchedule]" = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._loading: Dict[str, asyncio.Task] = {}
+        self.loads = 0
+        self.conflicts = 0
+
+    def lock(self, client_id: str) -> asyncio.Lock:
+        """Serialise check-then-insert for one client within this process."""
+        lock = self._locks.get(client_id)
+        if lock is None:
+            lock = self._locks[client_id] = asyncio.Lock()
+        return lock
+
+    def interval(self, row: Dict[str, Any]) -> Tuple[float, float]:
+        start = epoch(row["date_time"])
+        return start, start + 60 * (row.get("duration") or self.default_duration)
+
+    async def schedule(self, client_id: str) -> ClientSchedule:
+        schedule = self._schedules.get(client_id)
+        if schedule is not None and time.monotonic() - schedule.loaded_at < self.ttl:
+            self._schedules.move_to_end(client_id)
+            return schedule
+
+        task = self._loading.get(client_id)
+        if task is None:
+            task = self._loading[client_id] = asyncio.create_task(self._load(client_id))
+            task.add_done_callback(lambda _: self._loading.pop(client_id, None))
+        return await asyncio.shield(task)
+
+    async def _load(self, client_id: str) -> ClientSchedule:
+        self.loads += 1
+        schedule = ClientSchedule()
+        for row in await self.load(client_id):
+            if row.get("status") not in INACTIVE_STATUSES:
+                schedule.add(row["id"], *self.interval(row))
+        self._schedules[client_id] = schedule
+        self._schedules.move_to_end(client_id)
+        while len(self._schedules) > self.maxsize:
+            evicted, _ = self._schedules.popitem(last=False)
+            lock = self._locks.get(evicted)
+            if lock is not None and not lock.locked():
+                del self._locks[evicted]
+        return schedule
+
+    async def conflicts_for(self, client_id: str, start: float, end: float) -> List[str]:
+        found = (await self.schedule(client_id)).overlapping(start, end)
+        if found:
+            self.conflicts += 1
+        return found
+
+    def add(self, client_id: str, appointment_id: str, start: float, end: float) -> None:
+        """Record a newly written appointment in an already loaded schedule."""
+        schedule = self._schedules.get(client_id)
+        if schedule is not None:
+            schedule.add(appointment_id, start, end)
+
+    async def free_slots(self, client_id: str, start: float, end: float, duration: float,
+                         limit: int = 1, step: Optional[float] = None) -> List[Tuple[float, float]]:
+        """Up to ``limit`` free slots of ``duration`` seconds in ``[start, end)``.
+
+        Consecutive slots in the same free gap are ``step`` seconds apart
+        (``duration`` by default).
+        """
+        schedule = await self.schedule(client_id)
+        slots = []
+        cursor = start
+        while len(slots) < limit:
+            slot = schedule.first_free(cursor, end, duration)
+            if slot is None:
+                break
+            slots.append((slot, slot + duration))
+            cursor = slot + (step or duration)
+        return slots
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "clients": len(self._schedules),
+            "appointments": sum(len(s.intervals) for s in self._schedules.values()),
+            "loads": self.loads,
+            "conflicts": self.conflicts,
+        }
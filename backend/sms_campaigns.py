@@ -0,0 +1,276 @@
+"""Bulk SMS campaigns sent from a background job.
+
+A campaign is a message template plus a recipient list. ``POST
+/sms/campaigns`` registers it and returns immediately; sending happens in a
+background task and progress is tracked per recipient.
+
+Throughput is limited in two places:
+
+* a token bucket per sender number, so we never exceed what Twilio allows
+  that number to send (1 msg/s for a long code by default, configurable per
+  number). Buckets are shared by every campaign using the same sender;
+* a global semaphore bounding how many Twilio requests are in flight.
+
+429 and 5xx responses (and requests that never reached Twilio) are retried
+with exponential backoff; a 429 also pauses the sender's bucket for
+``Retry-After``. Other 4xx responses (invalid number, opted out, ...) fail
+the recipient at once. A request that was sent but got no response
+(``SendOutcomeUnknown``) is never retried, since Twilio may have accepted
+the message: the recipient is marked ``unknown``.
+
+Campaign state lives in memory only: campaigns still running at shutdown
+are cancelled and are not resumed on restart.
+"""
+
+import asyncio
+import random
+import string
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from fastapi import HTTPException
+
+Sender = Callable[[str, str, str], Awaitable[Dict[str, Any]]]
+
+
+class TokenBucket:
+    """Async token bucket: ``rate`` tokens per second, up to ``burst`` banked."""
+
+    def __init__(self, rate: float, burst: float = 1.0):
+        self.rate = rate
+        self.capacity = max(1.0, burst)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        # Waiters queue on the lock, so tokens are handed out in FIFO order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        """Stop handing out tokens for ``seconds`` (upstream asked us to back off)."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+
+
+class SendOutcomeUnknown(HTTPException):
+    """The send request was sent but no response came back."""
+
+    def __init__(self, detail: str = "Twilio did not respond; the message may have been sent"):
+        super().__init__(status_code=504, detail=detail)
+
+
+class _Defaults(dict):
+    def __missing__(self, key: str) -> str:
+        return "{" + key + "}"
+
+
+def validate_template(template: str) -> None:
+    """Raise ``ValueError`` unless every placeholder is a plain ``{name}``."""
+    for _, field, _, _ in string.Formatter().parse(template):
+        if field is not None and not field.isidentifier():
+            raise ValueError(f"Placeholders must be plain names, got {{{field}}}")
+
+
+def render(template: str, variables: Dict[str, Any]) -> str:
+    """Fill ``{name}`` placeholders; unknown placeholders are left as-is."""
+    return template.format_map(_Defaults(variables))
+
+
+class Campaign:
+    def __init__(self, user_id: str, sender: str, template: str, recipients: List[Dict[str, Any]]):
+        self.id = str(uuid.uuid4())
+        self.user_id = user_id
+        self.sender = sender
+        self.template = template
+        self.status = "queued"
+        self.created_at = datetime.utcnow().isoformat()
+        self.completed_at: Optional[str] = None
+        self.recipients = [
+            {"to": r["to"], "variables": r.get("variables") or {}, "status": "pending",
+             "attempts": 0, "sid": None, "error": None}
+            for r in recipients
+        ]
+
+    def summary(self) -> Dict[str, Any]:
+        counts = {"pending": 0, "sending": 0, "sent": 0, "failed": 0, "unknown": 0}
+        for recipient in self.recipients:
+            counts[recipient["status"]] += 1
+        return {
+            "id": self.id,
+            "status": self.status,
+            "sender": self.sender,
+            "total": len(self.recipients),
+            **counts,
+            "created_at": self.created_at,
+            "completed_at": self.completed_at,
+        }
+
+
+class CampaignRunner:
+    """Runs SMS campaigns through ``send(to, body, sender)``."""
+
+    def __init__(self, send: Sender, concurrency: int = 10, default_rate: float = 1.0,
+                 sender_rates: Optional[Dict[str, float]] = None, max_attempts: int = 5,
+                 base_backoff: float = 1.0, max_backoff: float = 60.0, retain: int = 100):
+        self.send = send
+        self.concurrency = concurrency
+        self.default_rate = default_rate
+        self.sender_rates = sender_rates or {}
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.retain = retain
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._campaigns: Dict[str, Campaign] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.sent = 0
+        self.failed = 0
+        self.unknown = 0
+        self.retries = 0
+
+    @staticmethod
+    def parse_rates(spec: str) -> Dict[str, float]:
+        """Parse ``"+15550001111=3,+15550002222=100"`` into per-sender rates."""
+        rates = {}
+        for item in filter(None, (part.strip() for part in spec.split(","))):
+            number, _, rate = item.partition("=")
+            rates[number.strip()] = float(rate)
+        return rates
+
+    def _bucket(self, sender: str) -> TokenBucket:
+        bucket = self._buckets.get(sender)
+        if bucket is None:
+            rate = self.sender_rates.get(sender, self.default_rate)
+            bucket = self._buckets[sender] = TokenBucket(rate, burst=rate)
+        return bucket
+
+    def start(self, user_id: str, sender: str, template: str, recipients: List[Dict[str, Any]]) -> Campaign:
+        """Register a campaign and start sending it in the background."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        campaign = Campaign(user_id, sender, template, recipients)
+        self._campaigns[campaign.id] = campaign
+        self._tasks[campaign.id] = asyncio.create_task(self._run(campaign))
+        self._prune()
+        return campaign
+
+    def get(self, campaign_id: str, user_id: str) -> Campaign:
+        campaign = self._campaigns.get(campaign_id)
+        if campaign is None or campaign.user_id != user_id:
+            raise HTTPException(status_code=404, detail="Campaign not found")
+        return campaign
+
+    async def _run(self, campaign: Campaign) -> None:
+        campaign.status = "running"
+        pending = iter(campaign.recipients)
+
+        async def worker():
+            for recipient in pending:
+                await self._deliver(campaign, recipient)
+
+        workers = min(self.concurrency, len(campaign.recipients)) or 1
+        try:
+            await asyncio.gather(*(worker() for _ in range(workers)))
+            campaign.status = "completed"
+        except asyncio.CancelledError:
+            campaign.status = "cancelled"
+            raise
+        finally:
+            campaign.completed_at = datetime.utcnow().isoformat()
+            self._tasks.pop(campaign.id, None)
+
+    async def _deliver(self, campaign: Campaign, recipient: Dict[str, Any]) -> None:
+        bucket = self._bucket(campaign.sender)
+        try:
+            body = render(campaign.template, recipient["variables"])
+        except Exception as e:
+            recipient.update(status="failed", error=f"Invalid template: {e}")
+            self.failed += 1
+            return
+
+        while True:
+            await bucket.acquire()
+            recipient["status"] = "sending"
+            recipient["attempts"] += 1
+            retry_after = None
+            async with self._semaphore:
+                try:
+                    result = await self.send(recipient["to"], body, campaign.sender)
+                except SendOutcomeUnknown as e:
+                    # Sending again could deliver the message twice
+                    recipient.update(status="unknown", error=str(e.detail))
+                    self.unknown += 1
+                    return
+                except HTTPException as e:
+                    error, status = str(e.detail), e.status_code
+                    if status == 429:
+                        retry_after = _retry_after(e.headers)
+                except asyncio.CancelledError:
+                    recipient["status"] = "pending"
+                    raise
+                except Exception as e:
+                    error, status = str(e), None
+                else:
+                    data = result.get("data") or {}
+                    recipient.update(status="sent", sid=data.get("sid"), error=None)
+                    self.sent += 1
+                    return
+
+            retryable = status is not None and (status == 429 or status >= 500)
+            if not retryable or recipient["attempts"] >= self.max_attempts:
+                recipient.update(status="failed", error=error)
+                self.failed += 1
+                return
+
+            self.retries += 1
+            recipient.update(status="pending", error=error)
+            delay = min(self.max_backoff, self.base_backoff * 2 ** (recipient["attempts"] - 1))
+            if retry_after is not None:
+                bucket.pause(retry_after)
+                delay = max(delay, retry_after)
+            await asyncio.sleep(delay * random.uniform(0.8, 1.2))
+
+    def _prune(self) -> None:
+        finished = [c for c in self._campaigns.values() if c.id not in self._tasks]
+        for campaign in finished[:max(0, len(finished) - self.retain)]:
+            del self._campaigns[campaign.id]
+
+    async def stop(self) -> None:
+        """Cancel running campaigns (unsent recipients stay ``pending``)."""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": len(self._tasks),
+            "campaigns": len(self._campaigns),
+            "sent": self.sent,
+            "failed": self.failed,
+            "unknown": self.unknown,
+            "retries": self.retries,
+        }
+
+
+def _retry_after(headers: Optional[Dict[str, str]]) -> Optional[float]:
+    try:
+        return float((headers or {}).get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
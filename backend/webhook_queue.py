@@ -0,0 +1,230 @@
+"""Durable, deduplicating queue for inbound webhooks.
+
+Webhook routes only persist the raw event to a local SQLite database and
+return 200, so providers never time out and retry while we do real work.
+Events are unique per ``(provider, event_id)``: provider retries of an
+event we already accepted are acknowledged and ignored.
+
+A pool of worker tasks claims due events and runs the handler registered
+for the provider. Failures are retried with exponential backoff; after
+``max_attempts`` the event is moved to the dead-letter state and kept for
+inspection. Events left ``processing`` by a crash are re-queued on start.
+
+All SQLite access happens on a single dedicated thread, which serializes
+writes without locking and keeps disk I/O off the event loop.
+"""
+
+import asyncio
+import os
+import random
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from metrics import WEBHOOK_DEAD_LETTERS, WEBHOOK_QUEUE_DEPTH, WEBHOOK_QUEUE_LAG
+
+Handler = Callable[[bytes], Awaitable[None]]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS webhook_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    provider TEXT NOT NULL,
+    event_id TEXT NOT NULL,
+    event_type TEXT,
+    payload BLOB NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    received_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    last_error TEXT,
+    UNIQUE (provider, event_id)
+);
+CREATE INDEX IF NOT EXISTS idx_webhook_events_due ON webhook_events (status, next_attempt_at);
+"""
+
+
+class WebhookQueue:
+    """SQLite-backed webhook inbox with retrying workers and a dead-letter state."""
+
+    def __init__(self, path: str, workers: int = 4, max_attempts: int = 8,
+                 base_backoff: float = 2.0, max_backoff: float = 600.0,
+                 poll_interval: float = 1.0, retention: float = 7 * 86400):
+        self.path = path
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._handlers: Dict[str, Handler] = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="webhook-queue")
+        self._conn: Optional[sqlite3.Connection] = None
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self.received = 0
+        self.duplicates = 0
+        self.processed = 0
+        self.failures = 0
+        self.dead_lettered = 0
+
+    def register(self, provider: str, handler: Handler) -> None:
+        """Set the coroutine that processes raw events from ``provider``."""
+        self._handlers[provider] = handler
+
+    async def _call(self, fn: Callable[..., Any], *args: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=FULL")
+            self._conn.executescript(_SCHEMA)
+        return self._conn
+
+    # -- producer side -------------------------------------------------
+
+    def _insert(self, provider: str, event_id: str, event_type: Optional[str], payload: bytes) -> bool:
+        now = time.time()
+        cursor = self._connection().execute(
+            "INSERT OR IGNORE INTO webhook_events "
+            "(provider, event_id, event_type, payload, next_attempt_at, received_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (provider, event_id, event_type, payload, now, now, now),
+        )
+        return cursor.rowcount == 1
+
+    async def enqueue(self, provider: str, event_id: str, event_type: Optional[str], payload: bytes) -> bool:
+        """Persist an event; returns ``False`` if it was already received."""
+        inserted = await self._call(self._insert, provider, event_id, event_type, payload)
+        if inserted:
+            self.received += 1
+            if self._wakeup is not None:
+                self._wakeup.set()
+        else:
+            self.duplicates += 1
+        return inserted
+
+    # -- consumer side -------------------------------------------------
+
+    def _claim(self) -> Optional[tuple]:
+        conn = self._connection()
+        now = time.time()
+        row = conn.execute(
+            "SELECT id, provider, payload, attempts FROM webhook_events "
+            "WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY next_attempt_at LIMIT 1",
+            (now,),
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE webhook_events SET status = 'processing', updated_at = ? WHERE id = ?", (now, row[0]))
+        return row
+
+    def _complete(self, event_pk: int) -> None:
+        self._connection().execute(
+            "UPDATE webhook_events SET status = 'done', attempts = attempts + 1, updated_at = ?, last_error = NULL "
+            "WHERE id = ?",
+            (time.time(), event_pk),
+        )
+
+    def _fail(self, event_pk: int, attempts: int, error: str) -> bool:
+        """Schedule a retry, or dead-letter the event; returns ``True`` if dead."""
+        now = time.time()
+        dead = attempts >= self.max_attempts
+        delay = min(self.max_backoff, self.base_backoff * 2 ** (attempts - 1)) * random.uniform(0.8, 1.2)
+        self._connection().execute(
+            "UPDATE webhook_events SET status = ?, attempts = ?, next_attempt_at = ?, updated_at = ?, last_error = ? "
+            "WHERE id = ?",
+            ("dead" if dead else "pending", attempts, now + delay, now, error[:2000], event_pk),
+        )
+        return dead
+
+    def _recover(self) -> None:
+        conn = self._connection()
+        conn.execute("UPDATE webhook_events SET status = 'pending' WHERE status = 'processing'")
+        conn.execute(
+            "DELETE FROM webhook_events WHERE status = 'done' AND updated_at < ?",
+            (time.time() - self.retention,),
+        )
+
+    async def _worker(self) -> None:
+        while True:
+            claimed = await self._call(self._claim)
+            if claimed is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            event_pk, provider, payload, attempts = claimed
+            handler = self._handlers.get(provider)
+            try:
+                if handler is None:
+                    raise RuntimeError(f"No webhook handler registered for '{provider}'")
+                await handler(payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failures += 1
+                if await self._call(self._fail, event_pk, attempts + 1, f"{type(e).__name__}: {e}"):
+                    self.dead_lettered += 1
+                    print(f"Webhook {provider} event {event_pk} dead-lettered after {attempts + 1} attempts: {e}")
+            else:
+                self.processed += 1
+                await self._call(self._complete, event_pk)
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        await self._call(self._recover)
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        """Stop the workers; in-flight events are re-queued on next start."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._conn is not None:
+            await self._call(self._conn.close)
+            self._conn = None
+
+    # -- observability -------------------------------------------------
+
+    def _snapshot(self) -> Dict[str, Any]:
+        conn = self._connection()
+        counts = dict(conn.execute("SELECT status, COUNT(*) FROM webhook_events GROUP BY status").fetchall())
+        oldest = conn.execute(
+            "SELECT MIN(received_at) FROM webhook_events WHERE status IN ('pending', 'processing')"
+        ).fetchone()[0]
+        snapshot = {
+            "depth": counts.get("pending", 0) + counts.get("processing", 0),
+            "processing": counts.get("processing", 0),
+            "dead": counts.get("dead", 0),
+            "lag_seconds": round(time.time() - oldest, 3) if oldest else 0.0,
+        }
+        WEBHOOK_QUEUE_DEPTH.set(snapshot["depth"])
+        WEBHOOK_QUEUE_LAG.set(snapshot["lag_seconds"])
+        WEBHOOK_DEAD_LETTERS.set(snapshot["dead"])
+        return snapshot
+
+    async def stats(self) -> Dict[str, Any]:
+        snapshot = await self._call(self._snapshot)
+        snapshot.update({
+            "workers": len(self._tasks),
+            "received": self.received,
+            "duplicates": self.duplicates,
+            "processed": self.processed,
+            "failures": self.failures,
+            "dead_lettered": self.dead_lettered,
+        })
+        return snapshot
@@ -0,0 +1,60 @@
+-- Server-side aggregation functions for /api/analytics
+-- The backend calls these through PostgREST RPC instead of downloading every
+-- row and summing in Python. NULL bounds mean "unbounded".
+
+CREATE OR REPLACE FUNCTION public.analytics_revenue_summary(
+    p_start TIMESTAMP WITH TIME ZONE DEFAULT NULL,
+    p_end TIMESTAMP WITH TIME ZONE DEFAULT NULL
+)
+RETURNS TABLE (total NUMERIC, count BIGINT)
+LANGUAGE sql STABLE AS $$
+    SELECT COALESCE(SUM(amount), 0), COUNT(*)
+    FROM public.payments
+    WHERE (p_start IS NULL OR payment_date >= p_start)
+      AND (p_end IS NULL OR payment_date <= p_end);
+$$;
+
+CREATE OR REPLACE FUNCTION public.analytics_client_status_counts(
+    p_start TIMESTAMP WITH TIME ZONE DEFAULT NULL,
+    p_end TIMESTAMP WITH TIME ZONE DEFAULT NULL
+)
+RETURNS TABLE (key TEXT, count BIGINT)
+LANGUAGE sql STABLE AS $$
+    SELECT status, COUNT(*)
+    FROM public.clients
+    WHERE (p_start IS NULL OR created_at >= p_start)
+      AND (p_end IS NULL OR created_at <= p_end)
+    GROUP BY status;
+$$;
+
+CREATE OR REPLACE FUNCTION public.analytics_project_status_counts(
+    p_start TIMESTAMP WITH TIME ZONE DEFAULT NULL,
+    p_end TIMESTAMP WITH TIME ZONE DEFAULT NULL
+)
+RETURNS TABLE (key TEXT, count BIGINT)
+LANGUAGE sql STABLE AS $$
+    SELECT status, COUNT(*)
+    FROM public.projects
+    WHERE (p_start IS NULL OR created_at >= p_start)
+      AND (p_end IS NULL OR created_at <= p_end)
+    GROUP BY status;
+$$;
+
+CREATE OR REPLACE FUNCTION public.analytics_appointment_type_counts(
+    p_start TIMESTAMP WITH TIME ZONE DEFAULT NULL,
+    p_end TIMESTAMP WITH TIME ZONE DEFAULT NULL
+)
+RETURNS TABLE (key TEXT, count BIGINT)
+LANGUAGE sql STABLE AS $$
+    SELECT type, COUNT(*)
+    FROM public.appointments
+    WHERE (p_start IS NULL OR date_time >= p_start)
+      AND (p_end IS NULL OR date_time <= p_end)
+    GROUP BY type;
+$$;
+
+-- Covering indexes so the aggregates are answered from the index alone
+CREATE INDEX IF NOT EXISTS idx_payments_payment_date_amount ON payments(payment_date) INCLUDE (amount);
+CREATE INDEX IF NOT EXISTS idx_clients_created_at_status ON clients(created_at) INCLUDE (status);
+CREATE INDEX IF NOT EXISTS idx_projects_created_at_status ON projects(created_at) INCLUDE (status);
+CREATE INDEX IF NOT EXISTS idx_appointments_date_time_type ON appointments(date_time) INCLUDE (type);
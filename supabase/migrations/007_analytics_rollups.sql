@@ -0,0 +1,79 @@
+-- Per-day analytics rollups
+-- One row per (metric, day, dimension): revenue has an empty dimension,
+-- clients/projects are bucketed by status and appointments by type.
+-- The backend increments buckets on every write and answers date ranges by
+-- summing whole days; analytics_rollup_rebuild() recomputes everything from
+-- the source tables (run it after bulk changes made outside the API).
+
+CREATE TABLE IF NOT EXISTS public.analytics_daily_rollups (
+    metric TEXT NOT NULL CHECK (metric IN ('revenue', 'clients', 'projects', 'appointments')),
+    day DATE NOT NULL,
+    dimension TEXT NOT NULL DEFAULT '',
+    count BIGINT NOT NULL DEFAULT 0,
+    total NUMERIC(14,2) NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL,
+    PRIMARY KEY (metric, day, dimension)
+);
+
+ALTER TABLE public.analytics_daily_rollups ENABLE ROW LEVEL SECURITY;
+CREATE POLICY "Enable read access for authenticated users" ON public.analytics_daily_rollups FOR SELECT USING (auth.role() = 'authenticated');
+
+CREATE OR REPLACE FUNCTION public.analytics_rollup_increment(
+    p_metric TEXT,
+    p_day DATE,
+    p_dimension TEXT DEFAULT '',
+    p_count BIGINT DEFAULT 1,
+    p_total NUMERIC DEFAULT 0
+)
+RETURNS void
+LANGUAGE sql AS $$
+    INSERT INTO public.analytics_daily_rollups (metric, day, dimension, count, total)
+    VALUES (p_metric, p_day, COALESCE(p_dimension, ''), p_count, p_total)
+    ON CONFLICT (metric, day, dimension) DO UPDATE
+    SET count = analytics_daily_rollups.count + EXCLUDED.count,
+        total = analytics_daily_rollups.total + EXCLUDED.total,
+        updated_at = now();
+$$;
+
+CREATE OR REPLACE FUNCTION public.analytics_rollup_range(
+    p_metric TEXT,
+    p_start DATE DEFAULT NULL,
+    p_end DATE DEFAULT NULL
+)
+RETURNS TABLE (dimension TEXT, count BIGINT, total NUMERIC)
+LANGUAGE sql STABLE AS $$
+    SELECT dimension, SUM(count)::BIGINT, SUM(total)
+    FROM public.analytics_daily_rollups
+    WHERE metric = p_metric
+      AND (p_start IS NULL OR day >= p_start)
+      AND (p_end IS NULL OR day <= p_end)
+    GROUP BY dimension;
+$$;
+
+CREATE OR REPLACE FUNCTION public.analytics_rollup_rebuild()
+RETURNS void
+LANGUAGE plpgsql AS $$
+BEGIN
+    DELETE FROM public.analytics_daily_rollups;
+
+    INSERT INTO public.analytics_daily_rollups (metric, day, dimension, count, total)
+    SELECT 'revenue', payment_date::date, '', COUNT(*), COALESCE(SUM(amount), 0)
+    FROM public.payments
+    GROUP BY payment_date::date;
+
+    INSERT INTO public.analytics_daily_rollups (metric, day, dimension, count)
+    SELECT 'clients', (created_at AT TIME ZONE 'UTC')::date, status, COUNT(*)
+    FROM public.clients
+    GROUP BY 2, 3;
+
+    INSERT INTO public.analytics_daily_rollups (metric, day, dimension, count)
+    SELECT 'projects', (created_at AT TIME ZONE 'UTC')::date, status, COUNT(*)
+    FROM public.projects
+    GROUP BY 2, 3;
+
+    INSERT INTO public.analytics_daily_rollups (metric, day, dimension, count)
+    SELECT 'appointments', (date_time AT TIME ZONE 'UTC')::date, type, COUNT(*)
+    FROM public.appointments
+    GROUP BY 2, 3;
+END;
+$$;
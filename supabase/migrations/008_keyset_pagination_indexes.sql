@@ -0,0 +1,5 @@
+-- Indexes backing keyset (cursor) pagination on (created_at DESC, id DESC)
+-- so every page is an index seek regardless of how deep the client scrolls.
+CREATE INDEX IF NOT EXISTS idx_clients_created_at_id ON clients(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_clients_status_created_at_id ON clients(status, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_activities_user_created_at_id ON public.activities(user_id, created_at DESC, id DESC);
@@ -0,0 +1,17 @@
+-- Per-user Google Calendar OAuth tokens
+-- Written and read only by the backend with the service role key; RLS is
+-- enabled without policies so the tokens are never exposed to clients.
+CREATE TABLE IF NOT EXISTS public.google_calendar_tokens (
+    user_id UUID PRIMARY KEY REFERENCES auth.users(id) ON DELETE CASCADE,
+    access_token TEXT,
+    refresh_token TEXT,
+    expires_at TIMESTAMP WITH TIME ZONE,
+    scope TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL
+);
+
+ALTER TABLE public.google_calendar_tokens ENABLE ROW LEVEL SECURITY;
+
+-- Appointments are looked up by their synced Google event
+CREATE INDEX IF NOT EXISTS idx_appointments_google_calendar_id ON appointments(google_calendar_id);
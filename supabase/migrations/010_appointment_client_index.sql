@@ -0,0 +1,3 @@
+-- The backend loads each client's appointments into its in-memory interval
+-- index by keyset paging on (created_at DESC, id DESC) within the client.
+CREATE INDEX IF NOT EXISTS idx_appointments_client_created_at_id ON appointments(client_id, created_at DESC, id DESC);
@@ -0,0 +1,30 @@
+-- Keep only append-only metrics in the daily rollups
+-- Client and project buckets counted the status a row was created with and
+-- never moved when the status changed, so status breakdowns drifted from
+-- the live counts. Those breakdowns are now always aggregated live
+-- (analytics_client_status_counts / analytics_project_status_counts);
+-- revenue and appointments by type stay rolled up.
+
+DELETE FROM public.analytics_daily_rollups WHERE metric IN ('clients', 'projects');
+
+ALTER TABLE public.analytics_daily_rollups DROP CONSTRAINT IF EXISTS analytics_daily_rollups_metric_check;
+ALTER TABLE public.analytics_daily_rollups
+    ADD CONSTRAINT analytics_daily_rollups_metric_check CHECK (metric IN ('revenue', 'appointments'));
+
+CREATE OR REPLACE FUNCTION public.analytics_rollup_rebuild()
+RETURNS void
+LANGUAGE plpgsql AS $$
+BEGIN
+    DELETE FROM public.analytics_daily_rollups;
+
+    INSERT INTO public.analytics_daily_rollups (metric, day, dimension, count, total)
+    SELECT 'revenue', payment_date::date, '', COUNT(*), COALESCE(SUM(amount), 0)
+    FROM public.payments
+    GROUP BY payment_date::date;
+
+    INSERT INTO public.analytics_daily_rollups (metric, day, dimension, count)
+    SELECT 'appointments', (date_time AT TIME ZONE 'UTC')::date, type, COUNT(*)
+    FROM public.appointments
+    GROUP BY 2, 3;
+END;
+$$;